@@ -54,6 +54,8 @@ int RdmaCMListen(struct sockaddr_in *addr) {
     perror("RdmaListen: rdma_listen failed");
     return 1;
   }
+  printf("Listening\n");
+  fflush(stdout);
 
 #ifdef RDMA_DEBUG
   fprintf(stderr, "RdmaListen: listen done\n");
@@ -65,6 +65,8 @@ static int SockListen(struct sockaddr_in *addr) {
     perror("RdmaIBListen: listen");
     return 1;
   }
+  printf("Listening\n");
+  fflush(stdout);
 
   if ((sock_fd = accept(lfd, NULL, 0)) < 0) {
     perror("RdmaIBListen: accept failed");
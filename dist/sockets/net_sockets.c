@@ -266,6 +266,8 @@ static int SockListen(struct sockaddr_in *addr) {
     perror("RdmaIBListen: listen");
     return 1;
   }
+  printf("Listening\n");
+  fflush(stdout);
 
   if ((sockfd = accept(lfd, NULL, 0)) < 0) {
     perror("RdmaIBListen: accept failed");
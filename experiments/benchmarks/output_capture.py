@@ -0,0 +1,149 @@
+# Copyright 2024 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Micro-benchmark for the line splitting in `exectools.Component`.
+
+Pipes a synthetic simulator log through a component and reports the achieved
+throughput in lines/s and MB/s. Run from the `experiments` directory:
+
+    python3 -m benchmarks.output_capture --size 1024
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+import typing as tp
+
+from simbricks.orchestration import exectools
+
+# Generates `size` bytes of gem5-style trace output on stdout by repeatedly
+# writing a pre-built block, so the generator itself is not the bottleneck.
+GENERATOR = r'''
+import sys
+size = int(sys.argv[1])
+lines = []
+for i in range(16384):
+    lines.append(
+        f'{i * 500:>12}: system.pc.simbricks_0: {"x" * (i % 97)} '
+        f'sync msg ts={i * 1000} len={i % 1500}\n'
+    )
+block = ''.join(lines).encode('utf-8')
+out = sys.stdout.buffer
+while size > 0:
+    out.write(block[:size])
+    size -= len(block)
+out.flush()
+'''
+
+
+class NullLogSink(exectools.LogSink):
+    """Discards all lines."""
+
+    def extend(self, lines: tp.List[str]) -> None:
+        pass
+
+    def tail(self) -> tp.List[str]:
+        return []
+
+    def lines(self) -> tp.Iterator[str]:
+        return iter([])
+
+
+class CountingComponent(exectools.Component):
+    """Component that only counts lines instead of keeping them."""
+
+    def __init__(self, cmd_parts: tp.List[str]) -> None:
+        super().__init__(
+            cmd_parts, stdout_sink=NullLogSink(), stderr_sink=NullLogSink()
+        )
+        self.lines = 0
+
+    # pylint: disable=unused-argument
+    async def process_out(self, lines: tp.List[str], eof: bool) -> None:
+        self.lines += len(lines)
+
+
+class LegacyCountingComponent(CountingComponent):
+    """Byte-by-byte splitting with `readline()`, as previously implemented."""
+
+    def _parse_buf(self, buf: bytearray, data: bytes) -> tp.List[str]:
+        buf.extend(data)
+        lines = []
+        start = 0
+        for i in range(0, len(buf)):
+            if buf[i] == ord('\n'):
+                lines.append(buf[start:i].decode('utf-8'))
+                start = i + 1
+        del buf[0:start]
+
+        if len(data) == 0 and len(buf) > 0:
+            lines.append(buf.decode('utf-8'))
+        return lines
+
+    async def _read_stream(self, stream: asyncio.StreamReader, fn):
+        while True:
+            bs = await stream.readline()
+            await fn(bs)
+            if not bs:
+                return
+
+
+async def measure(comp_class: tp.Type[CountingComponent], size: int) -> None:
+    comp = comp_class([sys.executable, '-c', GENERATOR, str(size)])
+    start = time.perf_counter()
+    await comp.start()
+    await comp.wait()
+    duration = time.perf_counter() - start
+
+    print(
+        f'{comp_class.__name__}: {comp.lines} lines in {duration:.2f} s, '
+        f'{comp.lines / duration:.0f} lines/s, '
+        f'{size / duration / 1e6:.1f} MB/s'
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--size',
+        metavar='MB',
+        type=int,
+        default=1024,
+        help='Size of the synthetic log in MB'
+    )
+    parser.add_argument(
+        '--legacy',
+        action='store_const',
+        const=True,
+        default=False,
+        help='Also measure the previous byte-by-byte implementation'
+    )
+    args = parser.parse_args()
+
+    size = args.size * 1024 * 1024
+    asyncio.run(measure(CountingComponent, size))
+    if args.legacy:
+        asyncio.run(measure(LegacyCountingComponent, size))
+
+
+if __name__ == '__main__':
+    main()
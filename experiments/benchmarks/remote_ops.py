@@ -0,0 +1,152 @@
+# Copyright 2024 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Measures the latency of remote executor operations.
+
+Runs each operation repeatedly against a remote host and reports the median
+latency per operation for individual ssh connections with one scp per file,
+ssh connections multiplexed over a persistent master with files staged
+through the remote file cache, and optionally a simbricks agent. Run
+from the `experiments` directory:
+
+    python3 -m benchmarks.remote_ops --host node1 --workdir /tmp/bench
+
+With `--agent`, the agent is started over ssh. To measure an agent that is
+already listening, e.g. `python3 -m simbricks.orchestration.agent --listen
+7200` on localhost, also pass `--agent-port 7200`.
+"""
+
+import argparse
+import asyncio
+import collections
+import os
+import statistics
+import tempfile
+import time
+import typing as tp
+
+from simbricks.orchestration import exectools
+
+
+async def timed(
+    latency: tp.Dict[str, tp.List[float]], op: str, coro: tp.Awaitable
+) -> None:
+    start = time.perf_counter()
+    await coro
+    latency[op].append(time.perf_counter() - start)
+
+
+async def run_ops(executor: exectools.Executor, workdir: str,
+                  iterations: int) -> tp.Dict[str, tp.List[float]]:
+    latency = collections.defaultdict(list)
+    with tempfile.NamedTemporaryFile(dir=workdir, suffix='.bin') as f:
+        f.write(os.urandom(64 * 1024))
+        f.flush()
+
+        for i in range(iterations):
+            path = f'{workdir}/iter-{i}'
+            await timed(latency, 'mkdir', executor.mkdir(path))
+            await timed(latency, 'send_file', executor.send_file(f.name))
+            await timed(latency, 'await_file', executor.await_file(f.name))
+            await timed(latency, 'rmtree', executor.rmtree(path))
+
+            comp = executor.create_component(
+                'true', ['true'], canfail=True, verbose=False
+            )
+            start = time.perf_counter()
+            await comp.start()
+            await comp.wait()
+            latency['run'].append(time.perf_counter() - start)
+
+            comp = executor.create_component(
+                'sleep', ['sleep', '10'], canfail=True, verbose=False
+            )
+            await comp.start()
+            start = time.perf_counter()
+            await comp.int_term_kill()
+            await comp.wait()
+            latency['signal'].append(time.perf_counter() - start)
+    return latency
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--host', required=True, help='Remote host to run operations on'
+    )
+    parser.add_argument(
+        '--workdir',
+        required=True,
+        help='Scratch directory, must exist locally and on the remote host'
+    )
+    parser.add_argument(
+        '--iterations',
+        type=int,
+        default=20,
+        help='Number of times to repeat each operation'
+    )
+    parser.add_argument(
+        '--agent',
+        action='store_const',
+        const=True,
+        default=False,
+        help='Also measure the agent executor'
+    )
+    parser.add_argument(
+        '--agent-port',
+        metavar='PORT',
+        type=int,
+        default=None,
+        help='Connect to agent listening on this port instead of ssh'
+    )
+    args = parser.parse_args()
+
+    executors = {}
+    for control in [False, True]:
+        executor = exectools.RemoteExecutor(args.host, args.workdir)
+        executor.ssh_control = control
+        # without a master connection, also send each file with its own scp
+        # as before staging through the file cache
+        executor.stage_files = control
+        executors['multiplexed' if control else 'individual'] = executor
+    if args.agent or args.agent_port is not None:
+        executors['agent'] = exectools.AgentExecutor(
+            args.host, args.workdir, args.agent_port
+        )
+
+    results = {}
+    for name, executor in executors.items():
+        results[name] = asyncio.run(
+            run_ops(executor, args.workdir, args.iterations)
+        )
+
+    print(f'{"operation":<12}' + ''.join(f' {n:>12}' for n in results))
+    for op in results['individual']:
+        print(
+            f'{op:<12}' + ''.join(
+                f' {statistics.median(r[op]) * 1000:>10.1f}ms'
+                for r in results.values()
+            )
+        )
+
+
+if __name__ == '__main__':
+    main()
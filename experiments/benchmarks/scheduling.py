@@ -0,0 +1,202 @@
+# Copyright 2024 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Compares the makespan of run scheduling policies on a synthetic workload.
+
+Simulates `LocalParallelRuntime` executing a mix of small and large runs,
+some of which depend on a checkpoint run, without starting any simulators.
+Backfilling without history corresponds to the first session, the other
+policies use durations recorded with some error in a previous session.
+Run from the `experiments` directory:
+
+    python3 -m benchmarks.scheduling --cores 64 --runs 200
+"""
+
+import argparse
+import heapq
+import random
+import typing as tp
+
+from simbricks.orchestration import experiments
+from simbricks.orchestration.experiment.experiment_environment import ExpEnv
+from simbricks.orchestration.runtime import Run, RunHistory, RunScheduler
+
+
+class SyntheticExperiment(experiments.Experiment):
+
+    def __init__(self, name: str, cores: int, mem: int) -> None:
+        super().__init__(name)
+        self.cores = cores
+        self.mem = mem
+
+    def resreq_cores(self) -> int:
+        return self.cores
+
+    def resreq_mem(self) -> int:
+        return self.mem
+
+
+def make_workload(n: int, cores: int,
+                  seed: int) -> tp.Tuple[tp.List[Run], tp.Dict[Run, float]]:
+    """Returns runs in the order they are added and their durations."""
+    rng = random.Random(seed)
+    noprereq = []
+    prereq = []
+    durations = {}
+    i = 0
+    while len(noprereq) + len(prereq) < n:
+        size = rng.choice([1, 1, 2, 2, 2, 4, 4, 8, 16])
+        exp = SyntheticExperiment(
+            f'exp{i}', min(cores, size * rng.randint(1, 4)), 1024 * size
+        )
+        env = ExpEnv('.', f'/tmp/bench/{i}', f'/tmp/bench/cp/{i}')
+        duration = rng.lognormvariate(3 + size / 8, 0.8)
+        if rng.random() < 0.2:
+            # checkpoint run followed by runs restoring from it
+            env.create_cp = True
+            cp_run = Run(exp, 0, env, '')
+            noprereq.append(cp_run)
+            durations[cp_run] = duration / 2
+            for j in range(rng.randint(1, 4)):
+                run = Run(exp, j + 1, env, '', cp_run)
+                prereq.append(run)
+                durations[run] = duration
+        else:
+            run = Run(exp, 0, env, '')
+            noprereq.append(run)
+            durations[run] = duration
+        i += 1
+    return noprereq + prereq, durations
+
+
+def fifo_makespan(
+    runs: tp.List[Run], durations: tp.Dict[Run, float], cores: int
+) -> float:
+    """Previous policy: start runs strictly in order, blocking on the head."""
+    now = 0.0
+    used = 0
+    running: tp.List[tp.Tuple[float, int, Run]] = []
+    complete = set()
+
+    def wait_completion() -> None:
+        nonlocal now, used
+        end, _, run = heapq.heappop(running)
+        now = end
+        used -= run.experiment.resreq_cores()
+        complete.add(run)
+
+    for i, run in enumerate(runs):
+        while cores - used < run.experiment.resreq_cores():
+            wait_completion()
+        while run.prereq is not None and run.prereq not in complete:
+            wait_completion()
+        used += run.experiment.resreq_cores()
+        heapq.heappush(running, (now + durations[run], i, run))
+    while running:
+        wait_completion()
+    return now
+
+
+def scheduler_makespan(
+    runs: tp.List[Run],
+    durations: tp.Dict[Run, float],
+    cores: int,
+    history: tp.Optional[RunHistory],
+    longest_first=False
+) -> float:
+    scheduler = RunScheduler(cores, history=history)
+    scheduler.longest_first = longest_first
+    for run in runs:
+        scheduler.add(run)
+
+    now = 0.0
+    running: tp.List[tp.Tuple[float, int, Run]] = []
+    i = 0
+    while True:
+        for run in scheduler.schedule(now):
+            heapq.heappush(running, (now + durations[run], i, run))
+            i += 1
+        if not running:
+            break
+        end, _, run = heapq.heappop(running)
+        now = end
+        scheduler.finished(run)
+    assert not scheduler.waiting
+    return now
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--cores', type=int, default=64, help='Number of cores available'
+    )
+    parser.add_argument(
+        '--runs', type=int, default=200, help='Number of runs in workload'
+    )
+    parser.add_argument(
+        '--seeds', type=int, default=5, help='Number of workloads to average'
+    )
+    parser.add_argument(
+        '--noise',
+        type=float,
+        default=0.2,
+        help='Relative error of the recorded durations'
+    )
+    args = parser.parse_args()
+
+    totals = {
+        'fifo': 0.0,
+        'backfill': 0.0,
+        'shortest-first': 0.0,
+        'longest-first': 0.0
+    }
+    for seed in range(args.seeds):
+        runs, durations = make_workload(args.runs, args.cores, seed)
+
+        # durations recorded in a previous session, off by up to `noise`
+        rng = random.Random(seed)
+        history = RunHistory()
+        for run in runs:
+            err = 1 + rng.uniform(-args.noise, args.noise)
+            history.record(run, durations[run] * err)
+
+        totals['fifo'] += fifo_makespan(runs, durations, args.cores)
+        totals['backfill'] += scheduler_makespan(
+            runs, durations, args.cores, None
+        )
+        totals['shortest-first'] += scheduler_makespan(
+            runs, durations, args.cores, history
+        )
+        totals['longest-first'] += scheduler_makespan(
+            runs, durations, args.cores, history, longest_first=True
+        )
+
+    base = totals['fifo']
+    print(f'{"policy":<18} {"makespan":>10} {"relative":>9}')
+    for policy, total in totals.items():
+        print(
+            f'{policy:<18} {total / args.seeds:>9.0f}s '
+            f'{total / base:>9.2f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 
+import gzip
 import json
 import os
 import sys
@@ -46,7 +47,18 @@ def scan_json_file(filepath):
             sims =  data['sims']
             for key, value in sims.items():
                 if 'host.client' in key:
-                    for line in value['stdout']:
+                    if 'stdout_file' in value:
+                        # output stored as compressed stream next to the json
+                        path = os.path.join(
+                            os.path.dirname(filepath), value['stdout_file']
+                        )
+                        if not os.path.exists(path):
+                            continue
+                        with gzip.open(path, 'rt', encoding='utf-8') as f:
+                            lines = f.readlines()
+                    else:
+                        lines = value['stdout']
+                    for line in lines:
                         if "FCT: " in line:
                             parts = line.split("FCT: ", 1)[1].split()
                             # print(parts[0])
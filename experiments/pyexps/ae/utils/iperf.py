@@ -22,8 +22,16 @@
 
 import fnmatch
 import glob
-import json
+import os
 import re
+import sys
+
+# experiment output is loaded with the loader shared with results/
+sys.path.append(
+    os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../..'))
+)
+# pylint: disable=wrong-import-position
+from results.utils.exp_output import load_output
 
 
 def parse_iperf_run(data, skip=1, use=8):
@@ -71,8 +79,7 @@ def parse_iperf(basename, skip=1, use=8):
             # skip checkpoints
             continue
 
-        with open(path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = load_output(path)
         result = parse_iperf_run(data, skip, use)
         if result is not None:
             runs.append(result)
@@ -20,9 +20,16 @@
 # TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
 # SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
-import json
 import os
 import re
+import sys
+
+# experiment output is loaded with the loader shared with results/
+sys.path.append(
+    os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../..'))
+)
+# pylint: disable=wrong-import-position
+from results.utils.exp_output import load_output
 
 
 def parse_netperf_run(path):
@@ -30,8 +37,7 @@ def parse_netperf_run(path):
 
     if not os.path.exists(path):
         return ret
-    with open(path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    data = load_output(path)
 
     ret['simtime'] = data['end_time'] - data['start_time']
 
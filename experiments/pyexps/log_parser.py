@@ -27,6 +27,13 @@ import pathlib
 import re
 import sys
 
+# experiment output is loaded with the loader shared with results/
+sys.path.append(
+    os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
+)
+# pylint: disable=wrong-import-position
+from results.utils.exp_output import sim_output
+
 # How to use
 # $ python3 pyexps/parser.py out/qemu-wire-ib-TCPs-1.json
 #
@@ -54,19 +61,20 @@ with open(log_file, 'r', encoding='utf-8') as log:
         start_end_file.write('success: ' + str(exp_log['success']))
 
         for i in exp_log['sims']:
-            #print(i)
+            sim = exp_log['sims'][i]
             simdir = os.path.join(outdir, i)
 
             with open(simdir, 'w', encoding='utf-8') as sim_out_file:
+                if 'class' in sim:
+                    sim_out_file.write('class\n' + sim['class'] + '\n')
+                if 'cmd' in sim:
+                    sim_out_file.write('cmd\n')
+                    for part in sim['cmd']:
+                        sim_out_file.write(part + '\n')
 
-                for j in exp_log['sims'][i]:
-                    #print(j)
-                    sim_out_file.write(j + '\n')
-
-                    if j == 'class':
-                        sim_out_file.write(exp_log['sims'][i][j] + '\n')
-
-                    else:
-
-                        for k in exp_log['sims'][i][j]:
-                            sim_out_file.write(k + '\n')
+                for stream in ('stdout', 'stderr'):
+                    if stream not in sim and f'{stream}_file' not in sim:
+                        continue
+                    sim_out_file.write(stream + '\n')
+                    for line in sim_output(log_file, i, stream):
+                        sim_out_file.write(line + '\n')
@@ -34,9 +34,9 @@ import signal
 import sys
 import typing as tp
 
-from simbricks.orchestration import exectools
+from simbricks.orchestration import checkpoints, diskimages, exectools
 from simbricks.orchestration import experiments as exps
-from simbricks.orchestration import runtime
+from simbricks.orchestration import nodeconfig, placement, resources, runtime
 from simbricks.orchestration.experiment import experiment_environment
 
 
@@ -107,7 +107,27 @@ def parse_args() -> argparse.Namespace:
         metavar='S',
         type=int,
         default=None,
-        help='Enable periodic sigusr1 to each simulator every S seconds.'
+        help=(
+            'Enable periodic sigusr1 to each simulator every S seconds. The '
+            'dumps are parsed into a per-link synchronization report.'
+        )
+    )
+    parser.add_argument(
+        '--telemetry-int',
+        metavar='S',
+        type=float,
+        default=None,
+        help='Sample resource usage of each simulator every S seconds.'
+    )
+    parser.add_argument(
+        '--term-grace',
+        metavar='S',
+        type=float,
+        default=5,
+        help=(
+            'Seconds simulators get to exit on shutdown after SIGINT, and '
+            'again after SIGTERM, before being killed.'
+        )
     )
 
     # arguments for the experiment environment
@@ -140,6 +160,33 @@ def parse_args() -> argparse.Namespace:
         default='./out/',
         help='Checkpoint directory base'
     )
+    g_env.add_argument(
+        '--cp-cache',
+        metavar='DIR',
+        type=str,
+        default=None,
+        help=(
+            'Share checkpoints between experiments with identical hosts, '
+            'stored in DIR by a hash of the state before the checkpoint'
+        )
+    )
+    g_env.add_argument(
+        '--cp-budget',
+        metavar='GB',
+        type=float,
+        default=None,
+        help=(
+            'Delete the least recently used checkpoints before running until '
+            'the rest take up at most GB'
+        )
+    )
+    g_env.add_argument(
+        '--cp-rebuild',
+        action='store_const',
+        const=True,
+        default=False,
+        help='Create checkpoints again even if valid ones exist'
+    )
     g_env.add_argument(
         '--hosts',
         metavar='JSON_FILE',
@@ -179,6 +226,51 @@ def parse_args() -> argparse.Namespace:
         default=None,
         help='Memory limit for parallel runs (in MB)'
     )
+    g_par.add_argument(
+        '--prep-ahead',
+        metavar='N',
+        type=int,
+        default=4,
+        help='Prepare up to N upcoming runs while waiting for free cores.'
+    )
+    g_par.add_argument(
+        '--disk-pool',
+        metavar='N',
+        type=int,
+        default=0,
+        help='Keep N disk images per base image created in the background.'
+    )
+    g_par.add_argument(
+        '--disk-reflink',
+        action='store_const',
+        const=True,
+        default=False,
+        help=(
+            'Create disk images as reflink clones where the file system '
+            'supports them, instead of qcow2 overlays.'
+        )
+    )
+    g_par.add_argument(
+        '--longest-first',
+        action='store_const',
+        const=True,
+        default=False,
+        help='Start runs expected to take longest first to reduce makespan'
+    )
+    g_par.add_argument(
+        '--pin',
+        action='store_const',
+        const=True,
+        default=False,
+        help='Pin simulators to CPUs, keeping connected ones on one NUMA node'
+    )
+    g_par.add_argument(
+        '--learned-resreq',
+        action='store_const',
+        const=True,
+        default=False,
+        help='Base resource requirements on usage measured in previous runs'
+    )
 
     # arguments for the slurm runtime
     g_slurm = parser.add_argument_group('Slurm Runtime')
@@ -197,6 +289,34 @@ def parse_args() -> argparse.Namespace:
         default='./slurm/',
         help='Slurm communication directory'
     )
+    g_slurm.add_argument(
+        '--slurm-pack',
+        metavar='N',
+        type=int,
+        default=1,
+        help='Number of runs to pack into one Slurm allocation'
+    )
+    g_slurm.add_argument(
+        '--slurm-cores',
+        metavar='N',
+        type=int,
+        default=None,
+        help='Cores to request per run (default: experiment requirements)'
+    )
+    g_slurm.add_argument(
+        '--slurm-exclude',
+        metavar='NODES',
+        type=str,
+        default=None,
+        help='Nodes to exclude from Slurm allocations'
+    )
+    g_slurm.add_argument(
+        '--slurm-array-limit',
+        metavar='N',
+        type=int,
+        default=None,
+        help='Maximum number of simultaneously running tasks per job array'
+    )
 
     # arguments for the distributed runtime
     g_dist = parser.add_argument_group('Distributed Runtime')
@@ -208,12 +328,26 @@ def parse_args() -> argparse.Namespace:
         default='sequential',
         help='Use sequential distributed runtime instead of local'
     )
+    g_dist.add_argument(
+        '--dist-parallel',
+        dest='runtime',
+        action='store_const',
+        const='dist_parallel',
+        default='sequential',
+        help=(
+            'Use parallel distributed runtime, running experiments '
+            'concurrently on disjoint subsets of the hosts'
+        )
+    )
     g_dist.add_argument(
         '--auto-dist',
         action='store_const',
         const=True,
         default=False,
-        help='Automatically distribute non-distributed experiments'
+        help=(
+            'Automatically distribute non-distributed experiments across all '
+            'hosts'
+        )
     )
     g_dist.add_argument(
         '--proxy-type',
@@ -241,9 +375,20 @@ def load_executors(path: str) -> tp.List[exectools.Executor]:
                     ex.ssh_extra_args += h['ssh_args']
                 if 'scp_args' in h:
                     ex.scp_extra_args += h['scp_args']
+                if 'file_cache' in h:
+                    ex.file_cache = h['file_cache']
+            elif h['type'] == 'agent':
+                ex = exectools.AgentExecutor(
+                    h['host'], h['workdir'], h.get('port')
+                )
+                ex.token = h.get('token')
+                if 'ssh_args' in h:
+                    ex.ssh_extra_args += h['ssh_args']
             else:
                 raise RuntimeError('invalid host type "' + h['type'] + '"')
             ex.ip = h['ip']
+            ex.cores = h.get('cores')
+            ex.mem = h.get('mem')
             exs.append(ex)
     return exs
 
@@ -260,19 +405,23 @@ def add_exp(
     e: exps.Experiment,
     rt: runtime.Runtime,
     run: int,
+    *,
     prereq: tp.Optional[runtime.Run],
     create_cp: bool,
     restore_cp: bool,
     no_simbricks: bool,
-    args: argparse.Namespace
+    args: argparse.Namespace,
+    cpdir: tp.Optional[str] = None,
+    force=False
 ):
     outpath = f'{args.outdir}/{e.name}-{run}.json'
-    if os.path.exists(outpath) and not args.force:
+    if os.path.exists(outpath) and not (args.force or force):
         print(f'skip {e.name} run {run}')
         return None
 
     workdir = f'{args.workdir}/{e.name}/{run}'
-    cpdir = f'{args.cpdir}/{e.name}/0'
+    if cpdir is None:
+        cpdir = f'{args.cpdir}/{e.name}/0'
     if args.shmdir is not None:
         shmdir = f'{args.shmdir}/{e.name}/{run}'
 
@@ -281,6 +430,7 @@ def add_exp(
     env.restore_cp = restore_cp
     env.no_simbricks = no_simbricks
     env.pcap_file = ''
+    env.tar_cache_dir = os.path.abspath(f'{args.workdir}/.tar-cache')
     if args.pcap:
         env.pcap_file = workdir + '/pcap'
     if args.shmdir is not None:
@@ -293,6 +443,7 @@ def add_exp(
 
 def main():
     args = parse_args()
+    nodeconfig.prune_tar_cache(f'{args.workdir}/.tar-cache')
     if args.hosts is None:
         executors = [exectools.LocalExecutor()]
     else:
@@ -305,12 +456,38 @@ def main():
             cores=args.cores,
             mem=args.mem,
             verbose=args.verbose,
-            executor=executors[0]
+            executor=executors[0],
+            history=runtime.RunHistory(f'{args.outdir}/.run-history.json')
         )
+        rt.longest_first = args.longest_first
+        rt.prep_ahead = args.prep_ahead
+        if args.disk_pool > 0 or args.disk_reflink:
+            rt.disk_pool = diskimages.DiskImagePool(
+                f'{args.workdir}/.disk-pool', args.disk_pool, args.disk_reflink
+            )
+        if args.pin:
+            rt.allocator = placement.CpuAllocator()
+        rt.resource_db = resources.ResourceDB(
+            f'{args.outdir}/.resource-db.json'
+        )
+        if args.learned_resreq:
+            resources.use_learned(rt.resource_db)
     elif args.runtime == 'slurm':
         rt = runtime.SlurmRuntime(args.slurmdir, args, verbose=args.verbose)
+        rt.pack = args.slurm_pack
+        rt.cores = args.slurm_cores
+        rt.exclude = args.slurm_exclude
+        rt.array_limit = args.slurm_array_limit
     elif args.runtime == 'dist':
         rt = runtime.DistributedSimpleRuntime(executors, verbose=args.verbose)
+    elif args.runtime == 'dist_parallel':
+        if args.auto_dist:
+            print(
+                'Warning: --auto-dist distributes each experiment across all '
+                'hosts, so --dist-parallel only runs one at a time',
+                file=sys.stderr
+            )
+        rt = runtime.DistributedParallelRuntime(executors, verbose=args.verbose)
     else:
         warn_multi_exec(executors)
         rt = runtime.LocalSimpleRuntime(
@@ -319,6 +496,9 @@ def main():
 
     if args.profile_int:
         rt.enable_profiler(args.profile_int)
+    if args.telemetry_int:
+        rt.enable_telemetry(args.telemetry_int)
+    rt.term_grace = args.term_grace
 
     # load experiments
     if not args.pickled:
@@ -344,6 +524,17 @@ def main():
                 print(e.name)
             sys.exit(0)
 
+        cp_cache = None
+        if args.cp_cache is not None:
+            cp_cache = checkpoints.CheckpointCache(args.cp_cache)
+        key_env = experiment_environment.ExpEnv(
+            args.repo, args.workdir, args.cpdir
+        )
+        # runs creating checkpoints that are missing or invalid, by directory
+        cp_runs: tp.Dict[str, tp.Optional[runtime.Run]] = {}
+        # checkpoint directories restored from in this sweep
+        cp_used: tp.Set[str] = set()
+
         for e in experiments:
             if args.auto_dist and not isinstance(e, exps.DistributedExperiment):
                 e = runtime.auto_dist(e, executors, args.proxy_type)
@@ -361,16 +552,66 @@ def main():
             # if this is an experiment with a checkpoint we might have to create
             # it
             no_simbricks = e.no_simbricks
-            if e.checkpoint:
+            prereq = None
+            cpdir = None
+            if e.checkpoint and isinstance(e, exps.DistributedExperiment):
+                # checkpoints are on the executors, so they cannot be checked
+                # here
                 prereq = add_exp(
-                    e, rt, 0, None, True, False, no_simbricks, args
+                    e,
+                    rt,
+                    0,
+                    prereq=None,
+                    create_cp=True,
+                    restore_cp=False,
+                    no_simbricks=no_simbricks,
+                    args=args
                 )
-            else:
-                prereq = None
+            elif e.checkpoint:
+                key = e.checkpoint_key(key_env)
+                if cp_cache is not None:
+                    cpdir = cp_cache.cpdir(key)
+                else:
+                    cpdir = os.path.abspath(f'{args.cpdir}/{e.name}/0')
+                cp_used.add(cpdir)
+                problem = checkpoints.validate(cpdir, key)
+                if cpdir in cp_runs:
+                    # another experiment in this sweep creates it
+                    prereq = cp_runs[cpdir]
+                elif problem is None and not args.cp_rebuild:
+                    if args.verbose:
+                        print(f'{e.name}: using checkpoint in {cpdir}')
+                elif args.force or not all(
+                    os.path.exists(f'{args.outdir}/{e.name}-{run}.json')
+                    for run in range(args.firstrun, args.firstrun + args.runs)
+                ):
+                    if args.verbose and problem is not None:
+                        print(f'{e.name}: creating checkpoint, {problem}')
+                    prereq = add_exp(
+                        e,
+                        rt,
+                        0,
+                        prereq=None,
+                        create_cp=True,
+                        restore_cp=False,
+                        no_simbricks=no_simbricks,
+                        args=args,
+                        cpdir=cpdir,
+                        force=True
+                    )
+                    cp_runs[cpdir] = prereq
 
             for run in range(args.firstrun, args.firstrun + args.runs):
                 add_exp(
-                    e, rt, run, prereq, False, e.checkpoint, no_simbricks, args
+                    e,
+                    rt,
+                    run,
+                    prereq=prereq,
+                    create_cp=False,
+                    restore_cp=e.checkpoint,
+                    no_simbricks=no_simbricks,
+                    args=args,
+                    cpdir=cpdir
                 )
     else:
         # otherwise load pickled run object
@@ -378,6 +619,15 @@ def main():
             with open(path, 'rb') as f:
                 rt.add_run(pickle.load(f))
 
+    if args.cp_budget is not None and not args.pickled:
+        roots = [args.cpdir]
+        if cp_cache is not None:
+            roots.append(cp_cache.path)
+        manager = checkpoints.CheckpointManager(roots)
+        budget = int(args.cp_budget * 1024 * 1024 * 1024)
+        for info in manager.evict(budget, keep=cp_used):
+            print(f'evicted checkpoint {info.cpdir} ({info.size()} bytes)')
+
     # register interrupt handler
     signal.signal(signal.SIGINT, lambda *_: rt.interrupt())
 
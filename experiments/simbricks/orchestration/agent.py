@@ -0,0 +1,401 @@
+# Copyright 2024 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+Agent executing commands for a distributed experiment on a worker host.
+
+The agent is talked to by :class:`simbricks.orchestration.exectools.
+AgentExecutor` over a single byte stream, either a TCP connection or the stdin
+and stdout of an ssh session. All requests, process output, and file contents
+are multiplexed over this stream as frames, so starting a simulator, signaling
+it, or waiting for its sockets does not require a new ssh connection.
+
+The agent only depends on the Python standard library, so the executor can
+start it on a worker by passing this file's source to the remote interpreter.
+It can also be run as a long-lived daemon:
+
+    python3 -m simbricks.orchestration.agent --listen 127.0.0.1:7200
+
+This executes arbitrary commands for anyone who can connect. Only listen on
+localhost and forward the port over ssh, or set a token with `--token`, which
+is required for listening on any other address.
+"""
+
+import argparse
+import asyncio
+import hmac
+import ipaddress
+import json
+import os
+import shutil
+import signal
+import struct
+import sys
+import typing as tp
+
+VERSION = 1
+
+# frame types
+REQ = 1
+"""Client request, JSON payload with `op` and its arguments."""
+RESP = 2
+"""Response to the request with the frame's channel as id, JSON payload."""
+STDOUT = 3
+"""Output of the process started by the request on this channel."""
+STDERR = 4
+EXIT = 5
+"""Process on this channel has exited, JSON payload with `rc`."""
+STDIN = 6
+"""Input for a process, an empty payload closes its stdin."""
+DATA = 7
+"""File contents for a `put_file` request."""
+
+FRAME_HDR = struct.Struct('!BII')
+"""Frame header: type, channel, payload length."""
+READ_SIZE = 256 * 1024
+
+
+def encode_frame(ftype: int, chan: int, payload: bytes = b'') -> bytes:
+    return FRAME_HDR.pack(ftype, chan, len(payload)) + payload
+
+
+async def read_frame(
+    reader: asyncio.StreamReader
+) -> tp.Optional[tp.Tuple[int, int, bytes]]:
+    """Reads the next frame, returns None on EOF."""
+    try:
+        hdr = await reader.readexactly(FRAME_HDR.size)
+        ftype, chan, length = FRAME_HDR.unpack(hdr)
+        payload = await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        return None
+    return ftype, chan, payload
+
+
+class AgentSession(object):
+    """Serves one client connection."""
+
+    def __init__(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        token: tp.Optional[str] = None
+    ) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.token = token
+        self.authenticated = False
+        self.procs: tp.Dict[int, asyncio.subprocess.Process] = {}
+        self.groups: tp.Set[int] = set()
+        """Channels of processes running in their own process group."""
+        self.uploads: tp.Dict[int, tp.Tuple[tp.BinaryIO, dict]] = {}
+        self.tasks: tp.Set[asyncio.Task] = set()
+
+    def send(self, ftype: int, chan: int, payload: bytes = b'') -> None:
+        self.writer.write(encode_frame(ftype, chan, payload))
+
+    def send_json(self, ftype: int, chan: int, obj: dict) -> None:
+        self.send(ftype, chan, json.dumps(obj).encode('utf-8'))
+
+    def respond(self, req_id: int, result: tp.Optional[dict] = None) -> None:
+        # requests with id 0 do not expect a response
+        if req_id != 0:
+            self.send_json(RESP, req_id, result or {})
+
+    async def run(self) -> None:
+        try:
+            while True:
+                frame = await read_frame(self.reader)
+                if frame is None:
+                    break
+                ftype, chan, payload = frame
+                if ftype == REQ:
+                    self.dispatch(chan, json.loads(payload))
+                elif not self.authenticated:
+                    break
+                elif ftype == STDIN:
+                    self.stdin(chan, payload)
+                elif ftype == DATA:
+                    self.data(chan, payload)
+                else:
+                    print(f'agent: unknown frame type {ftype}', file=sys.stderr)
+        finally:
+            await self.cleanup()
+
+    def dispatch(self, req_id: int, req: dict) -> None:
+        op = req['op']
+        if not self.authenticated:
+            if op != 'hello':
+                raise RuntimeError('expected hello request')
+            if self.token is not None and not hmac.compare_digest(
+                str(req.get('token') or '').encode(), self.token.encode()
+            ):
+                self.respond(req_id, {'error': 'invalid token'})
+                raise RuntimeError('client sent invalid token')
+            self.authenticated = True
+            self.respond(req_id, {'version': VERSION, 'pid': os.getpid()})
+        elif op == 'put_file':
+            # has to happen before the following data frames are processed
+            try:
+                self.put_file(req_id, req)
+            except OSError as e:
+                self.respond(req_id, {'error': str(e)})
+        else:
+            task = asyncio.create_task(self.handle(req_id, op, req))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def handle(self, req_id: int, op: str, req: dict) -> None:
+        try:
+            fn = getattr(self, 'op_' + op)
+            result = await fn(req_id, req)
+        except Exception as e:  # pylint: disable=broad-except
+            if req_id == 0:
+                print(f'agent: {op} failed: {e}', file=sys.stderr)
+            result = {'error': f'{type(e).__name__}: {e}'}
+        self.respond(req_id, result)
+
+    async def op_spawn(self, req_id: int, req: dict) -> dict:
+        proc = await asyncio.create_subprocess_exec(
+            *req['cmd'],
+            cwd=req.get('cwd'),
+            stdin=(
+                asyncio.subprocess.PIPE
+                if req.get('stdin') else asyncio.subprocess.DEVNULL
+            ),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=bool(req.get('group')),
+        )
+        self.procs[req_id] = proc
+        if req.get('group'):
+            self.groups.add(req_id)
+        task = asyncio.create_task(self.forward(req_id, proc))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return {'pid': proc.pid}
+
+    async def forward_stream(
+        self, chan: int, ftype: int, stream: asyncio.StreamReader
+    ) -> None:
+        while True:
+            bs = await stream.read(READ_SIZE)
+            # empty frame signals EOF
+            self.send(ftype, chan, bs)
+            if not bs:
+                return
+            await self.writer.drain()
+
+    async def forward(
+        self, chan: int, proc: asyncio.subprocess.Process
+    ) -> None:
+        await asyncio.gather(
+            self.forward_stream(chan, STDOUT, proc.stdout),
+            self.forward_stream(chan, STDERR, proc.stderr)
+        )
+        rc = await proc.wait()
+        del self.procs[chan]
+        self.groups.discard(chan)
+        self.send_json(EXIT, chan, {'rc': rc})
+
+    def stdin(self, chan: int, payload: bytes) -> None:
+        proc = self.procs.get(chan)
+        if proc is None or proc.stdin is None:
+            return
+        if payload:
+            proc.stdin.write(payload)
+        else:
+            proc.stdin.close()
+
+    def kill_proc(self, chan: int, sig: int) -> None:
+        """Signals a process, or its whole process group if it has one."""
+        proc = self.procs.get(chan)
+        if proc is None or proc.returncode is not None:
+            return
+        if chan in self.groups:
+            try:
+                os.killpg(proc.pid, sig)
+            except ProcessLookupError:
+                pass
+        else:
+            proc.send_signal(sig)
+
+    # pylint: disable=unused-argument
+    async def op_signal(self, req_id: int, req: dict) -> dict:
+        self.kill_proc(req['chan'], signal.Signals[req['sig']])
+        return {}
+
+    # pylint: disable=unused-argument
+    async def op_await_files(self, req_id: int, req: dict) -> dict:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + req['timeout']
+        missing = list(req['paths'])
+        while True:
+            missing = [p for p in missing if not os.path.exists(p)]
+            if not missing:
+                return {}
+            if loop.time() >= deadline:
+                return {'error': 'timeout', 'missing': missing}
+            await asyncio.sleep(req.get('delay', 0.01))
+
+    # pylint: disable=unused-argument
+    async def op_mkdir(self, req_id: int, req: dict) -> dict:
+        os.makedirs(req['path'], exist_ok=True)
+        return {}
+
+    # pylint: disable=unused-argument
+    async def op_rmtree(self, req_id: int, req: dict) -> dict:
+
+        def rmtree(path: str) -> None:
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path)
+            elif os.path.lexists(path):
+                os.unlink(path)
+
+        await asyncio.get_running_loop().run_in_executor(
+            None, rmtree, req['path']
+        )
+        return {}
+
+    def put_file(self, req_id: int, req: dict) -> None:
+        req['tmp'] = f'{req["path"]}.agent-{os.getpid()}-{req_id}'
+        f = open(req['tmp'], 'wb')  # pylint: disable=consider-using-with
+        self.uploads[req_id] = (f, req)
+        if req['size'] == 0:
+            self.finish_upload(req_id)
+
+    def data(self, chan: int, payload: bytes) -> None:
+        if chan not in self.uploads:
+            return
+        f, req = self.uploads[chan]
+        try:
+            f.write(payload)
+        except OSError as e:
+            req['error'] = str(e)
+        if f.tell() >= req['size']:
+            self.finish_upload(chan)
+
+    def finish_upload(self, req_id: int) -> None:
+        f, req = self.uploads.pop(req_id)
+        try:
+            f.close()
+            if 'error' in req:
+                os.unlink(req['tmp'])
+                self.respond(req_id, {'error': req['error']})
+                return
+            os.chmod(req['tmp'], req['mode'])
+            os.replace(req['tmp'], req['path'])
+        except OSError as e:
+            self.respond(req_id, {'error': str(e)})
+            return
+        self.respond(req_id)
+
+    async def cleanup(self) -> None:
+        """Kills all processes left behind by a disconnected client."""
+        for chan in list(self.procs):
+            self.kill_proc(chan, signal.SIGKILL)
+        for f, req in self.uploads.values():
+            f.close()
+            os.unlink(req['tmp'])
+        self.uploads.clear()
+        for task in list(self.tasks):
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.writer.close()
+
+
+async def serve_stdio(token: tp.Optional[str]) -> None:
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=READ_SIZE)
+    await loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader), sys.stdin
+    )
+    transport, protocol = await loop.connect_write_pipe(
+        asyncio.streams.FlowControlMixin, sys.stdout
+    )
+    writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+    await AgentSession(reader, writer, token).run()
+
+
+async def serve_tcp(host: str, port: int, token: tp.Optional[str]) -> None:
+
+    async def client(
+        reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        peer = writer.get_extra_info('peername')
+        print(f'agent: client {peer} connected', file=sys.stderr, flush=True)
+        try:
+            await AgentSession(reader, writer, token).run()
+        except Exception as e:  # pylint: disable=broad-except
+            print(f'agent: client {peer}: {e}', file=sys.stderr, flush=True)
+        print(f'agent: client {peer} disconnected', file=sys.stderr, flush=True)
+
+    server = await asyncio.start_server(client, host, port, limit=READ_SIZE)
+    async with server:
+        await server.serve_forever()
+
+
+def is_loopback(host: str) -> bool:
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        # host names other than localhost may resolve to anything
+        return False
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog='simbricks-agent')
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument(
+        '--listen',
+        metavar='[ADDR:]PORT',
+        type=str,
+        help='Accept clients on TCP port'
+    )
+    mode.add_argument(
+        '--stdio',
+        action='store_const',
+        const=True,
+        default=False,
+        help='Serve a single client over stdin and stdout'
+    )
+    parser.add_argument(
+        '--token',
+        type=str,
+        default=os.environ.get('SIMBRICKS_AGENT_TOKEN'),
+        help='Secret clients have to present'
+    )
+    args = parser.parse_args()
+
+    if args.stdio:
+        asyncio.run(serve_stdio(args.token))
+    else:
+        host, _, port = args.listen.rpartition(':')
+        host = host or '127.0.0.1'
+        if args.token is None and not is_loopback(host):
+            parser.error(f'--token is required to listen on {host}')
+        asyncio.run(serve_tcp(host, int(port), args.token))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+# Copyright 2024 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+Bookkeeping for checkpoint directories: provenance, validation before
+restoring, sharing between experiments with identical hosts and eviction
+under a disk budget.
+"""
+
+import json
+import os
+import shutil
+import time
+import typing as tp
+
+if tp.TYPE_CHECKING:  # prevent cyclic import
+    from simbricks.orchestration.experiment.experiment_environment import ExpEnv
+    from simbricks.orchestration.experiments import Experiment
+
+METADATA_FILE = '.checkpoint.json'
+"""
+File in a checkpoint directory recording its provenance. It is only written
+once the checkpoint run succeeded, so it also marks the checkpoint complete.
+Its modification time is the time the checkpoint was last restored from.
+"""
+
+
+class CheckpointInfo(object):
+    """Provenance of the checkpoints in one checkpoint directory."""
+
+    def __init__(
+        self,
+        cpdir: str,
+        key: str,
+        files: tp.Dict[str, int],
+        created: float,
+        last_used: float
+    ) -> None:
+        self.cpdir = cpdir
+        self.key = key
+        """`Experiment.checkpoint_key()` of the experiment that created it."""
+        self.files = files
+        """Size of each checkpoint file, relative to `cpdir`."""
+        self.created = created
+        self.last_used = last_used
+
+    def size(self) -> int:
+        return sum(self.files.values())
+
+    def validate(self, key: tp.Optional[str] = None) -> tp.Optional[str]:
+        """
+        Returns why the checkpoint cannot be restored from, or None if it can.
+
+        Checks that it was created for `key`, if given, and that all files
+        written by the checkpoint run still exist with their original size,
+        which catches checkpoints that were partially deleted or truncated
+        without reading them in full.
+        """
+        if key is not None and key != self.key:
+            return 'created for a different configuration'
+        for (name, size) in self.files.items():
+            try:
+                actual = os.path.getsize(os.path.join(self.cpdir, name))
+            except OSError:
+                return f'{name} is missing'
+            if actual != size:
+                return f'{name} has size {actual} instead of {size}'
+        return None
+
+    @staticmethod
+    def load(cpdir: str) -> tp.Optional['CheckpointInfo']:
+        """Provenance of the checkpoint in `cpdir`, None if it has none."""
+        path = os.path.join(cpdir, METADATA_FILE)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            last_used = os.path.getmtime(path)
+        except (OSError, ValueError):
+            return None
+        return CheckpointInfo(
+            cpdir, meta['key'], meta['files'], meta['created'], last_used
+        )
+
+
+def record(exp: 'Experiment', env: 'ExpEnv') -> tp.Optional[CheckpointInfo]:
+    """
+    Records the provenance of the checkpoint just created for `exp` in
+    `env.cpdir`. Returns None without recording anything if a host did not
+    write its checkpoint.
+    """
+    files = {}
+    for output in exp.checkpoint_outputs(env):
+        paths = []
+        if os.path.isdir(output):
+            for (dirpath, _, filenames) in os.walk(output):
+                paths.extend(os.path.join(dirpath, f) for f in filenames)
+        elif os.path.isfile(output):
+            paths.append(output)
+        if not paths:
+            return None
+        for path in paths:
+            name = os.path.relpath(path, env.cpdir)
+            files[name] = os.path.getsize(path)
+
+    now = time.time()
+    info = CheckpointInfo(env.cpdir, exp.checkpoint_key(env), files, now, now)
+    path = os.path.join(env.cpdir, METADATA_FILE)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({
+            'key': info.key, 'files': info.files, 'created': info.created
+        },
+                  f,
+                  indent=4)
+    os.replace(tmp, path)
+    return info
+
+
+def validate(cpdir: str, key: tp.Optional[str] = None) -> tp.Optional[str]:
+    """
+    Returns why the checkpoint in `cpdir` cannot be restored from, or None if
+    it can. See `CheckpointInfo.validate()`.
+    """
+    info = CheckpointInfo.load(cpdir)
+    if info is None:
+        return 'no complete checkpoint'
+    return info.validate(key)
+
+
+def touch(cpdir: str) -> None:
+    """Records that the checkpoint in `cpdir` is used now."""
+    try:
+        os.utime(os.path.join(cpdir, METADATA_FILE))
+    except OSError:
+        pass
+
+
+class CheckpointCache(object):
+    """
+    Content-addressed store of checkpoints, keyed by
+    `Experiment.checkpoint_key()`.
+
+    Experiments with the same key restore from the same checkpoint, which is
+    only created if no valid one is stored yet. The store has to be on a file
+    system shared with all executors and Slurm nodes that restore from it.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = os.path.abspath(path)
+
+    def cpdir(self, key: str) -> str:
+        """Checkpoint directory for `key`."""
+        return os.path.join(self.path, key)
+
+    def lookup(self, key: str) -> tp.Optional[str]:
+        """Checkpoint directory for `key` if it holds a valid checkpoint."""
+        cpdir = self.cpdir(key)
+        return cpdir if validate(cpdir, key) is None else None
+
+
+class CheckpointManager(object):
+    """
+    Keeps the checkpoints under a set of directories within a disk budget by
+    deleting the least recently used ones.
+
+    Only directories with recorded provenance are considered, so checkpoints
+    still being created are never deleted.
+    """
+
+    def __init__(self, roots: tp.List[str]) -> None:
+        self.roots = [os.path.abspath(r) for r in roots]
+
+    def checkpoints(self) -> tp.List[CheckpointInfo]:
+        """All complete checkpoints under `self.roots`."""
+        infos: tp.Dict[str, CheckpointInfo] = {}
+        for root in self.roots:
+            for (dirpath, dirnames, filenames) in os.walk(root):
+                if METADATA_FILE not in filenames:
+                    continue
+                # no need to look inside checkpoints
+                dirnames.clear()
+                info = CheckpointInfo.load(dirpath)
+                if info is not None:
+                    # roots may be nested
+                    infos[dirpath] = info
+        return list(infos.values())
+
+    def evict(
+        self, budget: int, keep: tp.Iterable[str] = ()
+    ) -> tp.List[CheckpointInfo]:
+        """
+        Deletes the least recently used checkpoints until the rest take up at
+        most `budget` bytes, except those in directories `keep`. Returns the
+        deleted checkpoints.
+        """
+        keep = {os.path.abspath(d) for d in keep}
+        infos = sorted(self.checkpoints(), key=lambda i: i.last_used)
+        total = sum(i.size() for i in infos)
+        evicted = []
+        for info in infos:
+            if total <= budget:
+                break
+            if info.cpdir in keep:
+                continue
+            # remove the metadata first, so the checkpoint is never used
+            # while it is partially deleted
+            os.remove(os.path.join(info.cpdir, METADATA_FILE))
+            shutil.rmtree(info.cpdir, True)
+            total -= info.size()
+            evicted.append(info)
+        return evicted
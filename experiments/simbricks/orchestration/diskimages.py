@@ -0,0 +1,213 @@
+# Copyright 2024 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+Copy-on-write disk images for simulated hosts, created in-process instead of
+with one `qemu-img` process per host.
+"""
+
+import fcntl
+import hashlib
+import os
+import struct
+import threading
+import typing as tp
+import uuid
+
+QCOW2_MAGIC = b'QFI\xfb'
+CLUSTER_BITS = 16
+"""Cluster size of created overlays, 64 KiB like qemu-img's default."""
+FICLONE = getattr(fcntl, 'FICLONE', 0x40049409)
+
+
+def image_format(path: str) -> tp.Tuple[str, int]:
+    """Format (qcow2 or raw) and virtual size of the disk image at `path`."""
+    with open(path, 'rb') as f:
+        header = f.read(32)
+    if len(header) == 32 and header[:4] == QCOW2_MAGIC:
+        return 'qcow2', struct.unpack('>Q', header[24:32])[0]
+    return 'raw', os.path.getsize(path)
+
+
+def write_overlay(path: str, base: str) -> None:
+    """
+    Creates an empty qcow2 image at `path` backed by the image `base`, like
+    `qemu-img create -f qcow2 -b base -F fmt path` does.
+
+    The image consists of the header with the backing file, a refcount table,
+    one refcount block and an all-zero L1 table, laid out as qemu-img does.
+    """
+    fmt, size = image_format(base)
+    backing = base.encode()
+    if len(backing) > 1023:
+        raise RuntimeError(f'backing file path too long: {base}')
+
+    cluster_size = 1 << CLUSTER_BITS
+    # each L2 table maps a cluster worth of 8 byte entries to clusters
+    l2_coverage = (cluster_size // 8) * cluster_size
+    l1_size = -(-size // l2_coverage)
+    l1_clusters = max(1, -(-(l1_size * 8) // cluster_size))
+    rc_table_offset = cluster_size
+    rc_block_offset = 2 * cluster_size
+    l1_offset = 3 * cluster_size
+    clusters = 3 + l1_clusters
+
+    # header extensions: backing file format, end marker
+    fmt_name = fmt.encode()
+    ext = struct.pack('>II', 0xE2792ACA, len(fmt_name)) + fmt_name
+    ext += b'\0' * (-len(ext) % 8)
+    ext += struct.pack('>II', 0, 0)
+    header_length = 104
+    backing_offset = header_length + len(ext)
+
+    header = struct.pack(
+        '>4sIQIIQIIQQIIQQQQII',
+        QCOW2_MAGIC,
+        3,  # version
+        backing_offset,
+        len(backing),
+        CLUSTER_BITS,
+        size,
+        0,  # no encryption
+        l1_size,
+        l1_offset,
+        rc_table_offset,
+        1,  # refcount table clusters
+        0,  # no snapshots
+        0,
+        0,  # incompatible features
+        0,  # compatible features
+        0,  # autoclear features
+        4,  # 16 bit refcounts
+        header_length
+    )
+    # 16 bit refcounts of 1 for all clusters holding metadata
+    rc_block = struct.pack(f'>{clusters}H', *([1] * clusters))
+
+    tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(header + ext + backing)
+        f.seek(rc_table_offset)
+        f.write(struct.pack('>Q', rc_block_offset))
+        f.seek(rc_block_offset)
+        f.write(rc_block)
+        # qemu-img also ends the file right after the L1 table
+        f.truncate(l1_offset + max(l1_size, 1) * 8)
+    os.replace(tmp, path)
+
+
+def reflink(src: str, dst: str) -> bool:
+    """
+    Creates `dst` as a copy-on-write clone of `src`. Returns False if the
+    file system does not support this.
+    """
+    try:
+        with open(src, 'rb') as s, open(dst, 'wb') as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        return True
+    except OSError:
+        try:
+            os.unlink(dst)
+        except OSError:
+            pass
+        return False
+
+
+def create(base: str, path: str, use_reflink=False) -> None:
+    """
+    Creates a writable copy-on-write image of `base` at `path`: a reflink
+    clone if `use_reflink` is set and the file system supports it, a qcow2
+    overlay otherwise.
+    """
+    if use_reflink and reflink(base, path):
+        return
+    write_overlay(path, base)
+
+
+class DiskImagePool(object):
+    """
+    Pre-created copy-on-write images per base image, so preparing a run only
+    has to move them into place.
+
+    Images are kept in files below `path`, which has to be on the same file
+    system as the work directories. Moving them out is atomic, so the pool
+    can be shared by concurrent threads and processes.
+    """
+
+    def __init__(self, path: str, per_base=4, use_reflink=False) -> None:
+        self.path = os.path.abspath(path)
+        self.per_base = per_base
+        """Number of images to keep ready for each base image."""
+        self.use_reflink = use_reflink
+        """Create reflink clones instead of qcow2 overlays where supported."""
+        self.bases: tp.Set[str] = set()
+        """Base images to keep images ready for."""
+
+    def base_dir(self, base: str) -> str:
+        """
+        Directory holding the images for `base`. It depends on the size and
+        modification time of `base` too, so images created for a previous
+        version of the base image are not used.
+        """
+        st = os.stat(base)
+        h = hashlib.sha256(
+            f'{base} {st.st_size} {st.st_mtime_ns} {self.use_reflink}'.encode()
+        )
+        return os.path.join(self.path, h.hexdigest()[:32])
+
+    def want(self, base: str) -> None:
+        """Keeps images ready for `base` from now on."""
+        self.bases.add(base)
+
+    def take(self, base: str, path: str) -> None:
+        """Moves a pre-created image of `base` to `path`, or creates one
+        there if none is ready."""
+        self.want(base)
+        d = self.base_dir(base)
+        try:
+            names = os.listdir(d)
+        except FileNotFoundError:
+            names = []
+        for name in names:
+            if name.endswith('.tmp'):
+                continue
+            try:
+                os.replace(os.path.join(d, name), path)
+                return
+            except FileNotFoundError:
+                # taken by someone else in the meantime
+                continue
+        create(base, path, self.use_reflink)
+
+    def refill(self) -> None:
+        """Creates images until `per_base` are ready for each base image."""
+        for base in list(self.bases):
+            try:
+                d = self.base_dir(base)
+                os.makedirs(d, exist_ok=True)
+                ready = [n for n in os.listdir(d) if not n.endswith('.tmp')]
+                for _ in range(self.per_base - len(ready)):
+                    tmp = os.path.join(d, f'{uuid.uuid4().hex}.tmp')
+                    create(base, tmp, self.use_reflink)
+                    os.replace(tmp, tmp[:-len('.tmp')])
+            except OSError as e:
+                # runs then create their images themselves
+                print(f'cannot pre-create disk images of {base}: {e}')
@@ -216,6 +216,10 @@ class E2ESwitchNode(E2ETopologyNode):
         super().__init__(idd)
         self.type = 'Switch'
         self.mtu = ''
+        self.weight: tp.Optional[float] = None
+        """Relative simulation load of this switch, used when splitting a
+        topology across ns-3 processes. Defaults to the number of hosts
+        attached plus one."""
 
     def ns3_config(self) -> str:
         self.mapping.update({
@@ -23,10 +23,13 @@
 # Allow own class to be used as type for a method's argument
 from __future__ import annotations
 
+import re
 import typing as tp
 from enum import Enum
 
 import simbricks.orchestration.e2e_components as e2e
+from simbricks.orchestration.e2e_topologies import E2ETopology
+from simbricks.orchestration.partition import Graph, partition
 from simbricks.orchestration.simulators import NS3E2ENet
 
 
@@ -152,3 +155,93 @@ class E2ELinkAssigner():
                         raise RuntimeError('Unknown link type')
 
         return networks
+
+
+def parse_data_rate(rate: str) -> tp.Optional[float]:
+    """Parses an ns-3 data rate such as `100Gbps` or `1.5MB/s` into bits per
+    second, None if it is empty or not understood."""
+    m = re.fullmatch(r'\s*([0-9.]+)\s*([kKmMgGtT]?)(i?)([bB])(ps|/s)\s*', rate)
+    if m is None:
+        return None
+    (value, prefix, binary, unit, _) = m.groups()
+    base = 1024 if binary else 1000
+    exp = ' kmgt'.index(prefix.lower() or ' ')
+    bits = float(value) * base**exp
+    return bits * 8 if unit == 'B' else bits
+
+
+def split_topology(
+    topology: E2ETopology,
+    n_procs: int,
+    imbalance: float = 0.1,
+    basename: str = ''
+) -> tp.List[NS3E2ENet]:
+    """
+    Splits `topology` across `n_procs` ns-3 processes.
+
+    Switches are partitioned so that the sum of their `weight` is balanced
+    across processes, while minimizing the bandwidth of the links between
+    processes. Hosts and other components attached to a switch stay with it.
+    Cut links are replaced by pairs of SimBricks adapters, with the adapter in
+    the process with the lower index listening so the processes can be
+    started in order. The adapters use the link's delay as Ethernet latency,
+    its data rate and queue are not modeled.
+
+    Returns the networks. Options still need to be set on them before they are
+    initialized with `init_network()` and added to an experiment.
+    """
+    switches = topology.get_switches()
+    links = tp.cast(tp.List[e2e.E2ESimpleChannel], topology.get_links())
+
+    graph = Graph()
+    index: tp.Dict[e2e.E2ETopologyNode, int] = {}
+    for sw in switches:
+        weight = getattr(sw, 'weight', None)
+        if weight is None:
+            hosts = [c for c in sw.components if isinstance(c, e2e.E2EHost)]
+            weight = len(hosts) + 1
+        index[sw] = graph.add_vertex(weight)
+
+    rates = [parse_data_rate(l.data_rate) for l in links]
+    # links without a known rate count as fast as the fastest one
+    default_rate = max((r for r in rates if r is not None), default=1.0)
+    for (l, rate) in zip(links, rates):
+        graph.add_edge(
+            index[l.left_node],
+            index[l.right_node],
+            default_rate if rate is None else rate
+        )
+
+    parts = partition(graph, n_procs, imbalance=imbalance)
+
+    networks = [NS3E2ENet() for _ in range(n_procs)]
+    for sw in switches:
+        networks[parts[index[sw]]].add_component(sw)
+
+    for l in links:
+        pl = parts[index[l.left_node]]
+        pr = parts[index[l.right_node]]
+        if pl == pr:
+            networks[pl].add_component(l)
+            continue
+
+        left_adapter = e2e.E2ENetworkSimbricks(f'_{l.name}_left_adapter')
+        left_adapter.listen = pl < pr
+        left_adapter.eth_latency = l.delay
+        left_adapter.simbricks_component = networks[pr]
+        l.left_node.add_component(left_adapter)
+
+        right_adapter = e2e.E2ENetworkSimbricks(f'_{l.name}_right_adapter')
+        right_adapter.listen = pr < pl
+        right_adapter.eth_latency = l.delay
+        right_adapter.simbricks_component = networks[pl]
+        l.right_node.add_component(right_adapter)
+
+        # distinct sockets for multiple links between the same processes
+        left_adapter.set_peer(right_adapter)
+
+    # some processes stay empty if single switches are too heavy to balance
+    networks = [net for net in networks if net.e2e_components]
+    for (i, net) in enumerate(networks):
+        net.name = f'_{basename}network_{i}'
+    return networks
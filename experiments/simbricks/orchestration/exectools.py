@@ -22,50 +22,227 @@
 
 import abc
 import asyncio
+import collections
+import ctypes
+import ctypes.util
+import gzip
+import hashlib
+import json
 import os
 import pathlib
 import re
 import shlex
 import shutil
 import signal
+import struct
+import tarfile
+import tempfile
 import typing as tp
 from asyncio.subprocess import Process
 
+from simbricks.orchestration import agent
+
+
+class LogSink(abc.ABC):
+    """Stores the lines a component prints on one of its output streams."""
+
+    @abc.abstractmethod
+    def extend(self, lines: tp.List[str]) -> None:
+        pass
+
+    @abc.abstractmethod
+    def tail(self) -> tp.List[str]:
+        """The most recent lines that are kept in memory."""
+        pass
+
+    @abc.abstractmethod
+    def lines(self) -> tp.Iterator[str]:
+        """Iterates over all lines stored so far."""
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryLogSink(LogSink):
+    """Keeps all lines in memory."""
+
+    def __init__(self) -> None:
+        self._lines: tp.List[str] = []
+
+    def extend(self, lines: tp.List[str]) -> None:
+        self._lines.extend(lines)
+
+    def tail(self) -> tp.List[str]:
+        return self._lines
+
+    def lines(self) -> tp.Iterator[str]:
+        return iter(self._lines)
+
+
+class FileLogSink(LogSink):
+    """
+    Appends all lines to a gzip-compressed segment file and only keeps the last
+    `keep` lines in memory.
+
+    This keeps the memory usage of the orchestrator constant, no matter how
+    much output a long-running simulator produces. Can also be used to read a
+    previously written segment.
+    """
+
+    def __init__(self, path: str, keep: int = 1000) -> None:
+        self.path = path
+        self._tail: tp.Deque[str] = collections.deque(maxlen=keep)
+        self._file: tp.Optional[tp.TextIO] = None
+
+    def extend(self, lines: tp.List[str]) -> None:
+        if not lines:
+            return
+        if self._file is None:
+            self._file = gzip.open(
+                self.path,
+                'at',
+                compresslevel=1,
+                encoding='utf-8',
+                newline='\n'
+            )
+        self._file.write('\n'.join(lines))
+        self._file.write('\n')
+        self._tail.extend(lines)
+
+    def tail(self) -> tp.List[str]:
+        return list(self._tail)
+
+    def lines(self) -> tp.Iterator[str]:
+        if self._file is not None:
+            self._file.flush()
+        if not os.path.exists(self.path):
+            return
+        with gzip.open(self.path, 'rt', encoding='utf-8', newline='\n') as f:
+            try:
+                for l in f:
+                    yield l[:-1] if l.endswith('\n') else l
+            except EOFError:
+                # segment is still being written or was truncated
+                pass
+
+    def move(self, path: str) -> None:
+        """Closes the segment and moves it to `path`."""
+        self.close()
+        if os.path.exists(self.path):
+            shutil.move(self.path, path)
+        self.path = path
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
 
 class Component(object):
 
-    def __init__(self, cmd_parts: tp.List[str], with_stdin=False):
+    def __init__(
+        self,
+        cmd_parts: tp.List[str],
+        with_stdin=False,
+        stdout_sink: tp.Optional[LogSink] = None,
+        stderr_sink: tp.Optional[LogSink] = None,
+        process_group=False
+    ):
+        if stdout_sink is None:
+            stdout_sink = MemoryLogSink()
+        if stderr_sink is None:
+            stderr_sink = MemoryLogSink()
+
         self.is_ready = False
-        self.stdout: tp.List[str] = []
+        self.stdout = stdout_sink
         self.stdout_buf = bytearray()
-        self.stderr: tp.List[str] = []
+        self.stderr = stderr_sink
         self.stderr_buf = bytearray()
         self.cmd_parts = cmd_parts
         #print(cmd_parts)
         self.with_stdin = with_stdin
+        self.process_group = process_group
+        """
+        Whether to run the command in its own process group and signal the
+        whole group, so processes it spawns are stopped along with it.
+
+        The command then also runs in its own session, so a Ctrl-C in the
+        terminal only reaches the orchestrator, which stops it through the
+        runtime's interrupt handling. If the orchestrator is killed without a
+        chance to clean up, e.g. with SIGKILL, the group keeps running and has
+        to be killed by hand with `kill -- -<pid>`.
+        """
+        self.read_size = 256 * 1024
+        """Maximum number of bytes to read from stdout/stderr at once."""
+
+        self._line_waiters: tp.List[tp.Tuple[tp.Pattern, asyncio.Future]] = []
 
         self._proc: Process
         self._terminate_future: asyncio.Task
 
+    def expect_line(self, pattern: str) -> asyncio.Future:
+        """
+        Returns a future that completes once the component prints a line
+        matching the regular expression `pattern` on stdout or stderr.
+
+        Call before `start()` to not miss any output. The future fails if the
+        component terminates without printing a matching line.
+        """
+        fut = asyncio.get_running_loop().create_future()
+        self._line_waiters.append((re.compile(pattern), fut))
+        return fut
+
+    def _match_lines(self, lines: tp.List[str]) -> None:
+        waiters = []
+        for (pattern, fut) in self._line_waiters:
+            if fut.done():
+                continue
+            if any(pattern.search(l) for l in lines):
+                fut.set_result(None)
+            else:
+                waiters.append((pattern, fut))
+        self._line_waiters = waiters
+
     def _parse_buf(self, buf: bytearray, data: bytes) -> tp.List[str]:
-        if data is not None:
+        """
+        Appends `data` to `buf` and splits off all complete lines.
+
+        `buf` only ever holds an incomplete line, so only the newly received
+        `data` has to be scanned for a line break. All complete lines are
+        decoded in one go and the consumed prefix is removed from `buf`. An
+        empty `data` signals EOF and flushes any remaining partial line.
+        """
+        if len(data) == 0:
+            if len(buf) == 0:
+                return []
+            lines = [buf.decode('utf-8')]
+            buf.clear()
+            return lines
+
+        nl = data.rfind(b'\n')
+        if nl < 0:
             buf.extend(data)
-        lines = []
-        start = 0
-        for i in range(0, len(buf)):
-            if buf[i] == ord('\n'):
-                l = buf[start:i].decode('utf-8')
-                lines.append(l)
-                start = i + 1
-        del buf[0:start]
-
-        if len(data) == 0 and len(buf) > 0:
-            lines.append(buf.decode('utf-8'))
+            return []
+
+        if len(buf) == 0:
+            # fast path: nothing buffered, no need to copy data around
+            lines = str(memoryview(data)[:nl], 'utf-8').split('\n')
+            buf.extend(memoryview(data)[nl + 1:])
+            return lines
+
+        end = len(buf) + nl
+        buf.extend(data)
+        with memoryview(buf) as mv:
+            lines = str(mv[:end], 'utf-8').split('\n')
+        del buf[:end + 1]
         return lines
 
     async def _consume_out(self, data: bytes) -> None:
         eof = len(data) == 0
         ls = self._parse_buf(self.stdout_buf, data)
+        if self._line_waiters:
+            self._match_lines(ls)
         if len(ls) > 0 or eof:
             await self.process_out(ls, eof=eof)
             self.stdout.extend(ls)
@@ -73,17 +250,17 @@ class Component(object):
     async def _consume_err(self, data: bytes) -> None:
         eof = len(data) == 0
         ls = self._parse_buf(self.stderr_buf, data)
+        if self._line_waiters:
+            self._match_lines(ls)
         if len(ls) > 0 or eof:
             await self.process_err(ls, eof=eof)
             self.stderr.extend(ls)
 
     async def _read_stream(self, stream: asyncio.StreamReader, fn):
         while True:
-            bs = await stream.readline()
-            if bs:
-                await fn(bs)
-            else:
-                await fn(bs)
+            bs = await stream.read(self.read_size)
+            await fn(bs)
+            if not bs:
                 return
 
     async def _waiter(self) -> None:
@@ -95,10 +272,22 @@ class Component(object):
         )
         rc = await self._proc.wait()
         await asyncio.gather(stdout_handler, stderr_handler)
+        self.stdout.close()
+        self.stderr.close()
+        for (pattern, fut) in self._line_waiters:
+            if not fut.done():
+                fut.set_exception(
+                    RuntimeError(
+                        f'terminated with {rc} before printing a line '
+                        f'matching {pattern.pattern!r}'
+                    )
+                )
+        self._line_waiters = []
         await self.terminated(rc)
 
     async def send_input(self, bs: bytes, eof=False) -> None:
         self._proc.stdin.write(bs)
+        await self._proc.stdin.drain()
         if eof:
             self._proc.stdin.close()
 
@@ -113,6 +302,8 @@ class Component(object):
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE,
             stdin=stdin,
+            limit=self.read_size,
+            start_new_session=self.process_group,
         )
         self._terminate_future = asyncio.create_task(self._waiter())
         await self.started()
@@ -126,20 +317,36 @@ class Component(object):
         """
         await asyncio.shield(self._terminate_future)
 
+    def running(self) -> bool:
+        return self._proc.returncode is None
+
+    def returncode(self) -> tp.Optional[int]:
+        """Exit status of the process, None while it is still running."""
+        return self._proc.returncode
+
+    async def send_signal(self, sig: int) -> None:
+        """Sends `sig` to the process, or its process group if it has one."""
+        if self._proc.returncode is not None:
+            return
+        if self.process_group and self.local_pid() is not None:
+            try:
+                os.killpg(self._proc.pid, sig)
+            except ProcessLookupError:
+                pass
+        else:
+            self._proc.send_signal(sig)
+
     async def interrupt(self) -> None:
         """Sends an interrupt signal."""
-        if self._proc.returncode is None:
-            self._proc.send_signal(signal.SIGINT)
+        await self.send_signal(signal.SIGINT)
 
     async def terminate(self) -> None:
         """Sends a terminate signal."""
-        if self._proc.returncode is None:
-            self._proc.terminate()
+        await self.send_signal(signal.SIGTERM)
 
     async def kill(self) -> None:
         """Sends a kill signal."""
-        if self._proc.returncode is None:
-            self._proc.kill()
+        await self.send_signal(signal.SIGKILL)
 
     async def int_term_kill(self, delay: int = 5) -> None:
         """Attempts to stop this component by sending signals in the following
@@ -170,10 +377,14 @@ class Component(object):
         await self._proc.wait()
 
     async def sigusr1(self) -> None:
-        """Sends an interrupt signal."""
+        """Sends a SIGUSR1 signal to the process only."""
         if self._proc.returncode is None:
             self._proc.send_signal(signal.SIGUSR1)
 
+    def local_pid(self) -> tp.Optional[int]:
+        """PID of the process if it runs on this host, None otherwise."""
+        return self._proc.pid
+
     async def started(self) -> None:
         pass
 
@@ -206,13 +417,13 @@ class SimpleComponent(Component):
 
     async def process_out(self, lines: tp.List[str], eof: bool) -> None:
         if self.verbose:
-            for _ in lines:
-                print(self.label, 'OUT:', lines, flush=True)
+            for l in lines:
+                print(self.label, 'OUT:', l, flush=True)
 
     async def process_err(self, lines: tp.List[str], eof: bool) -> None:
         if self.verbose:
-            for _ in lines:
-                print(self.label, 'ERR:', lines, flush=True)
+            for l in lines:
+                print(self.label, 'ERR:', l, flush=True)
 
     async def terminated(self, rc: int) -> None:
         if self.verbose:
@@ -294,28 +505,272 @@ class SimpleRemoteComponent(SimpleComponent):
                 self._pid_fut.cancel()
         await super().process_out(lines, eof)
 
+    def kill_targets(self) -> tp.List[str]:
+        """
+        Arguments to `kill` addressing the remote command.
+
+        sshd runs the command in a new session, so with `process_group` the
+        whole group led by the wrapper shell is signalled.
+        """
+        if not self._pid_fut.done() or self._pid_fut.cancelled():
+            return []
+        pid = str(self._pid_fut.result())
+        return ['-' + pid, pid] if self.process_group else [pid]
+
     async def _kill_cmd(self, sig: str) -> None:
         """Send signal to command by running ssh kill -$sig $PID."""
-        cmd_parts = self._ssh_cmd([
-            'kill', '-' + sig, str(self._pid_fut.result())
-        ])
+        targets = self.kill_targets()
+        if not targets:
+            return
+        cmd_parts = self._ssh_cmd(['kill', '-' + sig, '--'] + targets)
         proc = await asyncio.create_subprocess_exec(*cmd_parts)
         await proc.wait()
 
-    async def interrupt(self) -> None:
-        await self._kill_cmd('INT')
+    def local_pid(self) -> tp.Optional[int]:
+        # the local process is just ssh
+        return None
 
-    async def terminate(self) -> None:
-        await self._kill_cmd('TERM')
+    async def send_signal(self, sig: int) -> None:
+        await self._kill_cmd(signal.Signals(sig).name[3:])
 
-    async def kill(self) -> None:
-        await self._kill_cmd('KILL')
+
+class AgentConnection(object):
+    """
+    Control stream to a `simbricks.orchestration.agent` on a worker.
+
+    Requests, process output, and file transfers are multiplexed over this one
+    stream as frames tagged with a channel id.
+    """
+
+    def __init__(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        transport_proc: tp.Optional[Process] = None
+    ) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.transport_proc = transport_proc
+        """ssh process carrying the stream if the agent was started via ssh."""
+        self._next_chan = 1
+        self._requests: tp.Dict[int, asyncio.Future] = {}
+        self._procs: tp.Dict[int, 'AgentProcess'] = {}
+        self._closed: tp.Optional[str] = None
+        self._receiver = asyncio.create_task(self._receive())
+
+    def _chan(self) -> int:
+        chan = self._next_chan
+        self._next_chan += 1
+        return chan
+
+    def send(self, ftype: int, chan: int, payload: bytes = b'') -> None:
+        if self._closed is not None:
+            raise RuntimeError(self._closed)
+        self.writer.write(agent.encode_frame(ftype, chan, payload))
+
+    async def request(self, op: str, **kwargs) -> dict:
+        """Sends request and waits for the response."""
+        return await self._request(self._chan(), op, **kwargs)
+
+    async def _request(self, chan: int, op: str, **kwargs) -> dict:
+        fut = asyncio.get_running_loop().create_future()
+        self._requests[chan] = fut
+        kwargs['op'] = op
+        self.send(agent.REQ, chan, json.dumps(kwargs).encode('utf-8'))
+        await self.writer.drain()
+        resp = await fut
+        if 'error' in resp:
+            raise RuntimeError(f'agent {op} failed: {resp["error"]}')
+        return resp
+
+    def notify(self, op: str, **kwargs) -> None:
+        """Sends request without waiting for a response."""
+        kwargs['op'] = op
+        self.send(agent.REQ, 0, json.dumps(kwargs).encode('utf-8'))
+
+    async def spawn(
+        self,
+        cmd_parts: tp.List[str],
+        cwd: tp.Optional[str] = None,
+        with_stdin=False,
+        group=False
+    ) -> 'AgentProcess':
+        chan = self._chan()
+        proc = AgentProcess(self, chan)
+        self._procs[chan] = proc
+        try:
+            resp = await self._request(
+                chan,
+                'spawn',
+                cmd=cmd_parts,
+                cwd=cwd,
+                stdin=with_stdin,
+                group=group
+            )
+        except BaseException:
+            del self._procs[chan]
+            raise
+        proc.pid = resp['pid']
+        if not with_stdin:
+            proc.stdin = None
+        return proc
+
+    async def put_file(
+        self, path: str, remote_path: str, chunk_size=1024 * 1024
+    ) -> None:
+        chan = self._chan()
+        fut = asyncio.get_running_loop().create_future()
+        self._requests[chan] = fut
+        size = os.path.getsize(path)
+        req = {
+            'op': 'put_file',
+            'path': remote_path,
+            'size': size,
+            'mode': os.stat(path).st_mode & 0o7777
+        }
+        self.send(agent.REQ, chan, json.dumps(req).encode('utf-8'))
+        with open(path, 'rb') as f:
+            while size > 0:
+                bs = f.read(min(chunk_size, size))
+                if not bs:
+                    raise RuntimeError(f'{path} was truncated while sending')
+                self.send(agent.DATA, chan, bs)
+                size -= len(bs)
+                await self.writer.drain()
+        resp = await fut
+        if 'error' in resp:
+            raise RuntimeError(f'agent put_file failed: {resp["error"]}')
+
+    async def _receive(self) -> None:
+        reason = 'connection to agent closed'
+        try:
+            while True:
+                frame = await agent.read_frame(self.reader)
+                if frame is None:
+                    break
+                ftype, chan, payload = frame
+                if ftype == agent.RESP:
+                    fut = self._requests.pop(chan, None)
+                    if fut is not None and not fut.done():
+                        fut.set_result(json.loads(payload))
+                elif ftype in (agent.STDOUT, agent.STDERR):
+                    proc = self._procs[chan]
+                    stream = (
+                        proc.stdout if ftype == agent.STDOUT else proc.stderr
+                    )
+                    if payload:
+                        stream.feed_data(payload)
+                    else:
+                        stream.feed_eof()
+                elif ftype == agent.EXIT:
+                    proc = self._procs.pop(chan)
+                    proc.exited(json.loads(payload)['rc'])
+        except Exception as e:  # pylint: disable=broad-except
+            reason = f'connection to agent failed: {e}'
+        self._close(reason)
+
+    def _close(self, reason: str) -> None:
+        self._closed = reason
+        for fut in self._requests.values():
+            if not fut.done():
+                fut.set_exception(RuntimeError(reason))
+        self._requests.clear()
+        for proc in self._procs.values():
+            proc.stdout.feed_eof()
+            proc.stderr.feed_eof()
+            proc.exited(-1)
+        self._procs.clear()
+        self.writer.close()
+
+
+class AgentProcess(object):
+    """
+    A process started by an agent.
+
+    Provides the subset of `asyncio.subprocess.Process` used by `Component`, so
+    components only have to override how the process is created.
+    """
+
+    def __init__(self, conn: AgentConnection, chan: int) -> None:
+        self.conn = conn
+        self.chan = chan
+        self.pid: tp.Optional[int] = None
+        """PID of the process on the agent's host."""
+        self.returncode: tp.Optional[int] = None
+        self.stdout = asyncio.StreamReader()
+        self.stderr = asyncio.StreamReader()
+        self.stdin: tp.Optional[AgentProcess.Stdin] = AgentProcess.Stdin(self)
+        self._exit = asyncio.get_running_loop().create_future()
+
+    class Stdin(object):
+
+        def __init__(self, proc: 'AgentProcess') -> None:
+            self.proc = proc
+
+        def write(self, bs: bytes) -> None:
+            if bs:
+                self.proc.conn.send(agent.STDIN, self.proc.chan, bs)
+
+        def close(self) -> None:
+            self.proc.conn.send(agent.STDIN, self.proc.chan)
+
+    def exited(self, rc: int) -> None:
+        self.returncode = rc
+        if not self._exit.done():
+            self._exit.set_result(rc)
+
+    async def wait(self) -> int:
+        return await asyncio.shield(self._exit)
+
+    def send_signal(self, sig: int) -> None:
+        self.conn.notify('signal', chan=self.chan, sig=signal.Signals(sig).name)
+
+    def terminate(self) -> None:
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self) -> None:
+        self.send_signal(signal.SIGKILL)
+
+
+class AgentComponent(SimpleComponent):
+    """Component run through the agent of an `AgentExecutor`."""
+
+    def __init__(
+        self,
+        executor: 'AgentExecutor',
+        label: str,
+        cmd_parts: tp.List[str],
+        *args,
+        cwd: tp.Optional[str] = None,
+        **kwargs
+    ) -> None:
+        super().__init__(label, cmd_parts, *args, **kwargs)
+        self.executor = executor
+        self.cwd = cwd
+
+    async def start(self) -> None:
+        conn = await self.executor.connect()
+        self._proc = await conn.spawn(
+            self.cmd_parts,
+            cwd=self.cwd,
+            with_stdin=self.with_stdin,
+            group=self.process_group
+        )
+        self._terminate_future = asyncio.create_task(self._waiter())
+        await self.started()
+
+    def local_pid(self) -> tp.Optional[int]:
+        return None
 
 
 class Executor(abc.ABC):
 
     def __init__(self) -> None:
         self.ip = None
+        self.cores: tp.Optional[int] = None
+        """Number of cores available for simulators, unlimited if None."""
+        self.mem: tp.Optional[int] = None
+        """Memory in MB available for simulators, unlimited if None."""
 
     @abc.abstractmethod
     def create_component(
@@ -331,6 +786,10 @@ class Executor(abc.ABC):
     async def send_file(self, path: str, verbose=False) -> None:
         pass
 
+    async def send_files(self, paths: tp.List[str], verbose=False) -> None:
+        """Sends all `paths` to the same location on this executor's host."""
+        await asyncio.gather(*[self.send_file(p, verbose) for p in paths])
+
     @abc.abstractmethod
     async def mkdir(self, path: str, verbose=False) -> None:
         pass
@@ -339,6 +798,16 @@ class Executor(abc.ABC):
     async def rmtree(self, path: str, verbose=False) -> None:
         pass
 
+    async def rmtrees(self, paths: tp.List[str], verbose=False) -> None:
+        """Removes all `paths` on this executor's host."""
+        await asyncio.gather(*[self.rmtree(p, verbose) for p in paths])
+
+    async def signal_components(
+        self, comps: tp.List[Component], sig: int
+    ) -> None:
+        """Sends `sig` to all `comps`, which run on this executor."""
+        await asyncio.gather(*[c.send_signal(sig) for c in comps])
+
     # runs the list of commands as strings sequentially
     async def run_cmdlist(
         self, label: str, cmds: tp.List[str], verbose=True
@@ -360,24 +829,185 @@ class Executor(abc.ABC):
         await asyncio.gather(*xs)
 
 
+class InotifyWatcher(object):
+    """
+    Waits for files to be created using Linux's inotify.
+
+    All waits share a single inotify instance, and each directory is watched
+    only once no matter how many paths in it are awaited.
+    """
+
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    EVENT_HDR = struct.Struct('iIII')
+
+    def __init__(self) -> None:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [
+            ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32
+        ]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self._libc = libc
+
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+        self._wds: tp.Dict[str, int] = {}
+        """Watch descriptor for each watched directory."""
+        self._dirs: tp.Dict[int, str] = {}
+        self._waiting: tp.Dict[str, tp.Dict[str, tp.List[asyncio.Future]]] = {}
+        """Futures waiting for files, by directory and file name."""
+        self._loop: tp.Optional[asyncio.AbstractEventLoop] = None
+
+    async def wait(self, path: str) -> None:
+        """
+        Waits for `path` to exist.
+
+        Raises `FileNotFoundError` if the directory containing `path` does not
+        exist or is removed while waiting.
+        """
+        (d, name) = os.path.split(os.path.abspath(path))
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+
+        if d not in self._wds:
+            wd = self._libc.inotify_add_watch(
+                self._fd,
+                os.fsencode(d),
+                self.IN_CREATE | self.IN_MOVED_TO | self.IN_ONLYDIR
+            )
+            if wd < 0:
+                errno = ctypes.get_errno()
+                raise FileNotFoundError(errno, os.strerror(errno), d)
+            self._wds[d] = wd
+            self._dirs[wd] = d
+            self._waiting[d] = {}
+        self._waiting[d].setdefault(name, []).append(fut)
+        if self._loop is None:
+            loop.add_reader(self._fd, self._read_events)
+            self._loop = loop
+
+        try:
+            # check only after adding the watch so we cannot miss the creation
+            if not os.path.exists(path):
+                await fut
+        finally:
+            self._unwait(d, name, fut)
+
+    def _unwait(self, d: str, name: str, fut: asyncio.Future) -> None:
+        waiting = self._waiting.get(d)
+        if waiting is not None and name in waiting:
+            waiting[name].remove(fut)
+            if not waiting[name]:
+                del waiting[name]
+            if not waiting:
+                wd = self._wds.pop(d)
+                del self._dirs[wd]
+                del self._waiting[d]
+                self._libc.inotify_rm_watch(self._fd, wd)
+
+        if not self._waiting and self._loop is not None:
+            self._loop.remove_reader(self._fd)
+            self._loop = None
+
+    def _read_events(self) -> None:
+        while True:
+            try:
+                buf = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return
+
+            off = 0
+            while off < len(buf):
+                (wd, mask, _, name_len) = self.EVENT_HDR.unpack_from(buf, off)
+                off += self.EVENT_HDR.size
+                name = buf[off:off + name_len].rstrip(b'\0')
+                off += name_len
+
+                if mask & self.IN_Q_OVERFLOW:
+                    # events were lost, so check all pending paths directly
+                    for (d, waiting) in self._waiting.items():
+                        for (n, futs) in waiting.items():
+                            if os.path.exists(os.path.join(d, n)):
+                                self._wake(futs)
+                    continue
+
+                d = self._dirs.get(wd)
+                if d is None:
+                    continue
+                if mask & self.IN_IGNORED:
+                    # directory was removed, fail the waits on it
+                    for futs in self._waiting[d].values():
+                        self._wake(futs, FileNotFoundError(d))
+                    continue
+                futs = self._waiting[d].get(os.fsdecode(name))
+                if futs:
+                    self._wake(futs)
+
+    @staticmethod
+    def _wake(
+        futs: tp.List[asyncio.Future],
+        exc: tp.Optional[Exception] = None
+    ) -> None:
+        for fut in futs:
+            if fut.done():
+                continue
+            if exc is None:
+                fut.set_result(None)
+            else:
+                fut.set_exception(exc)
+
+
 class LocalExecutor(Executor):
 
+    def __init__(self) -> None:
+        super().__init__()
+        self._watcher: tp.Optional[InotifyWatcher] = None
+        self._watcher_failed = False
+
     def create_component(
         self, label: str, parts: tp.List[str], **kwargs
     ) -> SimpleComponent:
         return SimpleComponent(label, parts, **kwargs)
 
+    def _file_watcher(self) -> tp.Optional[InotifyWatcher]:
+        """Shared inotify watcher, or `None` if inotify is not available."""
+        if self._watcher is None and not self._watcher_failed:
+            try:
+                self._watcher = InotifyWatcher()
+            except (OSError, AttributeError, TypeError):
+                self._watcher_failed = True
+        return self._watcher
+
     async def await_file(
         self, path: str, delay=0.05, verbose=False, timeout=600
     ) -> None:
         if verbose:
             print(f'await_file({path})')
-        t = 0
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+
+        watcher = self._file_watcher()
+        if watcher is not None:
+            try:
+                await asyncio.wait_for(watcher.wait(path), timeout)
+                return
+            except (TimeoutError, asyncio.TimeoutError) as e:
+                raise TimeoutError() from e
+            except FileNotFoundError:
+                # directory does not exist (yet), fall back to polling
+                pass
+
         while not os.path.exists(path):
-            if t >= timeout:
+            if loop.time() >= deadline:
                 raise TimeoutError()
             await asyncio.sleep(delay)
-            t += delay
 
     async def send_file(self, path: str, verbose=False) -> None:
         # locally we do not need to do anything
@@ -387,12 +1017,38 @@ class LocalExecutor(Executor):
         pathlib.Path(path).mkdir(parents=True, exist_ok=True)
 
     async def rmtree(self, path: str, verbose=False) -> None:
+        await asyncio.get_running_loop().run_in_executor(
+            None, self._rmtree, path
+        )
+
+    @staticmethod
+    def _rmtree(path: str) -> None:
         if os.path.isdir(path):
             shutil.rmtree(path, ignore_errors=True)
         elif os.path.exists(path):
             os.unlink(path)
 
 
+class _ThreadInput(object):
+    """
+    Write-only file object for a worker thread, passing everything written on
+    to a component's stdin on the event loop. Each write waits until the data
+    is drained, so writers are throttled to the speed of the consumer.
+    """
+
+    def __init__(
+        self, comp: Component, loop: asyncio.AbstractEventLoop
+    ) -> None:
+        self.comp = comp
+        self.loop = loop
+
+    def write(self, bs: bytes) -> int:
+        asyncio.run_coroutine_threadsafe(
+            self.comp.send_input(bytes(bs)), self.loop
+        ).result()
+        return len(bs)
+
+
 class RemoteExecutor(Executor):
 
     def __init__(self, host_name: str, workdir: str) -> None:
@@ -402,6 +1058,100 @@ class RemoteExecutor(Executor):
         self.cwd = workdir
         self.ssh_extra_args = []
         self.scp_extra_args = []
+        self.ssh_control = True
+        """
+        Whether to multiplex all ssh and scp invocations for this host over a
+        single persistent master connection (OpenSSH ControlMaster).
+
+        Avoids a full TCP and authentication handshake for every command,
+        signal, and file operation.
+        """
+        self.ssh_control_persist = 300
+        """Seconds the master connection stays open after its last use."""
+        self.stage_files = True
+        """
+        Whether to send files through the content-addressed cache in
+        `file_cache` instead of copying each one with scp.
+        """
+        self.file_cache: tp.Optional[str] = None
+        """
+        Directory on the remote host caching sent files by content hash.
+        Defaults to a directory in `/var/tmp` for the remote user, so users
+        sharing a host do not interfere.
+        """
+
+        self._master: tp.Optional[asyncio.Future] = None
+
+    @staticmethod
+    def control_dir() -> str:
+        """Directory holding the ssh control sockets of the current user."""
+        path = os.path.join(
+            tempfile.gettempdir(), f'simbricks-ssh-{os.getuid()}'
+        )
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        return path
+
+    def _control_args(self) -> tp.List[str]:
+        if not self.ssh_control:
+            return []
+        return [
+            '-o',
+            'ControlMaster=auto',
+            '-o',
+            f'ControlPath={self.control_dir()}/%C',
+            '-o',
+            f'ControlPersist={self.ssh_control_persist}'
+        ]
+
+    async def _start_master(self) -> None:
+        parts = [
+            'ssh',
+            '-o',
+            'UserKnownHostsFile=/dev/null',
+            '-o',
+            'StrictHostKeyChecking=no'
+        ] + self._control_args() + self.ssh_extra_args
+        # a master may still be around from an earlier run
+        check = await asyncio.create_subprocess_exec(
+            *parts,
+            '-O',
+            'check',
+            self.host_name,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        if await check.wait() == 0:
+            return
+
+        # -f puts the master into the background once authenticated
+        master = await asyncio.create_subprocess_exec(
+            *parts,
+            '-f',
+            '-N',
+            self.host_name,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        if await master.wait() != 0:
+            print(
+                f'{self.host_name}: starting ssh master connection failed, '
+                'falling back to individual connections'
+            )
+
+    async def connect(self) -> None:
+        """
+        Opens the persistent master connection if enabled.
+
+        Called by all operations of this executor, so components started
+        afterwards also reuse it. Without this, the first ssh invocation would
+        become the master and concurrent ones could not share it.
+        """
+        if not self.ssh_control:
+            return
+        if self._master is None:
+            self._master = asyncio.ensure_future(self._start_master())
+        await asyncio.shield(self._master)
 
     def create_component(
         self, label: str, parts: tp.List[str], **kwargs
@@ -411,43 +1161,226 @@ class RemoteExecutor(Executor):
             label,
             parts,
             cwd=self.cwd,
-            ssh_extra_args=self.ssh_extra_args,
+            ssh_extra_args=self._control_args() + self.ssh_extra_args,
             **kwargs
         )
 
+    # Remote helper for await_files(): prints `READY <path>` for each path as
+    # soon as it exists and `TIMEOUT <path>` for the remaining ones once the
+    # timeout expires. Blocks in inotifywait on the directories of the
+    # remaining paths if available and otherwise polls.
+    AWAIT_FILES_SCRIPT = """
+delay=$1 ; t_end=$(( $(date +%s) + $2 )) ; shift 2
+while [ $# -gt 0 ] ; do
+    n=$# ; i=0
+    while [ $i -lt $n ] ; do
+        p=$1 ; shift ; i=$(($i+1))
+        if [ -e "$p" ] ; then echo "READY $p" ; else set -- "$@" "$p" ; fi
+    done
+    [ $# -eq 0 ] && break
+    if [ $(date +%s) -ge $t_end ] ; then
+        for p in "$@" ; do echo "TIMEOUT $p" ; done
+        exit 1
+    fi
+    if command -v inotifywait >/dev/null 2>&1 ; then
+        for p in "$@" ; do dirname -- "$p" ; done | sort -u | \
+            inotifywait -qq -t 1 -e create -e moved_to --fromfile - \
+            2>/dev/null
+        [ $? -eq 1 ] && sleep $delay
+    else
+        sleep $delay
+    fi
+done
+exit 0
+"""
+
     async def await_file(
         self, path: str, delay=0.05, verbose=False, timeout=30
     ) -> None:
+        await self.await_files([path], delay, verbose, timeout)
+
+    async def await_files(
+        self,
+        paths: tp.List[str],
+        delay=0.05,
+        verbose=False,
+        timeout=30
+    ) -> None:
+        """Waits for all `paths` to exist using a single ssh invocation."""
+        if not paths:
+            return
         if verbose:
-            print(f'{self.host_name}.await_file({path}) started')
-
-        to_its = timeout / delay
-        loop_cmd = (
-            f'i=0 ; while [ ! -e {path} ] ; do '
-            f'if [ $i -ge {to_its:u} ] ; then exit 1 ; fi ; '
-            f'sleep {delay} ; '
-            'i=$(($i+1)) ; done; exit 0'
-        ) % (path, to_its, delay)
-        parts = ['/bin/sh', '-c', loop_cmd]
+            print(f'{self.host_name}.await_files({paths}) started')
+        await self.connect()
+
+        parts = [
+            '/bin/sh',
+            '-c',
+            self.AWAIT_FILES_SCRIPT,
+            'await_files',
+            str(delay),
+            str(int(timeout))
+        ] + paths
         sc = self.create_component(
-            f"{self.host_name}.await_file('{path}')",
+            f'{self.host_name}.await_files({len(paths)} paths)',
             parts,
-            canfail=False,
+            canfail=True,
             verbose=verbose
         )
         await sc.start()
         await sc.wait()
 
-    # TODO: Implement opitimized await_files()
+        ready = set()
+        missing = []
+        for l in sc.stdout.lines():
+            if l.startswith('READY '):
+                ready.add(l[len('READY '):])
+            elif l.startswith('TIMEOUT '):
+                missing.append(l[len('TIMEOUT '):])
+        if missing:
+            raise TimeoutError(
+                f'{self.host_name}: timeout waiting for {", ".join(missing)}'
+            )
+        if not ready.issuperset(paths):
+            raise RuntimeError('Command Failed: ' + str(sc.cmd_parts))
+
+    # Arguments: cache directory (empty for the default), then whether an
+    # archive with new cache entries is passed on stdin, followed by pairs of
+    # hash and destination.
+    STAGE_FILES_SCRIPT = """
+set -e
+cache=${1:-/var/tmp/simbricks-file-cache-$(id -u)} ; extract=$2 ; shift 2
+mkdir -p "$cache"
+if [ "$extract" = 1 ] ; then
+    tmp=$(mktemp -d "$cache/.incoming.XXXXXX")
+    tar -xzf - -C "$tmp"
+    mv -f "$tmp"/* "$cache/"
+    rmdir "$tmp"
+fi
+while [ $# -gt 0 ] ; do
+    mkdir -p "$(dirname -- "$2")"
+    cp --reflink=auto "$cache/$1" "$2.staging.$$" 2>/dev/null || \
+        cp "$cache/$1" "$2.staging.$$"
+    mv -f "$2.staging.$$" "$2"
+    shift 2
+done
+"""
+
+    # Arguments: cache directory (empty for the default), then the hashes to
+    # look up. Prints the hashes that are cached.
+    CACHE_LOOKUP_SCRIPT = """
+cd "${1:-/var/tmp/simbricks-file-cache-$(id -u)}" 2>/dev/null || exit 0
+shift
+for h in "$@" ; do [ -f "$h" ] && echo "$h" ; done
+exit 0
+"""
+
+    @staticmethod
+    def _hash_file(path: str) -> str:
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            while True:
+                bs = f.read(1024 * 1024)
+                if not bs:
+                    return h.hexdigest()
+                h.update(bs)
+
+    async def _missing_hashes(self, hashes: tp.List[str]) -> tp.Set[str]:
+        """Determines which `hashes` are not in the remote file cache yet."""
+        sc = self.create_component(
+            f'{self.host_name}.file_cache_lookup',
+            [
+                '/bin/sh',
+                '-c',
+                self.CACHE_LOOKUP_SCRIPT,
+                'lookup',
+                self.file_cache or ''
+            ] + hashes,
+            canfail=False,
+            verbose=False
+        )
+        await sc.start()
+        await sc.wait()
+        return set(hashes) - set(sc.stdout.lines())
+
+    async def send_files(self, paths: tp.List[str], verbose=False) -> None:
+        """
+        Sends all `paths` with two ssh invocations independent of their number.
+
+        Files are identified by their content hash. Only files whose content
+        is not yet in the remote `file_cache` are transferred, as a single
+        compressed archive, and the destinations are then copied from the
+        cache on the remote host.
+        """
+        if not self.stage_files:
+            await super().send_files(paths, verbose)
+            return
+        if not paths:
+            return
+        await self.connect()
+
+        loop = asyncio.get_running_loop()
+        hashes = await asyncio.gather(
+            *[loop.run_in_executor(None, self._hash_file, p) for p in paths]
+        )
+        sources = dict(zip(hashes, paths))
+        missing = await self._missing_hashes(list(sources.keys()))
+        if verbose:
+            print(
+                f'{self.host_name}.send_files: {len(paths)} files, '
+                f'{len(missing)} not cached',
+                flush=True
+            )
+
+        parts = [
+            '/bin/sh',
+            '-c',
+            self.STAGE_FILES_SCRIPT,
+            'stage_files',
+            self.file_cache or '',
+            '1' if missing else '0'
+        ]
+        for h, p in zip(hashes, paths):
+            parts += [h, p]
+        sc = self.create_component(
+            f'{self.host_name}.send_files({len(paths)} files)',
+            parts,
+            with_stdin=bool(missing),
+            canfail=False,
+            verbose=verbose
+        )
+        await sc.start()
+        if missing:
+            # files can be large disk images, so the archive is streamed
+            # instead of being built in memory first
+            stdin = _ThreadInput(sc, loop)
+
+            def archive() -> None:
+                with tarfile.open(
+                    fileobj=stdin, mode='w|gz', bufsize=1024 * 1024
+                ) as tar:
+                    for h in missing:
+                        tar.add(sources[h], arcname=h)
+
+            await loop.run_in_executor(None, archive)
+            await sc.send_input(b'', eof=True)
+        await sc.wait()
 
     async def send_file(self, path: str, verbose=False) -> None:
+        if self.stage_files:
+            await self.send_files([path], verbose)
+            return
+
+        await self.connect()
         parts = [
             'scp',
             '-o',
             'UserKnownHostsFile=/dev/null',
             '-o',
             'StrictHostKeyChecking=no'
-        ] + self.scp_extra_args + [path, f'{self.host_name}:{path}']
+        ] + self._control_args() + self.scp_extra_args + [
+            path, f'{self.host_name}:{path}'
+        ]
         sc = SimpleComponent(
             f'{self.host_name}.send_file("{path}")',
             parts,
@@ -458,6 +1391,7 @@ class RemoteExecutor(Executor):
         await sc.wait()
 
     async def mkdir(self, path: str, verbose=False) -> None:
+        await self.connect()
         sc = self.create_component(
             f"{self.host_name}.mkdir('{path}')", ['mkdir', '-p', path],
             canfail=False,
@@ -467,6 +1401,7 @@ class RemoteExecutor(Executor):
         await sc.wait()
 
     async def rmtree(self, path: str, verbose=False) -> None:
+        await self.connect()
         sc = self.create_component(
             f'{self.host_name}.rmtree("{path}")', ['rm', '-rf', path],
             canfail=False,
@@ -474,3 +1409,157 @@ class RemoteExecutor(Executor):
         )
         await sc.start()
         await sc.wait()
+
+    async def rmtrees(self, paths: tp.List[str], verbose=False) -> None:
+        if not paths:
+            return
+        await self.connect()
+        sc = self.create_component(
+            f'{self.host_name}.rmtrees({len(paths)})',
+            ['rm', '-rf', '--'] + paths,
+            canfail=False,
+            verbose=verbose
+        )
+        await sc.start()
+        await sc.wait()
+
+    async def signal_components(
+        self, comps: tp.List[Component], sig: int
+    ) -> None:
+        # one kill for all components instead of an ssh invocation each
+        targets = []
+        for c in comps:
+            if isinstance(c, SimpleRemoteComponent) and c.running():
+                targets += c.kill_targets()
+        if not targets:
+            return
+        await self.connect()
+        sc = self.create_component(
+            f'{self.host_name}.kill({len(comps)})',
+            ['kill', '-' + signal.Signals(sig).name[3:], '--'] + targets,
+            # some may have exited in the meantime
+            canfail=True,
+            verbose=False
+        )
+        await sc.start()
+        await sc.wait()
+
+
+class AgentExecutor(Executor):
+    """
+    Executor running everything through a `simbricks.orchestration.agent` on
+    the remote host.
+
+    Components, signals, file transfers, and waits are multiplexed over a
+    single connection, so they do not pay for an ssh connection each. If
+    `port` is set, connects to an agent already listening there (e.g. on
+    localhost, forwarded over ssh). Otherwise, starts an agent on `host_name`
+    via ssh and talks to it over the ssh session's stdin and stdout.
+    """
+
+    def __init__(
+        self,
+        host_name: str,
+        workdir: str,
+        port: tp.Optional[int] = None
+    ) -> None:
+        super().__init__()
+
+        self.host_name = host_name
+        self.cwd = workdir
+        self.port = port
+        self.token: tp.Optional[str] = None
+        """Secret to present to an agent listening on `port`."""
+        self.python = 'python3'
+        """Python interpreter on the remote host used to start the agent."""
+        self.ssh_extra_args = []
+
+        self._conn: tp.Optional[asyncio.Future] = None
+
+    async def _connect(self) -> AgentConnection:
+        if self.port is not None:
+            reader, writer = await asyncio.open_connection(
+                self.host_name, self.port, limit=agent.READ_SIZE
+            )
+            conn = AgentConnection(reader, writer)
+        else:
+            source = pathlib.Path(agent.__file__).read_text(encoding='utf-8')
+            remote_parts = [self.python, '-c', source, '--stdio']
+            parts = [
+                'ssh',
+                '-o',
+                'UserKnownHostsFile=/dev/null',
+                '-o',
+                'StrictHostKeyChecking=no'
+            ] + self.ssh_extra_args + [self.host_name, '--'
+                                      ] + list(map(shlex.quote, remote_parts))
+            proc = await asyncio.create_subprocess_exec(
+                *parts,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                limit=agent.READ_SIZE
+            )
+            conn = AgentConnection(proc.stdout, proc.stdin, proc)
+
+        resp = await conn.request('hello', token=self.token)
+        if resp['version'] != agent.VERSION:
+            raise RuntimeError(
+                f'agent on {self.host_name} has version {resp["version"]}, '
+                f'expected {agent.VERSION}'
+            )
+        return conn
+
+    async def connect(self) -> AgentConnection:
+        """Returns the connection to the agent, establishing it if necessary."""
+        if self._conn is None:
+            self._conn = asyncio.ensure_future(self._connect())
+        return await asyncio.shield(self._conn)
+
+    def create_component(
+        self, label: str, parts: tp.List[str], **kwargs
+    ) -> AgentComponent:
+        return AgentComponent(self, label, parts, cwd=self.cwd, **kwargs)
+
+    async def await_file(
+        self, path: str, delay=0.05, verbose=False, timeout=30
+    ) -> None:
+        await self.await_files([path], delay, verbose, timeout)
+
+    async def await_files(
+        self,
+        paths: tp.List[str],
+        delay=0.05,
+        verbose=False,
+        timeout=30
+    ) -> None:
+        if not paths:
+            return
+        if verbose:
+            print(f'{self.host_name}.await_files({paths}) started')
+        conn = await self.connect()
+        try:
+            await conn.request(
+                'await_files', paths=paths, delay=delay, timeout=timeout
+            )
+        except RuntimeError as e:
+            if 'timeout' in str(e):
+                raise TimeoutError(
+                    f'{self.host_name}: timed out waiting for {paths}'
+                ) from e
+            raise
+        if verbose:
+            print(f'{self.host_name}.await_files({paths}) finished')
+
+    async def send_file(self, path: str, verbose=False) -> None:
+        if verbose:
+            print(f'{self.host_name}.send_file("{path}")')
+        conn = await self.connect()
+        await conn.put_file(path, path)
+
+    async def mkdir(self, path: str, verbose=False) -> None:
+        conn = await self.connect()
+        await conn.request('mkdir', path=path)
+
+    async def rmtree(self, path: str, verbose=False) -> None:
+        conn = await self.connect()
+        await conn.request('rmtree', path=path)
@@ -40,6 +40,11 @@ class ExpEnv(object):
         self.workdir = os.path.abspath(workdir)
         self.cpdir = os.path.abspath(cpdir)
         self.shm_base = self.workdir
+        self.tar_cache_dir: tp.Optional[str] = None
+        """
+        Directory caching config tars by content, so identical ones are only
+        built once. Disabled if None.
+        """
         self.qemu_img_path = f'{self.repodir}/sims/external/qemu/build/qemu-img'
         self.qemu_path = (
             f'{self.repodir}/sims/external/qemu/build/'
@@ -83,6 +88,9 @@ class ExpEnv(object):
             f'{hd_name_or_path}.raw'
         )
 
+    def sim_log_path(self, sim: 'simulators.Simulator', stream: str) -> str:
+        return f'{self.workdir}/log.{sim.full_name()}.{stream}.gz'
+
     def cfgtar_path(self, sim: 'simulators.Simulator') -> str:
         return f'{self.workdir}/cfg.{sim.name}.tar'
 
@@ -22,17 +22,29 @@
 
 import json
 import pathlib
+import shutil
 import time
 import typing as tp
 
+from simbricks.orchestration.exectools import Component, FileLogSink, LogSink
 from simbricks.orchestration.experiments import Experiment
 
 if tp.TYPE_CHECKING:  # prevent cyclic import
-    from simbricks.orchestration import exectools, simulators
+    from simbricks.orchestration import simulators
+
+STREAMS = ('stdout', 'stderr')
 
 
 class ExpOutput(object):
-    """Manages an experiment's output."""
+    """
+    Manages an experiment's output.
+
+    On disk, the output consists of a small JSON manifest at the output path
+    and a directory next to it (see `logs_path()`) containing one
+    gzip-compressed line stream per simulator and output stream. The manifest
+    references these as `stdout_file` and `stderr_file`, relative to its own
+    directory.
+    """
 
     def __init__(self, exp: Experiment) -> None:
         self.exp_name = exp.name
@@ -41,7 +53,21 @@ class ExpOutput(object):
         self.success = True
         self.interrupted = False
         self.metadata = exp.metadata
-        self.sims: tp.Dict[str, tp.Dict[str, tp.Union[str, tp.List[str]]]] = {}
+        self.sims: tp.Dict[str,
+                           tp.Dict[str, tp.Union[str, tp.List[str],
+                                                 LogSink]]] = {}
+        """
+        Per-simulator class, command, and output.
+
+        For simulators added with `add_sim()`, stdout and stderr reference the
+        component's log sinks, which already write their compressed streams
+        during the run.
+        """
+        self.sim_graph: tp.Dict[str, tp.List[str]] = {}
+        """Full names of the simulators each simulator depends on."""
+        self.sync_report: tp.List[tp.Dict[str, tp.Any]] = []
+        """Per-link report of which simulators waited on which peers, see
+        `profiling.link_report()`. Only filled if profiling was enabled."""
 
     def set_start(self) -> None:
         self.start_time = time.time()
@@ -56,9 +82,7 @@ class ExpOutput(object):
         self.success = False
         self.interrupted = True
 
-    def add_sim(
-        self, sim: 'simulators.Simulator', comp: 'exectools.Component'
-    ) -> None:
+    def add_sim(self, sim: 'simulators.Simulator', comp: Component) -> None:
         obj = {
             'class': sim.__class__.__name__,
             'cmd': comp.cmd_parts,
@@ -67,12 +91,125 @@ class ExpOutput(object):
         }
         self.sims[sim.full_name()] = obj
 
+    def add_telemetry(
+        self,
+        sim_name: str,
+        series: tp.Dict[str, tp.List[int]],
+        summary: tp.Dict[str, tp.Union[float, str]]
+    ) -> None:
+        """Adds resource usage time series and its summary for a simulator."""
+        obj = self.sims.setdefault(sim_name, {})
+        obj['telemetry'] = series
+        obj['telemetry_summary'] = summary
+
+    def add_sync_profile(
+        self,
+        sim_name: str,
+        series: tp.Dict[str, tp.Any],
+        counters: tp.Dict[str, int]
+    ) -> None:
+        """Adds the time series parsed from a simulator's SIGUSR1 dumps and
+        the poll counters it printed on exit."""
+        obj = self.sims.setdefault(sim_name, {})
+        obj['sync_profile'] = series
+        if counters:
+            obj['poll_counters'] = counters
+
+    def add_shutdown(self, sim_name: str, secs: float, sig: str) -> None:
+        """Records how long a simulator took to exit after the last signal
+        `sig` it was sent on shutdown (`none` if it had exited already)."""
+        obj = self.sims.setdefault(sim_name, {})
+        obj['shutdown_s'] = secs
+        obj['shutdown_signal'] = sig
+
+    @staticmethod
+    def logs_path(outpath: str) -> str:
+        """Directory holding the simulators' output streams for `outpath`."""
+        return str(pathlib.Path(outpath).with_suffix('.logs'))
+
     def dump(self, outpath: str) -> None:
-        pathlib.Path(outpath).parent.mkdir(parents=True, exist_ok=True)
+        out_dir = pathlib.Path(outpath).parent
+        out_dir.mkdir(parents=True, exist_ok=True)
+        logs = pathlib.Path(self.logs_path(outpath))
+        shutil.rmtree(logs, ignore_errors=True)
+        logs.mkdir()
+
+        manifest = {k: v for (k, v) in self.__dict__.items() if k != 'sims'}
+        manifest['sims'] = {}
+        for (name, obj) in self.sims.items():
+            m_obj = {
+                k: v
+                for (k, v) in obj.items()
+                if k not in STREAMS and k != 'telemetry'
+            }
+            for stream in STREAMS:
+                rel_path = f'{logs.name}/{name}.{stream}.gz'
+                self._dump_stream(obj.get(stream, []), str(out_dir / rel_path))
+                m_obj[f'{stream}_file'] = rel_path
+            if 'telemetry' in obj:
+                # one sample per second adds up, so keep it out of the
+                # manifest and store without whitespace
+                rel_path = f'{logs.name}/{name}.telemetry.json'
+                with open(out_dir / rel_path, 'w', encoding='utf-8') as file:
+                    json.dump(obj['telemetry'], file, separators=(',', ':'))
+                m_obj['telemetry_file'] = rel_path
+            manifest['sims'][name] = m_obj
+
         with open(outpath, 'w', encoding='utf-8') as file:
-            json.dump(self.__dict__, file, indent=4)
+            json.dump(manifest, file, indent=4)
+
+    @staticmethod
+    def _dump_stream(lines: tp.Union[tp.List[str], LogSink], path: str) -> None:
+        if isinstance(lines, FileLogSink):
+            # already written during the run, so just move it over
+            lines.move(path)
+            return
+
+        if isinstance(lines, LogSink):
+            lines = list(lines.lines())
+        sink = FileLogSink(path, keep=0)
+        sink.extend(lines)
+        sink.close()
 
     def load(self, file: str) -> None:
+        """
+        Loads an output file, reading all simulator output into memory.
+
+        Also supports the previous format, which inlines all output into a
+        single JSON file.
+        """
         with open(file, 'r', encoding='utf-8') as fp:
-            for k, v in json.load(fp).items():
-                self.__dict__[k] = v
+            data = json.load(fp)
+
+        for obj in data['sims'].values():
+            for stream in STREAMS:
+                if f'{stream}_file' in obj:
+                    path = pathlib.Path(file).parent / obj.pop(f'{stream}_file')
+                    obj[stream] = list(FileLogSink(str(path)).lines())
+            if 'telemetry_file' in obj:
+                path = pathlib.Path(file).parent / obj.pop('telemetry_file')
+                with open(path, 'r', encoding='utf-8') as fp:
+                    obj['telemetry'] = json.load(fp)
+
+        for k, v in data.items():
+            self.__dict__[k] = v
+
+
+def sim_output(outpath: str,
+               sim_name: str,
+               stream: str = 'stdout') -> tp.Iterator[str]:
+    """
+    Lazily iterates over the lines a simulator printed on `stream` (`stdout` or
+    `stderr`) in the output file `outpath`.
+
+    Only the manifest and the requested stream are read.
+    """
+    with open(outpath, 'r', encoding='utf-8') as fp:
+        obj = json.load(fp)['sims'][sim_name]
+
+    if f'{stream}_file' not in obj:
+        # previous format with inlined output
+        return iter(obj[stream])
+
+    path = pathlib.Path(outpath).parent / obj[f'{stream}_file']
+    return FileLogSink(str(path)).lines()
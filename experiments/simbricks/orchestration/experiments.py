@@ -20,10 +20,12 @@
 # TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
 # SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
+import hashlib
 import itertools
 import typing as tp
 
-from simbricks.orchestration import simulators
+from simbricks.orchestration import resources, simulators
+from simbricks.orchestration.experiment.experiment_environment import ExpEnv
 from simbricks.orchestration.proxy import NetProxyConnecter, NetProxyListener
 from simbricks.orchestration.simulators import (
     HostSim, I40eMultiNIC, NetSim, NICSim, PCIDevSim, Simulator
@@ -120,16 +122,34 @@ class Experiment(object):
         """Memory required to run all simulators in this experiment."""
         mem = 0
         for s in self.all_simulators():
-            mem += s.resreq_mem()
+            mem += resources.resreq_mem(s)
         return mem
 
     def resreq_cores(self) -> int:
         """Number of Cores required to run all simulators in this experiment."""
         cores = 0
         for s in self.all_simulators():
-            cores += s.resreq_cores()
+            cores += resources.resreq_cores(s)
         return cores
 
+    def checkpoint_key(self, env: ExpEnv) -> str:
+        """
+        Hash of the state of all hosts when the checkpoint is taken, see
+        `HostSim.checkpoint_key()`. Experiments with the same key can restore
+        from the same checkpoint.
+        """
+        h = hashlib.sha256()
+        for host in sorted(self.hosts, key=lambda host: host.name):
+            h.update(f'{host.name} {host.checkpoint_key(env)}\n'.encode())
+        return h.hexdigest()
+
+    def checkpoint_outputs(self, env: ExpEnv) -> tp.List[str]:
+        """Files or directories the hosts write their checkpoints to."""
+        outputs = []
+        for host in self.hosts:
+            outputs.extend(host.checkpoint_outputs(env))
+        return outputs
+
 
 class DistributedExperiment(Experiment):
     """Describes a distributed simulation experiment."""
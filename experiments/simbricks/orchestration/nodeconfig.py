@@ -22,11 +22,63 @@
 
 from __future__ import annotations
 
+import hashlib
 import io
+import os
 import tarfile
+import threading
+import time
 import typing as tp
 
 import simbricks.orchestration.experiment.experiment_environment as env
+from simbricks.orchestration.utils import files
+
+TAR_CACHE_MAX_AGE = 24 * 3600
+"""Seconds after their last use that cached config tars are removed."""
+
+_digests: tp.Dict[tp.Tuple[int, int, int, int], bytes] = {}
+"""Content hashes of files on disk by device, inode, size, and mtime."""
+
+
+def _file_digest(f: tp.IO) -> bytes:
+    """SHA-256 of the contents of `f`, memoized for unmodified files on disk."""
+    try:
+        st = os.fstat(f.fileno())
+        key = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+    except (AttributeError, OSError):
+        # in-memory file such as from `strfile()`
+        key = None
+    if key is not None and key in _digests:
+        return _digests[key]
+
+    h = hashlib.sha256()
+    f.seek(0, io.SEEK_SET)
+    while True:
+        bs = f.read(1024 * 1024)
+        if not bs:
+            break
+        h.update(bs)
+    if key is not None:
+        _digests[key] = h.digest()
+    return h.digest()
+
+
+def prune_tar_cache(cache_dir: str, max_age: float = TAR_CACHE_MAX_AGE) -> None:
+    """
+    Removes config tars from `cache_dir` not used in the last `max_age`
+    seconds, e.g. left over from configurations that have changed since.
+    """
+    if not os.path.isdir(cache_dir):
+        return
+    deadline = time.time() - max_age
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        try:
+            if os.stat(path).st_mtime < deadline:
+                os.unlink(path)
+        except FileNotFoundError:
+            # removed concurrently
+            pass
 
 
 class AppConfig():
@@ -123,27 +175,66 @@ class NodeConfig():
             self.run_cmds() + self.cleanup_cmds() + exit_es
         return '\n'.join(es)
 
+    def _tar_members(self,
+                     environment: env.ExpEnv) -> tp.List[tp.Tuple[str, tp.IO]]:
+        # main run script first, then additional config files
+        members = [('guest/run.sh', self.strfile(self.config_str()))]
+        for (n, f) in self.config_files(environment).items():
+            members.append(('guest/' + n, f))
+        return members
+
+    @staticmethod
+    def _tar_digest(members: tp.List[tp.Tuple[str, tp.IO]]) -> str:
+        h = hashlib.sha256(b'cfgtar-v1')
+        for (n, f) in members:
+            h.update(n.encode('utf-8') + b'\0' + _file_digest(f))
+        return h.hexdigest()
+
+    def config_digest(self, environment: env.ExpEnv) -> str:
+        """Hash of the contents of the config tar, without building it."""
+        members = self._tar_members(environment)
+        try:
+            return self._tar_digest(members)
+        finally:
+            for (_, f) in members:
+                f.close()
+
     def make_tar(self, environment: env.ExpEnv, path: str) -> None:
+        members = self._tar_members(environment)
+        try:
+            if environment.tar_cache_dir is None:
+                self._write_tar(path, members)
+                return
+
+            # identical contents result in an identical tar, so build it only
+            # once and clone it into place
+            digest = self._tar_digest(members)
+            cached = f'{environment.tar_cache_dir}/{digest}.tar'
+            try:
+                # mark as used, so it is not pruned
+                os.utime(cached)
+            except FileNotFoundError:
+                os.makedirs(environment.tar_cache_dir, exist_ok=True)
+                # runs may be prepared concurrently in multiple threads
+                tmp = f'{cached}.{os.getpid()}.{threading.get_ident()}.tmp'
+                self._write_tar(tmp, members)
+                os.replace(tmp, cached)
+            # hosts attach the tar as a writable disk, so never hard link it
+            files.clone_file(cached, path)
+        finally:
+            for (_, f) in members:
+                f.close()
+
+    @staticmethod
+    def _write_tar(path: str, members: tp.List[tp.Tuple[str, tp.IO]]) -> None:
         with tarfile.open(path, 'w:') as tar:
-            # add main run script
-            cfg_i = tarfile.TarInfo('guest/run.sh')
-            cfg_i.mode = 0o777
-            cfg_f = self.strfile(self.config_str())
-            cfg_f.seek(0, io.SEEK_END)
-            cfg_i.size = cfg_f.tell()
-            cfg_f.seek(0, io.SEEK_SET)
-            tar.addfile(tarinfo=cfg_i, fileobj=cfg_f)
-            cfg_f.close()
-
-            # add additional config files
-            for (n, f) in self.config_files(environment).items():
-                f_i = tarfile.TarInfo('guest/' + n)
+            for (n, f) in members:
+                f_i = tarfile.TarInfo(n)
                 f_i.mode = 0o777
                 f.seek(0, io.SEEK_END)
                 f_i.size = f.tell()
                 f.seek(0, io.SEEK_SET)
                 tar.addfile(tarinfo=f_i, fileobj=f)
-                f.close()
 
     def prepare_pre_cp(self) -> tp.List[str]:
         """Commands to run to prepare node before checkpointing."""
@@ -0,0 +1,360 @@
+# Copyright 2024 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+Partitioning of experiments across multiple machines.
+
+Simulators are split along the SimBricks links that proxies can forward,
+i.e. Ethernet links between NICs and networks and between two networks. PCIe
+and memory links, as well as direct links between networks and hosts, always
+stay on one machine. Only the simulator graph is inspected, so partitions can
+be computed and checked for synthetic topologies without running anything.
+"""
+
+from __future__ import annotations
+
+import typing as tp
+
+from simbricks.orchestration import proxy, resources
+from simbricks.orchestration.experiments import (
+    DistributedExperiment, Experiment
+)
+from simbricks.orchestration.simulators import (
+    HostSim, MultiSubNIC, NetSim, NICSim, Simulator
+)
+
+
+class Link(object):
+    """Ethernet link between two simulators that can be proxied."""
+
+    def __init__(
+        self,
+        a: Simulator,
+        b: Simulator,
+        suffix: tp.Optional[str] = None
+    ) -> None:
+        self.a = a
+        """NIC or connecting network."""
+        self.b = b
+        """Network the NIC or connecting network `a` is attached to."""
+        self.suffix = suffix
+        """Socket suffix for network-to-network links, None for NIC links."""
+
+    def is_n2n(self) -> bool:
+        return self.suffix is not None
+
+
+class Graph(object):
+    """Weighted graph to partition, with vertices numbered from zero."""
+
+    def __init__(self) -> None:
+        self.weights: tp.List[float] = []
+        """Load of each vertex."""
+        self.adj: tp.List[tp.Dict[int, float]] = []
+        """Weight of the edges between each pair of vertices, i.e. the cost
+        of placing them on different machines."""
+
+    def add_vertex(self, weight: float) -> int:
+        self.weights.append(weight)
+        self.adj.append({})
+        return len(self.weights) - 1
+
+    def add_edge(self, u: int, v: int, weight: float = 1) -> None:
+        if u == v:
+            return
+        self.adj[u][v] = self.adj[u].get(v, 0) + weight
+        self.adj[v][u] = self.adj[v].get(u, 0) + weight
+
+    def cut_weight(self, parts: tp.List[int]) -> float:
+        """Total weight of edges between machines if vertex `i` is placed on
+        machine `parts[i]`."""
+        cut = 0.0
+        for (u, edges) in enumerate(self.adj):
+            for (v, w) in edges.items():
+                if u < v and parts[u] != parts[v]:
+                    cut += w
+        return cut
+
+
+class SimGraph(Graph):
+    """
+    Simulators of an experiment grouped into units that must run on the same
+    machine, with their CPU weights and the proxiable links between them.
+    Units are the vertices of the graph, edge weights count links.
+    """
+
+    def __init__(
+        self,
+        exp: Experiment,
+        weights: tp.Optional[tp.Dict[Simulator, float]] = None
+    ) -> None:
+        super().__init__()
+        self.exp = exp
+        self.units: tp.List[tp.List[Simulator]] = []
+        """Groups of simulators connected by links that cannot be proxied."""
+        self.unit_of: tp.Dict[Simulator, int] = {}
+        self.links: tp.List[Link] = []
+
+        sims = list(exp.all_simulators())
+        parent = {s: s for s in sims}
+
+        def find(s: Simulator) -> Simulator:
+            while parent[s] is not s:
+                parent[s] = parent[parent[s]]
+                s = parent[s]
+            return s
+
+        def union(a: Simulator, b: Simulator) -> None:
+            for s in (a, b):
+                if s not in parent:
+                    parent[s] = s
+                    sims.append(s)
+            parent[find(a)] = find(b)
+
+        for s in list(sims):
+            if isinstance(s, HostSim):
+                for dev in s.pcidevs + s.memdevs:
+                    union(s, dev)
+            if isinstance(s, MultiSubNIC):
+                union(s, s.multinic)
+            if isinstance(s, NetSim):
+                for h in s.hosts_direct:
+                    union(s, h)
+                for (net_l, suffix) in s.net_connect:
+                    self.links.append(Link(s, net_l, suffix))
+            elif isinstance(s, NICSim) and s.network is not None:
+                self.links.append(Link(s, s.network))
+
+        roots: tp.Dict[Simulator, int] = {}
+        for s in sims:
+            r = find(s)
+            if r not in roots:
+                roots[r] = self.add_vertex(0)
+                self.units.append([])
+            u = roots[r]
+            self.units[u].append(s)
+            self.unit_of[s] = u
+            if weights is not None and s in weights:
+                self.weights[u] += weights[s]
+            else:
+                self.weights[u] += resources.resreq_cores(s)
+
+        for link in self.links:
+            self.add_edge(self.unit_of[link.a], self.unit_of[link.b])
+
+    def cut(self, parts: tp.List[int]) -> tp.List[Link]:
+        """Links crossing machines if unit `i` runs on machine `parts[i]`."""
+        return [
+            link for link in self.links
+            if parts[self.unit_of[link.a]] != parts[self.unit_of[link.b]]
+        ]
+
+
+def partition(
+    graph: Graph,
+    n: int,
+    capacities: tp.Optional[tp.List[float]] = None,
+    imbalance: float = 0.1
+) -> tp.List[int]:
+    """
+    Assigns each vertex of `graph` to one of `n` machines, minimizing the
+    weight of edges between machines while keeping the load balanced.
+
+    Machine `i` is allowed a share of the total weight proportional to
+    `capacities[i]` (equal shares by default), exceeded by at most a factor
+    of `1 + imbalance` unless a single vertex is larger. Machines are first
+    filled up to their share one after another by growing a region from the
+    heaviest vertex left, adding the vertex with the most edge weight into the
+    region and least to vertices outside of it. Remaining vertices go to the
+    machine they have most edge weight to among those with room left.
+    Vertices are then moved between machines as long as this reduces the
+    weight of edges between machines or evens out the load without
+    increasing it.
+
+    Returns the machine for each vertex.
+    """
+    if capacities is None:
+        capacities = [1.0] * n
+    assert len(capacities) == n
+    total = sum(graph.weights)
+    share = [total * c / sum(capacities) for c in capacities]
+    limit = [
+        max(s * (1 + imbalance), max(graph.weights, default=0)) for s in share
+    ]
+    load = [0.0] * n
+    parts = [-1] * len(graph.weights)
+
+    def links_to(u: int, m: int) -> float:
+        return sum(c for (v, c) in graph.adj[u].items() if parts[v] == m)
+
+    def region_links(u: int, m: int) -> float:
+        """Edge weight from `u` to machine `m` minus to unassigned vertices."""
+        return links_to(u, m) - links_to(u, -1)
+
+    def rel(m: int, extra: float = 0) -> float:
+        return (load[m] + extra) / max(share[m], 1e-9)
+
+    def assign(u: int, m: int) -> None:
+        parts[u] = m
+        load[m] += graph.weights[u]
+
+    order = sorted(range(len(graph.weights)), key=lambda u: -graph.weights[u])
+    for m in range(n):
+        frontier: tp.Set[int] = set()
+        while True:
+            # a vertex larger than the share gets a machine on its own
+            fits = [
+                u for u in order if parts[u] == -1 and
+                (load[m] + graph.weights[u] <= share[m] or load[m] == 0)
+            ]
+            if not fits:
+                break
+            if frontier & set(fits):
+                fits = [u for u in fits if u in frontier]
+            # connected vertices first, preferring those mostly connected to
+            # the region
+            u = max(
+                fits, key=lambda u, m=m: (region_links(u, m), graph.weights[u])
+            )
+            assign(u, m)
+            frontier.discard(u)
+            frontier.update(v for v in graph.adj[u] if parts[v] == -1)
+    # vertices that did not fit into any region without exceeding the share
+    for u in order:
+        if parts[u] != -1:
+            continue
+        w = graph.weights[u]
+        machines = [m for m in range(n) if load[m] + w <= limit[m]]
+        if machines:
+            m = max(
+                machines, key=lambda m, u=u, w=w: (links_to(u, m), -rel(m, w))
+            )
+        else:
+            m = min(range(n), key=lambda m, w=w: rel(m, w))
+        assign(u, m)
+
+    # refine by moving single vertices, every move reduces the weight of edges
+    # between machines or the spread of the load, so this terminates
+    for _ in range(100):
+        moved = False
+        for u in order:
+            w = graph.weights[u]
+            cur = parts[u]
+            best = None
+            best_key = (0, 0.0)
+            for m in range(n):
+                if m == cur or load[m] + w > limit[m]:
+                    continue
+                gain = links_to(u, m) - links_to(u, cur)
+                balance = rel(cur) - rel(m, w)
+                if gain < 0 or (gain == 0 and balance <= 1e-9):
+                    continue
+                if (gain, balance) > best_key:
+                    (best, best_key) = (m, (gain, balance))
+            if best is not None:
+                parts[u] = best
+                load[cur] -= w
+                load[best] += w
+                moved = True
+        if not moved:
+            break
+    return parts
+
+
+def distribute(
+    e: Experiment,
+    n: int,
+    proxy_type: str = 'sockets',
+    *,
+    weights: tp.Optional[tp.Dict[Simulator, float]] = None,
+    capacities: tp.Optional[tp.List[float]] = None,
+    imbalance: float = 0.1
+) -> DistributedExperiment:
+    """
+    Converts `e` into a DistributedExperiment across `n` machines, using
+    `partition()` to assign simulators to machines.
+
+    One listener/connecter proxy pair is added for each pair of machines with
+    links between them, with the listener on the machine with the lower ID.
+    """
+    if proxy_type == 'sockets':
+        proxy_listener_c = proxy.SocketsNetProxyListener
+        proxy_connecter_c = proxy.SocketsNetProxyConnecter
+    elif proxy_type == 'rdma':
+        proxy_listener_c = proxy.RDMANetProxyListener
+        proxy_connecter_c = proxy.RDMANetProxyConnecter
+    else:
+        raise RuntimeError('Unknown proxy type specified')
+
+    graph = SimGraph(e, weights)
+    parts = partition(graph, n, capacities, imbalance)
+
+    de = DistributedExperiment(e.name, n)
+    de.timeout = e.timeout
+    de.checkpoint = e.checkpoint
+    de.no_simbricks = e.no_simbricks
+    de.metadata = e.metadata.copy()
+    for h in e.hosts:
+        de.add_host(h)
+    for dev in e.pcidevs:
+        de.add_pcidev(dev)
+    for dev in e.memdevs:
+        de.add_memdev(dev)
+    for dev in e.netmems:
+        de.add_netmem(dev)
+    for net in e.networks:
+        de.add_network(net)
+    for s in de.all_simulators():
+        de.assign_sim_host(s, parts[graph.unit_of[s]])
+
+    pairs: tp.Dict[tp.Tuple[int, int], proxy.NetProxyListener] = {}
+    listeners = [0] * n
+    for link in graph.cut(parts):
+        (ma, mb) = (parts[graph.unit_of[link.a]], parts[graph.unit_of[link.b]])
+        pair = (min(ma, mb), max(ma, mb))
+        if pair not in pairs:
+            lp = proxy_listener_c()
+            lp.name = f'listener-{pair[0]}-{pair[1]}'
+            # several listeners can run on the same machine
+            lp.port += listeners[pair[0]]
+            listeners[pair[0]] += 1
+            de.add_proxy(lp)
+            de.assign_sim_host(lp, pair[0])
+
+            cp = proxy_connecter_c(lp)
+            cp.name = f'connecter-{pair[0]}-{pair[1]}'
+            de.add_proxy(cp)
+            de.assign_sim_host(cp, pair[1])
+            pairs[pair] = lp
+
+        lp = pairs[pair]
+        # the proxy on the machine of the NIC or listening network adds it
+        if link.is_n2n():
+            on_listener = mb == pair[0]
+        else:
+            on_listener = ma == pair[0]
+        p = lp if on_listener else lp.connecter
+        if link.is_n2n():
+            p.add_n2n(link.a, link.b, link.suffix)
+        else:
+            p.add_nic(tp.cast(NICSim, link.a))
+
+    return de
@@ -0,0 +1,243 @@
+# Copyright 2024 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Placement of simulator processes on CPUs and NUMA nodes."""
+
+from __future__ import annotations
+
+import glob
+import os
+import shutil
+import typing as tp
+
+from simbricks.orchestration import resources
+
+if tp.TYPE_CHECKING:  # prevent cyclic import
+    from simbricks.orchestration.experiments import Experiment
+    from simbricks.orchestration.simulators import Simulator
+
+
+def parse_cpulist(s: str) -> tp.Set[int]:
+    """Parses a Linux cpulist such as `0-3,8,10-11`."""
+    cpus = set()
+    for part in s.strip().split(','):
+        if not part:
+            continue
+        if '-' in part:
+            lo, hi = part.split('-')
+            cpus.update(range(int(lo), int(hi) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+
+def format_cpulist(cpus: tp.Iterable[int]) -> str:
+    return ','.join(map(str, sorted(cpus)))
+
+
+def numa_nodes() -> tp.Dict[int, tp.List[int]]:
+    """CPUs this process may run on, by NUMA node."""
+    allowed = os.sched_getaffinity(0)
+    nodes = {}
+    for path in glob.glob('/sys/devices/system/node/node[0-9]*'):
+        with open(f'{path}/cpulist', 'r', encoding='utf-8') as f:
+            cpus = parse_cpulist(f.read()) & allowed
+        if cpus:
+            nodes[int(os.path.basename(path)[4:])] = sorted(cpus)
+    if not nodes:
+        # no NUMA information, e.g. in some containers
+        nodes[0] = sorted(allowed)
+    return nodes
+
+
+class SimPlacement(object):
+    """CPUs and NUMA node assigned to one simulator."""
+
+    NUMACTL = shutil.which('numactl')
+    TASKSET = shutil.which('taskset')
+
+    def __init__(self, cpus: tp.List[int], node: int) -> None:
+        self.cpus = cpus
+        self.node = node
+        """
+        NUMA node to allocate memory on, including the shared memory regions
+        the simulator creates for its SimBricks channels.
+        """
+
+    def wrap(self, cmd_parts: tp.List[str]) -> tp.List[str]:
+        """Prefixes command to run it on the assigned CPUs and node."""
+        cpus = format_cpulist(self.cpus)
+        if self.NUMACTL is not None:
+            # shm pages are allocated on the node of the process first
+            # touching them, which is the one creating the channel
+            return [
+                self.NUMACTL,
+                f'--physcpubind={cpus}',
+                f'--preferred={self.node}'
+            ] + cmd_parts
+        if self.TASKSET is not None:
+            # without a memory policy, pages are still allocated locally to
+            # the CPU they are first touched on
+            return [self.TASKSET, '-c', cpus] + cmd_parts
+        return cmd_parts
+
+
+class CpuAllocator(object):
+    """
+    Assigns CPUs to the simulators of concurrently executing runs.
+
+    Simulators exchanging SimBricks messages with each other are kept on the
+    same NUMA node where possible: all simulators of a run if they fit on one
+    node, otherwise hosts together with their devices, next to the network
+    they are connected to.
+    """
+
+    def __init__(
+        self, nodes: tp.Optional[tp.Dict[int, tp.List[int]]] = None
+    ) -> None:
+        if nodes is None:
+            nodes = numa_nodes()
+        self.free: tp.Dict[int, tp.List[int]] = {
+            n: list(cpus) for n, cpus in nodes.items()
+        }
+        """CPUs not assigned to any simulator by NUMA node."""
+        self.cpu_node = {c: n for n, cpus in nodes.items() for c in cpus}
+
+    def num_free(self) -> int:
+        return sum(len(cpus) for cpus in self.free.values())
+
+    def _take(self, node: int, n: int) -> tp.List[int]:
+        cpus = self.free[node][:n]
+        del self.free[node][:n]
+        return cpus
+
+    def _assign(
+        self,
+        sims: tp.List[Simulator],
+        node: int,
+        placement: tp.Dict[Simulator, SimPlacement]
+    ) -> None:
+        for sim in sims:
+            placement[sim] = SimPlacement(
+                self._take(node, resources.resreq_cores(sim)), node
+            )
+
+    @staticmethod
+    def _graph(exp: Experiment) -> tp.Dict[Simulator, tp.Set[Simulator]]:
+        """Which simulators exchange messages with each other."""
+        sims = list(exp.all_simulators())
+        adj = {s: set() for s in sims}
+        for s in sims:
+            for d in s.dependencies() + s.extra_deps:
+                if d in adj:
+                    adj[s].add(d)
+                    adj[d].add(s)
+        return adj
+
+    @staticmethod
+    def _units(
+        adj: tp.Dict[Simulator, tp.Set[Simulator]]
+    ) -> tp.List[tp.List[Simulator]]:
+        """Groups simulators that should stay on the same node."""
+        # pylint: disable=import-outside-toplevel
+        from simbricks.orchestration.simulators import NetSim
+
+        # networks form units of their own, all other simulators form one unit
+        # with what they are connected to except through a network
+        unit_of = {}
+        units = []
+        for s in sorted(adj, key=lambda s: -len(adj[s])):
+            if s in unit_of:
+                continue
+            unit = [s]
+            unit_of[s] = unit
+            if not isinstance(s, NetSim):
+                i = 0
+                while i < len(unit):
+                    for d in adj[unit[i]]:
+                        if d not in unit_of and not isinstance(d, NetSim):
+                            unit_of[d] = unit
+                            unit.append(d)
+                    i += 1
+            units.append(unit)
+
+        # networks first, they usually have the most neighbors
+        units.sort(key=lambda u: not isinstance(u[0], NetSim))
+        return units
+
+    def place(self,
+              exp: Experiment) -> tp.Optional[tp.Dict[Simulator, SimPlacement]]:
+        """
+        Assigns CPUs to all simulators in `exp`. Returns None without assigning
+        anything if there are not enough free CPUs.
+        """
+        total = exp.resreq_cores()
+        if total > self.num_free():
+            return None
+
+        placement = {}
+        fitting = [n for n, cpus in self.free.items() if len(cpus) >= total]
+        if fitting:
+            # best fit to leave large nodes for large runs
+            node = min(fitting, key=lambda n: len(self.free[n]))
+            self._assign(list(exp.all_simulators()), node, placement)
+            return placement
+
+        adj = self._graph(exp)
+        for unit in self._units(adj):
+            cores = sum(resources.resreq_cores(s) for s in unit)
+            # prefer the node most of the unit's neighbors are on
+            votes = {n: 0 for n in self.free}
+            for s in unit:
+                for d in adj[s]:
+                    if d in placement:
+                        votes[placement[d].node] += 1
+            candidates = [
+                n for n, cpus in self.free.items() if len(cpus) >= cores
+            ]
+            if candidates:
+                node = max(
+                    candidates,
+                    key=lambda n, votes=votes: (votes[n], len(self.free[n]))
+                )
+                self._assign(unit, node, placement)
+                continue
+
+            # unit does not fit on any node, split it up
+            for s in unit:
+                need = resources.resreq_cores(s)
+                cpus = []
+                node = None
+                while len(cpus) < need:
+                    n = max(self.free, key=lambda n: len(self.free[n]))
+                    if node is None:
+                        node = n
+                    cpus += self._take(n, need - len(cpus))
+                placement[s] = SimPlacement(cpus, node)
+        return placement
+
+    def release(self, placement: tp.Dict[Simulator, SimPlacement]) -> None:
+        """Returns the CPUs assigned by `place()`."""
+        for p in placement.values():
+            for c in p.cpus:
+                self.free[self.cpu_node[c]].append(c)
+        for cpus in self.free.values():
+            cpus.sort()
@@ -0,0 +1,318 @@
+# Copyright 2024 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+Parsing of the synchronization state simulators print on SIGUSR1.
+
+When profiling is enabled (see `Runtime.enable_profiler()`), the runner
+periodically sends SIGUSR1 to all simulators. The SimBricks adapters react by
+printing their current simulation time and, where supported, the timestamps of
+the last message received from and sent to each peer. Between two such dumps,
+a simulator that is blocked on a peer sits exactly at that peer's
+`in_timestamp`. Tracking which peer that is over the run yields a per-link
+report of who waits on whom.
+"""
+
+import re
+import typing as tp
+
+from simbricks.orchestration import simulators
+from simbricks.orchestration.experiment.experiment_environment import ExpEnv
+from simbricks.orchestration.experiments import Experiment
+
+_MAIN_TIME = re.compile(r'(?:\[Runner (\S+)\] )?main_time = (\d+)$')
+_PORT_TS = re.compile(r'\[Port (\d+) \]: (in|out)_timestamp == (\d+)$')
+_IF_TS = re.compile(r'(\w+)_(in|out)_timestamp = (\d+)$')
+_COUNTER = re.compile(r'(\w+_poll_\w+):\s+(\d+)')
+
+
+class SyncDump(object):
+    """Synchronization state of a simulator at one point in time."""
+
+    def __init__(self, main_time: int) -> None:
+        self.main_time = main_time
+        """Simulation time in picoseconds."""
+        self.in_ts: tp.Dict[str, int] = {}
+        """Timestamp of the last message received, by peer label."""
+        self.out_ts: tp.Dict[str, int] = {}
+        """Timestamp of the last message sent, by peer label."""
+
+
+def _strip_level(line: str) -> str:
+    # adapters using the sim_log helpers prefix lines with the log level
+    for level in ('error: ', 'warn: ', 'info: '):
+        if line.startswith(level):
+            return line[len(level):]
+    return line
+
+
+def parse_dumps(lines: tp.Iterable[str]) -> tp.List[SyncDump]:
+    """
+    Extracts the SIGUSR1 dumps from a simulator's output stream in order.
+
+    Simulators with multiple runners in one process (nicbm) print one dump per
+    runner; peers of runners other than the first are labelled with the
+    runner's index. A last dump with fewer timestamps than the one before was
+    cut short, e.g. by the simulator exiting while printing it, and is
+    dropped.
+    """
+    dumps: tp.List[SyncDump] = []
+    runners: tp.Dict[str, int] = {}
+    cur: tp.Optional[SyncDump] = None
+    prefix = ''
+    for l in lines:
+        l = _strip_level(l.strip())
+        m = _MAIN_TIME.match(l)
+        if m:
+            runner = m.group(1)
+            idx = runners.setdefault(runner, len(runners))
+            if idx == 0 or cur is None:
+                cur = SyncDump(int(m.group(2)))
+                dumps.append(cur)
+            prefix = f'r{idx}.' if idx else ''
+            continue
+        if cur is None:
+            continue
+        m = _PORT_TS.match(l)
+        if m:
+            peer = f'{prefix}port{m.group(1)}'
+        else:
+            m = _IF_TS.match(l)
+            if not m:
+                continue
+            peer = prefix + m.group(1)
+        ts = cur.in_ts if m.group(2) == 'in' else cur.out_ts
+        ts[peer] = int(m.group(3))
+
+    sizes = [len(d.in_ts) + len(d.out_ts) for d in dumps[-2:]]
+    if len(sizes) == 2 and sizes[1] < sizes[0]:
+        dumps.pop()
+    return dumps
+
+
+def parse_counters(lines: tp.Iterable[str]) -> tp.Dict[str, int]:
+    """
+    Extracts the poll and sync counters simulators built with statistics
+    support (NETSWITCH_STAT, STAT_NICBM) print on exit.
+    """
+    counters = {}
+    for l in lines:
+        for (k, v) in _COUNTER.findall(l):
+            counters[k] = int(v)
+    return counters
+
+
+def poll_wait_frac(counters: tp.Dict[str, int]) -> tp.Optional[float]:
+    """
+    Fraction of polls that did not deliver a data message, i.e. that found
+    nothing or only a synchronization message, from the counters of
+    `parse_counters()`. Busy-polling simulators waiting on a peer mostly poll
+    in vain, so this estimates how long they were waiting. None if the
+    simulator did not print poll counters.
+    """
+    total = 0
+    idle = 0
+    for (k, v) in counters.items():
+        if k.startswith('s_') or not k.endswith('_poll_total'):
+            continue
+        prefix = k[:-len('total')]
+        total += v
+        idle += v - counters.get(prefix + 'suc', v)
+        idle += counters.get(prefix + 'sync', 0)
+    if not total:
+        return None
+    return min(1.0, idle / total)
+
+
+def sim_peers(exp: Experiment, env: ExpEnv) -> tp.Dict[str, tp.Dict[str, str]]:
+    """
+    Maps the peer labels used in dumps to the full names of the connected
+    simulators, by full simulator name.
+    """
+    hosts = {}
+    for h in exp.hosts:
+        for dev in h.pcidevs:
+            hosts[dev] = h
+
+    peers = {}
+    for sim in exp.all_simulators():
+        p = {}
+        if isinstance(sim, simulators.NICSim):
+            if sim.network is not None:
+                p['net'] = sim.network.full_name()
+            if sim in hosts:
+                p['pci'] = hosts[sim].full_name()
+        elif isinstance(sim, simulators.SwitchNet):
+            # ports in the order they are passed on the command line
+            conns = sim.connect_sockets(env) + sim.listen_sockets(env)
+            for (i, (peer, _)) in enumerate(conns):
+                p[f'port{i}'] = peer.full_name()
+        peers[sim.full_name()] = p
+    return peers
+
+
+class SyncProfile(object):
+    """Dumps of one simulator together with when they were requested."""
+
+    def __init__(
+        self,
+        sim_name: str,
+        peers: tp.Dict[str, str],
+        sync_period: int,
+        times: tp.List[float],
+        lines: tp.Iterable[str]
+    ) -> None:
+        self.sim_name = sim_name
+        self.peers = peers
+        """Full simulator names by peer label."""
+        self.sync_period = sync_period
+        """Synchronization period in picoseconds."""
+        lines = list(lines)
+        dumps = parse_dumps(lines)
+        self.counters = parse_counters(lines)
+        """Poll and sync counters printed on exit, if any."""
+        # the last signal may arrive after the simulator stopped printing
+        n = min(len(times), len(dumps))
+        self.times = times[:n]
+        """Wall clock time of each dump in seconds."""
+        self.dumps = dumps[:n]
+
+    def peer_name(self, label: str) -> str:
+        return self.peers.get(label, label)
+
+    def blocked_on(self, dump: SyncDump) -> tp.List[str]:
+        """
+        Peers the simulator is waiting for in `dump`.
+
+        A simulator can only advance up to the `in_timestamp` of its peers, so
+        the ones whose timestamp it already reached are holding it back.
+        """
+        return [p for (p, ts) in dump.in_ts.items() if ts <= dump.main_time]
+
+    def series(self) -> tp.Dict[str, tp.Any]:
+        """
+        Per-interval time series: wall time in ms since the first dump,
+        simulated ns, and per peer the slack in ns (how far the peer's
+        timestamp is ahead of the simulator), the minimum number of messages
+        sent to it, and whether the simulator was blocked on it.
+        """
+        if len(self.dumps) < 2:
+            return {}
+        t0 = self.times[0]
+        series = {
+            't_ms': [],
+            'sim_ns': [],
+            'peers': {},
+        }
+        labels = sorted(self.dumps[-1].in_ts)
+        for p in labels:
+            series['peers'][self.peer_name(p)] = {
+                'label': p, 'slack_ns': [], 'msgs': [], 'blocked': []
+            }
+        for (prev, cur, t) in zip(self.dumps, self.dumps[1:], self.times[1:]):
+            series['t_ms'].append(round((t - t0) * 1000))
+            series['sim_ns'].append((cur.main_time - prev.main_time) // 1000)
+            blocked = self.blocked_on(cur)
+            for p in labels:
+                s = series['peers'][self.peer_name(p)]
+                in_ts = cur.in_ts.get(p, 0)
+                s['slack_ns'].append((in_ts - cur.main_time) // 1000)
+                sent = cur.out_ts.get(p, 0) - prev.out_ts.get(p, 0)
+                s['msgs'].append(max(0, sent) // self.sync_period)
+                s['blocked'].append(int(p in blocked))
+        return series
+
+    def wait_frac(self) -> tp.Optional[float]:
+        """
+        Fraction of the run the simulator was blocked on any of its peers.
+        Falls back to `poll_wait_frac()` without dumps, None if neither is
+        available.
+        """
+        series = self.series()
+        if not series or not series['peers']:
+            return poll_wait_frac(self.counters)
+        blocked = zip(*(s['blocked'] for s in series['peers'].values()))
+        n = len(series['t_ms'])
+        return sum(1 for b in blocked if any(b)) / n
+
+    def links(self) -> tp.List[tp.Dict[str, tp.Any]]:
+        """Summary for each link of this simulator over the whole run."""
+        series = self.series()
+        if not series:
+            return []
+        wall = self.times[-1] - self.times[0]
+        sim_ns = sum(series['sim_ns'])
+        links = []
+        for (peer, s) in series['peers'].items():
+            n = len(s['blocked'])
+            links.append({
+                'sim': self.sim_name,
+                'peer': peer,
+                'label': s['label'],
+                'blocked_frac': round(sum(s['blocked']) / n, 3),
+                'mean_slack_ns': round(sum(s['slack_ns']) / n),
+                'msgs_per_s': round(sum(s['msgs']) / wall, 1),
+                'sim_ns_per_s': round(sim_ns / wall),
+            })
+        return links
+
+
+def link_report(
+    profiles: tp.Iterable[SyncProfile]
+) -> tp.List[tp.Dict[str, tp.Any]]:
+    """
+    Combines the links of all simulators into a "who waits on whom" report,
+    sorted by how often the simulator was blocked on the peer.
+
+    A link is marked `mutual` if both ends spend at least a tenth of the run
+    waiting for each other. That indicates the link latency limits how far
+    the two can run ahead, so a larger `eth_latency` or `pci_latency` (or a
+    longer `sync_period` to reduce message overhead) helps. If only one side
+    waits, the peer is simply slower and changing the synchronization
+    parameters will not speed up the simulation.
+    """
+    rows = []
+    for prof in profiles:
+        rows.extend(prof.links())
+    frac = {(r['sim'], r['peer']): r['blocked_frac'] for r in rows}
+    for r in rows:
+        back = frac.get((r['peer'], r['sim']), 0)
+        r['mutual'] = r['blocked_frac'] >= 0.1 and back >= 0.1
+    rows.sort(key=lambda r: r['blocked_frac'], reverse=True)
+    return rows
+
+
+def format_report(rows: tp.List[tp.Dict[str, tp.Any]]) -> str:
+    """Formats a `link_report()` as a human-readable table."""
+    if not rows:
+        return 'no synchronization dumps found\n'
+    lines = [
+        f'{"simulator":<24} {"waits on":<24} {"blocked":>8} '
+        f'{"slack ns":>10} {"msgs/s":>10} {"sim ns/s":>10}'
+    ]
+    for r in rows:
+        lines.append(
+            f'{r["sim"]:<24} {r["peer"]:<24} '
+            f'{r["blocked_frac"] * 100:7.1f}% {r["mean_slack_ns"]:>10} '
+            f'{r["msgs_per_s"]:>10} {r["sim_ns_per_s"]:>10}' +
+            (' mutual' if r['mutual'] else '')
+        )
+    return '\n'.join(lines) + '\n'
@@ -48,14 +48,12 @@ class NetProxy(SimProxy):
         super().__init__()
         self.nics: tp.List[tp.Tuple[NICSim, bool]] = []
         """List of tuples (nic, with_listener)"""
-        self.n2ns: tp.List[tp.Tuple[tp.Tuple[Simulator, Simulator], bool]] = []
-        """List of tuples ((netL,netC), with_listener)"""
+        self.n2ns: tp.List[tp.Tuple[tp.Tuple[Simulator, Simulator, str],
+                                    bool]] = []
+        """List of tuples ((netC, netL, suffix), with_listener)"""
         self.shm_size = 2048
         """Shared memory size in GB."""
 
-    def start_delay(self) -> int:
-        return 10
-
 
 class NetProxyListener(NetProxy):
 
@@ -65,6 +63,10 @@ class NetProxyListener(NetProxy):
         self.connecter: NetProxyConnecter
         self.listen = True
 
+    def ready_output(self) -> tp.Optional[str]:
+        # printed once the proxy accepts connections from the connecter
+        return r'^Listening$'
+
     def add_nic(self, nic: NICSim) -> None:
         self.nics.append((nic, True))
 
@@ -72,8 +74,10 @@ class NetProxyListener(NetProxy):
         nic.network.extra_deps.append(self.connecter)
 
     # add net2net connection with listening network on the listener side
-    def add_n2n(self, net_c: Simulator, net_l: Simulator) -> None:
-        self.n2ns.append(((net_c, net_l), True))
+    def add_n2n(
+        self, net_c: Simulator, net_l: Simulator, suffix: str = ''
+    ) -> None:
+        self.n2ns.append(((net_c, net_l, suffix), True))
 
         # the connecting network depends on our peer
         net_c.extra_deps.append(self.connecter)
@@ -83,7 +87,7 @@ class NetProxyListener(NetProxy):
         for (nic, local) in self.nics:
             if local:
                 deps.append(nic)
-        for ((_, net_l), local) in self.n2ns:
+        for ((_, net_l, _), local) in self.n2ns:
             if local:
                 deps.append(net_l)
         return deps
@@ -94,9 +98,9 @@ class NetProxyListener(NetProxy):
         for (nic, local) in self.nics:
             if not local:
                 socks.append(env.nic_eth_path(nic))
-        for ((net_c, net_l), local) in self.n2ns:
+        for ((net_c, net_l, suffix), local) in self.n2ns:
             if not local:
-                socks.append(env.n2n_eth_path(net_l, net_c))
+                socks.append(env.n2n_eth_path(net_l, net_c, suffix))
         return []
 
     # sockets to wait for indicating the simulator is ready
@@ -106,9 +110,9 @@ class NetProxyListener(NetProxy):
         for (nic, local) in self.nics:
             if not local:
                 socks.append(env.nic_eth_path(nic))
-        for ((net_c, net_l), local) in self.n2ns:
+        for ((net_c, net_l, suffix), local) in self.n2ns:
             if not local:
-                socks.append(env.n2n_eth_path(net_l, net_c))
+                socks.append(env.n2n_eth_path(net_l, net_c, suffix))
         return socks
 
     def run_cmd_base(self, env: 'experiment_environment.ExpEnv') -> str:
@@ -118,9 +122,9 @@ class NetProxyListener(NetProxy):
             cmd += '-C ' if local else '-L '
             cmd += env.nic_eth_path(nic) + ' '
 
-        for ((net_c, net_l), local) in self.n2ns:
+        for ((net_c, net_l, suffix), local) in self.n2ns:
             cmd += '-C ' if local else '-L '
-            cmd += env.n2n_eth_path(net_l, net_c) + ' '
+            cmd += env.n2n_eth_path(net_l, net_c, suffix) + ' '
 
         cmd += f' 0.0.0.0 {self.port}'
         return cmd
@@ -135,6 +139,11 @@ class NetProxyConnecter(NetProxy):
         self.nics = listener.nics
         self.n2ns = listener.n2ns
 
+    def ready_output(self) -> tp.Optional[str]:
+        # printed once connected to the listener, before connecting to the
+        # local simulators, some of which depend on us
+        return r'^(Socket|RDMA) connected$'
+
     def add_nic(self, nic: NICSim) -> None:
         self.nics.append((nic, False))
 
@@ -142,8 +151,10 @@ class NetProxyConnecter(NetProxy):
         nic.network.extra_deps.append(self.listener)
 
     # add net2net connection with listening network on the connection side
-    def add_n2n(self, net_c: Simulator, net_l: Simulator) -> None:
-        self.n2ns.append(((net_c, net_l), False))
+    def add_n2n(
+        self, net_c: Simulator, net_l: Simulator, suffix: str = ''
+    ) -> None:
+        self.n2ns.append(((net_c, net_l, suffix), False))
         # the connecting network depends on our peer
         net_c.extra_deps.append(self.listener)
 
@@ -152,7 +163,7 @@ class NetProxyConnecter(NetProxy):
         for (nic, local) in self.nics:
             if not local:
                 deps.append(nic)
-        for ((_, net_l), local) in self.n2ns:
+        for ((_, net_l, _), local) in self.n2ns:
             if not local:
                 deps.append(net_l)
         return deps
@@ -163,9 +174,9 @@ class NetProxyConnecter(NetProxy):
         for (nic, local) in self.nics:
             if local:
                 socks.append(env.nic_eth_path(nic))
-        for ((net_c, net_l), local) in self.n2ns:
+        for ((net_c, net_l, suffix), local) in self.n2ns:
             if local:
-                socks.append(env.n2n_eth_path(net_l, net_c))
+                socks.append(env.n2n_eth_path(net_l, net_c, suffix))
         return []
 
     # sockets to wait for indicating the simulator is ready
@@ -175,9 +186,9 @@ class NetProxyConnecter(NetProxy):
         for (nic, local) in self.nics:
             if local:
                 socks.append(env.nic_eth_path(nic))
-        for ((net_c, net_l), local) in self.n2ns:
+        for ((net_c, net_l, suffix), local) in self.n2ns:
             if local:
-                socks.append(env.n2n_eth_path(net_l, net_c))
+                socks.append(env.n2n_eth_path(net_l, net_c, suffix))
         return socks
 
     def run_cmd_base(self, env: 'experiment_environment.ExpEnv') -> str:
@@ -187,9 +198,9 @@ class NetProxyConnecter(NetProxy):
             cmd += '-L ' if local else '-C '
             cmd += env.nic_eth_path(nic) + ' '
 
-        for ((net_c, net_l), local) in self.n2ns:
+        for ((net_c, net_l, suffix), local) in self.n2ns:
             cmd += '-L ' if local else '-C '
-            cmd += env.n2n_eth_path(net_l, net_c) + ' '
+            cmd += env.n2n_eth_path(net_l, net_c, suffix) + ' '
 
         cmd += f' {self.listener.ip} {self.listener.port}'
         return cmd
@@ -0,0 +1,238 @@
+# Copyright 2024 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Measured resource requirements of simulators."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import math
+import os
+import typing as tp
+
+if tp.TYPE_CHECKING:  # prevent cyclic import
+    from simbricks.orchestration.simulators import Simulator
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+CLK_TCK = os.sysconf('SC_CLK_TCK')
+
+
+def proc_tree(pid: int) -> tp.List[int]:
+    """Returns `pid` and all its live descendants."""
+    pids = [pid]
+    i = 0
+    while i < len(pids):
+        try:
+            for task in os.listdir(f'/proc/{pids[i]}/task'):
+                path = f'/proc/{pids[i]}/task/{task}/children'
+                with open(path, 'r', encoding='utf-8') as f:
+                    pids += map(int, f.read().split())
+        except OSError:
+            # exited in the meantime
+            pass
+        i += 1
+    return pids
+
+
+def read_stat(pid: int) -> tp.Optional[tp.List[str]]:
+    """Fields of `/proc/<pid>/stat` after the command name."""
+    try:
+        with open(f'/proc/{pid}/stat', 'r', encoding='utf-8') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # command name is in parentheses and may contain spaces
+    return stat[stat.rfind(')') + 2:].split()
+
+
+def read_status(pid: int, key: str) -> tp.Optional[int]:
+    """Value of a `kB` entry in `/proc/<pid>/status` in bytes."""
+    try:
+        with open(f'/proc/{pid}/status', 'r', encoding='utf-8') as f:
+            for l in f:
+                if l.startswith(key + ':'):
+                    return int(l.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+class ResourceUsage(object):
+    """Resources a simulator used during a run."""
+
+    def __init__(self, peak_rss: int, cpu_util: float) -> None:
+        self.peak_rss = peak_rss
+        """Peak resident memory of all of the simulator's processes in bytes."""
+        self.cpu_util = cpu_util
+        """Average number of CPUs busy."""
+
+
+class ResourceMonitor(object):
+    """Periodically samples memory and CPU usage of simulator processes."""
+
+    def __init__(self, interval: float = 1.0) -> None:
+        self.interval = interval
+        """Seconds between samples."""
+        self.pids: tp.Dict[Simulator, int] = {}
+        self._peak_rss: tp.Dict[Simulator, int] = {}
+        # time and CPU time of the first and the last sample
+        self._cpu: tp.Dict[Simulator, tp.Tuple[float, ...]] = {}
+
+    def add(self, sim: Simulator, pid: int) -> None:
+        self.pids[sim] = pid
+        self._peak_rss[sim] = 0
+        self.sample_sim(sim)
+
+    @staticmethod
+    def cpu_time(pid: int, tree: tp.List[int]) -> float:
+        """CPU seconds used by `pid`, its live and its reaped descendants."""
+        ticks = 0
+        for p in tree:
+            stat = read_stat(p)
+            if stat is None:
+                continue
+            # utime and stime, for the root also cutime and cstime
+            fields = stat[11:15] if p == pid else stat[11:13]
+            ticks += sum(map(int, fields))
+        return ticks / CLK_TCK
+
+    def sample_sim(self, sim: Simulator) -> None:
+        pid = self.pids[sim]
+        tree = proc_tree(pid)
+        rss = 0
+        for p in tree:
+            stat = read_stat(p)
+            if stat is not None:
+                rss += int(stat[21]) * PAGE_SIZE
+        # catches spikes of the main process between samples
+        hwm = read_status(pid, 'VmHWM') or 0
+        self._peak_rss[sim] = max(self._peak_rss[sim], rss, hwm)
+
+        now = asyncio.get_running_loop().time()
+        cpu = self.cpu_time(pid, tree)
+        if sim not in self._cpu:
+            self._cpu[sim] = (now, cpu, now, cpu)
+        elif cpu > 0:
+            # process has exited once this drops to 0
+            t0, c0, _, _ = self._cpu[sim]
+            self._cpu[sim] = (t0, c0, now, cpu)
+
+    def sample(self) -> None:
+        for sim in self.pids:
+            self.sample_sim(sim)
+
+    async def run(self) -> None:
+        """Samples until cancelled."""
+        while True:
+            await asyncio.sleep(self.interval)
+            self.sample()
+
+    def usage(self) -> tp.Dict[Simulator, ResourceUsage]:
+        result = {}
+        for sim in self.pids:
+            t0, c0, t1, c1 = self._cpu[sim]
+            util = (c1 - c0) / (t1 - t0) if t1 > t0 else 0.0
+            result[sim] = ResourceUsage(self._peak_rss[sim], util)
+        return result
+
+
+class ResourceDB(object):
+    """
+    Resource usage measured in previous runs, persisted as JSON.
+
+    Simulators are identified by `Simulator.resource_key()`, so measurements
+    carry over between simulators of the same kind and configuration.
+    """
+
+    def __init__(self, path: tp.Optional[str] = None, keep=10) -> None:
+        self.path = path
+        self.keep = keep
+        """Number of most recent measurements to keep per key."""
+        self.mem_margin = 1.25
+        """Factor applied to the largest measured peak memory."""
+        self.cpu_margin = 1.2
+        """
+        Factor applied to the largest measured CPU utilization before rounding
+        it to the nearest number of cores.
+        """
+        self.entries: tp.Dict[str, tp.List[tp.List[float]]] = {}
+        """Peak RSS in MB and CPU utilization by simulator key."""
+
+        if path is not None and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+
+    def record(self, sim: Simulator, usage: ResourceUsage) -> None:
+        es = self.entries.setdefault(sim.resource_key(), [])
+        es.append([usage.peak_rss / (1024 * 1024), usage.cpu_util])
+        del es[:-self.keep]
+
+    def mem(self, sim: Simulator) -> tp.Optional[int]:
+        """Estimated memory required by `sim` in MB, None if unknown."""
+        es = self.entries.get(sim.resource_key())
+        if not es:
+            return None
+        return math.ceil(max(e[0] for e in es) * self.mem_margin)
+
+    def cores(self, sim: Simulator) -> tp.Optional[int]:
+        """Estimated number of cores required by `sim`, None if unknown."""
+        es = self.entries.get(sim.resource_key())
+        if not es:
+            return None
+        util = max(e[1] for e in es) * self.cpu_margin
+        return max(1, math.floor(util + 0.5))
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, indent=4)
+        os.replace(tmp, self.path)
+
+
+_learned: tp.Optional[ResourceDB] = None
+
+
+def use_learned(db: tp.Optional[ResourceDB]) -> None:
+    """Base resource requirements on measurements in `db` where available."""
+    global _learned  # pylint: disable=global-statement
+    _learned = db
+
+
+def resreq_mem(sim: Simulator) -> int:
+    """Memory in MB to reserve for `sim`."""
+    if _learned is not None:
+        mem = _learned.mem(sim)
+        if mem is not None:
+            return mem
+    return sim.resreq_mem()
+
+
+def resreq_cores(sim: Simulator) -> int:
+    """Number of cores to reserve for `sim`."""
+    if _learned is not None:
+        cores = _learned.cores(sim)
+        if cores is not None:
+            return cores
+    return sim.resreq_cores()
@@ -23,19 +23,27 @@
 import asyncio
 import itertools
 import shlex
+import signal
+import time
 import traceback
 import typing as tp
 from abc import ABC, abstractmethod
 
+from simbricks.orchestration import (
+    checkpoints, diskimages, profiling, resources
+)
 from simbricks.orchestration.exectools import (
-    Component, Executor, SimpleComponent
+    Component, Executor, FileLogSink, LocalExecutor, SimpleComponent
 )
 from simbricks.orchestration.experiment.experiment_environment import ExpEnv
 from simbricks.orchestration.experiment.experiment_output import ExpOutput
 from simbricks.orchestration.experiments import (
     DistributedExperiment, Experiment
 )
+from simbricks.orchestration.placement import SimPlacement
+from simbricks.orchestration.resources import ResourceMonitor
 from simbricks.orchestration.simulators import Simulator
+from simbricks.orchestration.telemetry import TelemetrySampler
 from simbricks.orchestration.utils import graphlib
 
 
@@ -46,10 +54,29 @@ class ExperimentBaseRunner(ABC):
         self.env = env
         self.verbose = verbose
         self.profile_int: tp.Optional[int] = None
+        self.profile_times: tp.Dict[str, tp.List[float]] = {}
+        """Wall clock times SIGUSR1 was sent to each simulator."""
         self.out = ExpOutput(exp)
         self.running: tp.List[tp.Tuple[Simulator, SimpleComponent]] = []
         self.sockets: tp.List[tp.Tuple[Executor, str]] = []
         self.wait_sims: tp.List[Component] = []
+        self.placement: tp.Dict[Simulator, SimPlacement] = {}
+        """CPUs and NUMA nodes to run simulators on, unpinned if missing."""
+        self.resource_monitor: tp.Optional[ResourceMonitor] = None
+        """Samples resource usage of simulators running on this host if set."""
+        self.telemetry_int: tp.Optional[float] = None
+        """
+        Seconds between telemetry samples of simulators running on this host,
+        which are added to the output. Disabled if None.
+        """
+        self.telemetry: tp.Optional[TelemetrySampler] = None
+        self.term_grace: float = 5
+        """
+        Seconds simulators get to exit after being interrupted on shutdown,
+        and again after being terminated, before being killed.
+        """
+        self.disk_pool: tp.Optional[diskimages.DiskImagePool] = None
+        """Pre-created disk images to use instead of creating them if set."""
 
     @abstractmethod
     def sim_executor(self, sim: Simulator) -> Executor:
@@ -80,11 +107,31 @@ class ExperimentBaseRunner(ABC):
 
         # run simulator
         executor = self.sim_executor(sim)
+        cmd_parts = shlex.split(run_cmd)
+        if sim in self.placement:
+            cmd_parts = self.placement[sim].wrap(cmd_parts)
         sc = executor.create_component(
-            name, shlex.split(run_cmd), verbose=self.verbose, canfail=True
+            name,
+            cmd_parts,
+            verbose=self.verbose,
+            canfail=True,
+            process_group=True,
+            stdout_sink=FileLogSink(self.env.sim_log_path(sim, 'stdout')),
+            stderr_sink=FileLogSink(self.env.sim_log_path(sim, 'stderr'))
         )
+        ready_output = sim.ready_output()
+        probes = []
+        if ready_output is not None:
+            # register before starting so no output is missed
+            probes.append(sc.expect_line(ready_output))
         await sc.start()
         self.running.append((sim, sc))
+        pid = sc.local_pid()
+        if pid is not None:
+            if self.resource_monitor is not None:
+                self.resource_monitor.add(sim, pid)
+            if self.telemetry is not None:
+                self.telemetry.add(name, pid, resources.resreq_cores(sim))
 
         # add sockets for cleanup
         for s in sim.sockets_cleanup(self.env):
@@ -95,8 +142,11 @@ class ExperimentBaseRunner(ABC):
         if wait_socks:
             if self.verbose:
                 print(f'{self.exp.name}: waiting for sockets {name}')
-
-            await executor.await_files(wait_socks, verbose=self.verbose)
+            probes.append(
+                executor.await_files(wait_socks, verbose=self.verbose)
+            )
+        if probes:
+            await self.await_ready(name, sc, probes)
 
         # add time delay if required
         delay = sim.start_delay()
@@ -109,6 +159,57 @@ class ExperimentBaseRunner(ABC):
         if self.verbose:
             print(f'{self.exp.name}: started {name}')
 
+    async def await_ready(
+        self, name: str, sc: Component, probes: tp.List[tp.Awaitable]
+    ) -> None:
+        """Waits for all readiness probes of a simulator, failing early if
+        it terminates in the meantime."""
+        ready = asyncio.ensure_future(asyncio.gather(*probes))
+        term = asyncio.ensure_future(sc.wait())
+        try:
+            await asyncio.wait((ready, term),
+                               return_when=asyncio.FIRST_COMPLETED)
+            if not ready.done():
+                raise RuntimeError(f'{name} terminated before becoming ready')
+            ready.result()
+        finally:
+            ready.cancel()
+            # only cancels waiting, the component keeps running
+            term.cancel()
+
+    async def start_after(
+        self, sim: Simulator, deps: tp.List[asyncio.Task]
+    ) -> None:
+        """Starts `sim` as soon as all simulators it depends on are ready."""
+        if deps:
+            await asyncio.gather(*deps)
+        await self.start_sim(sim)
+
+    def create_disk_image(self, base: str, path: str) -> None:
+        if self.disk_pool is not None:
+            self.disk_pool.take(base, path)
+        else:
+            diskimages.create(base, path)
+
+    def checkpoints_local(self) -> bool:
+        """Whether checkpoints are on the local file system, so they can be
+        recorded and validated here."""
+        return True
+
+    def check_checkpoint(self) -> None:
+        """Fails before any simulator is started if the checkpoint to restore
+        from is incomplete or was created for a different configuration."""
+        if not self.env.restore_cp or not self.checkpoints_local():
+            return
+        problem = checkpoints.validate(
+            self.env.cpdir, self.exp.checkpoint_key(self.env)
+        )
+        if problem is not None:
+            raise RuntimeError(
+                f'cannot restore checkpoint in {self.env.cpdir}: {problem}'
+            )
+        checkpoints.touch(self.env.cpdir)
+
     async def before_wait(self) -> None:
         pass
 
@@ -119,17 +220,41 @@ class ExperimentBaseRunner(ABC):
         pass
 
     async def prepare(self) -> None:
-        # generate config tars
-        copies = []
+        # generate config tars and disk images in worker threads, off the
+        # event loop
+        loop = asyncio.get_running_loop()
+        copies: tp.Dict[Executor, tp.List[str]] = {}
+        files = []
         for host in self.exp.hosts:
             path = self.env.cfgtar_path(host)
             if self.verbose:
                 print('preparing config tar:', path)
-            host.node_config.make_tar(self.env, path)
+            files.append(
+                loop.run_in_executor(
+                    None, host.node_config.make_tar, self.env, path
+                )
+            )
             executor = self.sim_executor(host)
-            task = asyncio.create_task(executor.send_file(path, self.verbose))
-            copies.append(task)
-        await asyncio.gather(*copies)
+            copies.setdefault(executor, []).append(path)
+        for sim in self.exp.all_simulators():
+            for (base, path) in sim.disk_images(self.env):
+                if self.verbose:
+                    print('preparing disk image:', path)
+                files.append(
+                    loop.run_in_executor(
+                        None, self.create_disk_image, base, path
+                    )
+                )
+                executor = self.sim_executor(sim)
+                copies.setdefault(executor, []).append(path)
+        await asyncio.gather(*files)
+        # send all files for one executor in one batch
+        await asyncio.gather(
+            *[
+                executor.send_files(paths, self.verbose)
+                for executor, paths in copies.items()
+            ]
+        )
 
         # prepare all simulators in parallel
         sims = []
@@ -159,58 +284,192 @@ class ExperimentBaseRunner(ABC):
 
         await self.before_cleanup()
 
-        # "interrupt, terminate, kill" all processes
-        scs = []
-        for _, sc in self.running:
-            scs.append(asyncio.create_task(sc.int_term_kill()))
-        await asyncio.gather(*scs)
+        shutdown = await self.stop_sims()
 
-        # wait for all processes to terminate
-        for _, sc in self.running:
-            await sc.wait()
+        # hosts exit on their own once the checkpoint is written
+        if (
+            self.env.create_cp and self.out.success and
+            self.checkpoints_local() and
+            all(sc.returncode() == 0 for sc in self.wait_sims)
+        ):
+            if checkpoints.record(self.exp, self.env) is None:
+                print(f'{self.exp.name}: a host did not write its checkpoint')
+                self.out.set_failed()
 
-        # remove all sockets
-        scs = []
+        # remove all sockets, in one go per executor
+        socks: tp.Dict[Executor, tp.List[str]] = {}
         for (executor, sock) in self.sockets:
-            scs.append(asyncio.create_task(executor.rmtree(sock)))
-        if scs:
-            await asyncio.gather(*scs)
+            socks.setdefault(executor, []).append(sock)
+        await asyncio.gather(*[e.rmtrees(ss) for (e, ss) in socks.items()])
 
         # add all simulator components to the output
         for sim, sc in self.running:
             self.out.add_sim(sim, sc)
+        for (name, (secs, sig)) in shutdown.items():
+            self.out.add_shutdown(name, secs, sig)
+        if self.verbose:
+            slow = sorted(shutdown.items(), key=lambda i: i[1][0], reverse=True)
+            for (name, (secs, sig)) in slow[:5]:
+                if secs >= 1:
+                    print(
+                        f'{self.exp.name}: {name} took {secs:.1f}s to exit '
+                        f'after {sig}'
+                    )
+        waits = self.collect_profiles() if self.profile_int else {}
+        if self.telemetry is not None:
+            for sim, sc in self.running:
+                name = sim.full_name()
+                st = self.telemetry.sims.get(name)
+                if st is None:
+                    continue
+                if name not in waits:
+                    lines = itertools.chain(
+                        sc.stdout.lines(), sc.stderr.lines()
+                    )
+                    waits[name] = profiling.poll_wait_frac(
+                        profiling.parse_counters(lines)
+                    )
+                summary = st.summary(waits[name])
+                self.out.add_telemetry(name, st.series(), summary)
+                if self.verbose and summary:
+                    print(
+                        f'{self.exp.name}: {name} {summary["state"]}, '
+                        f'cpu {summary["cpu_util"]:.2f}, '
+                        f'{summary["vcsw_per_s"]:.0f} blocking waits/s'
+                    )
 
         await self.after_cleanup()
         return self.out
 
+    async def stop_sims(self) -> tp.Dict[str, tp.Tuple[float, str]]:
+        """
+        Stops all simulators at once.
+
+        All simulators still running are interrupted together. Those still
+        running when the shared grace period of `term_grace` seconds runs out
+        are terminated, and killed after another grace period. Signals are
+        sent in one batch per executor.
+
+        Returns how many seconds each simulator took to exit and the last
+        signal it was sent.
+        """
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        exited: tp.Dict[str, float] = {}
+        waits: tp.Dict[asyncio.Future, tp.Tuple[Simulator, Component]] = {}
+        shutdown: tp.Dict[str, tp.Tuple[float, str]] = {}
+        for sim, sc in self.running:
+            name = sim.full_name()
+            if not sc.running():
+                shutdown[name] = (0.0, 'none')
+            fut = asyncio.ensure_future(sc.wait())
+            fut.add_done_callback(
+                lambda _, n=name: exited.setdefault(n, loop.time())
+            )
+            waits[fut] = (sim, sc)
+
+        pending = {
+            f for f, (sim, _) in waits.items()
+            if sim.full_name() not in shutdown
+        }
+        for sig in (signal.SIGINT, signal.SIGTERM, signal.SIGKILL):
+            if not pending:
+                break
+            comps: tp.Dict[Executor, tp.List[Component]] = {}
+            for f in pending:
+                (sim, sc) = waits[f]
+                comps.setdefault(self.sim_executor(sim), []).append(sc)
+                shutdown[sim.full_name()] = (0.0, sig.name)
+            if self.verbose and sig != signal.SIGINT:
+                print(
+                    f'{self.exp.name}: sending {sig.name} to '
+                    f'{len(pending)} simulators',
+                    flush=True
+                )
+            await asyncio.gather(
+                *[e.signal_components(cs, sig) for (e, cs) in comps.items()]
+            )
+            timeout = None if sig == signal.SIGKILL else self.term_grace
+            (_, pending) = await asyncio.wait(pending, timeout=timeout)
+
+        for (f, (sim, _)) in waits.items():
+            # wait for output to be collected, also for exited simulators
+            await f
+            name = sim.full_name()
+            if shutdown[name][1] != 'none':
+                shutdown[name] = (
+                    round(exited[name] - start, 3), shutdown[name][1]
+                )
+        return shutdown
+
     async def profiler(self):
         assert self.profile_int
         while True:
             await asyncio.sleep(self.profile_int)
-            for (_, sc) in self.running:
+            for (sim, sc) in self.running:
+                self.profile_times.setdefault(sim.full_name(),
+                                              []).append(time.time())
                 await sc.sigusr1()
 
+    def collect_profiles(self) -> tp.Dict[str, tp.Optional[float]]:
+        """Parses the simulators' SIGUSR1 dumps and adds the synchronization
+        time series and the per-link report to the output. Returns the
+        fraction of the run each simulator spent waiting on its peers."""
+        peers = profiling.sim_peers(self.exp, self.env)
+        profiles = []
+        waits = {}
+        for sim, sc in self.running:
+            name = sim.full_name()
+            lines = itertools.chain(sc.stdout.lines(), sc.stderr.lines())
+            prof = profiling.SyncProfile(
+                name,
+                peers.get(name, {}),
+                getattr(sim, 'sync_period', 500) * 1000,
+                self.profile_times.get(name, []),
+                lines
+            )
+            self.out.add_sync_profile(name, prof.series(), prof.counters)
+            profiles.append(prof)
+            waits[name] = prof.wait_frac()
+        self.out.sync_report = profiling.link_report(profiles)
+        if self.verbose:
+            print(
+                f'{self.exp.name}: synchronization report\n' +
+                profiling.format_report(self.out.sync_report),
+                end=''
+            )
+        return waits
+
     async def run(self) -> ExpOutput:
         profiler_task = None
+        monitor_task = None
+        telemetry_task = None
 
         try:
+            if self.resource_monitor is not None:
+                monitor_task = asyncio.create_task(self.resource_monitor.run())
+            if self.telemetry_int:
+                self.telemetry = TelemetrySampler(self.telemetry_int)
+                telemetry_task = asyncio.create_task(self.telemetry.run())
             self.out.set_start()
+            self.check_checkpoint()
             graph = self.sim_graph()
-            ts = graphlib.TopologicalSorter(graph)
-            ts.prepare()
-            while ts.is_active():
-                # start ready simulators in parallel
-                starting = []
-                sims = []
-                for sim in ts.get_ready():
-                    starting.append(asyncio.create_task(self.start_sim(sim)))
-                    sims.append(sim)
-
-                # wait for starts to complete
-                await asyncio.gather(*starting)
-
-                for sim in sims:
-                    ts.done(sim)
+            self.out.sim_graph = {
+                s.full_name(): sorted(d.full_name() for d in deps)
+                for (s, deps) in graph.items()
+            }
+            # Start every simulator as soon as its own dependencies are
+            # ready instead of in waves. Tasks are created in topological
+            # order, so dependencies always have a task already.
+            starts: tp.Dict[Simulator, asyncio.Task] = {}
+            for sim in graphlib.TopologicalSorter(graph).static_order():
+                deps = [starts[d] for d in graph.get(sim, ())]
+                starts[sim] = asyncio.create_task(self.start_after(sim, deps))
+            try:
+                await asyncio.gather(*starts.values())
+            finally:
+                for t in starts.values():
+                    t.cancel()
 
             if self.profile_int:
                 profiler_task = asyncio.create_task(self.profiler())
@@ -229,6 +488,13 @@ class ExperimentBaseRunner(ABC):
                 profiler_task.cancel()
             except asyncio.CancelledError:
                 pass
+        if monitor_task:
+            monitor_task.cancel()
+            # last sample before simulators get terminated
+            self.resource_monitor.sample()
+        if telemetry_task:
+            telemetry_task.cancel()
+            self.telemetry.sample()
         # The bare except above guarantees that we always execute the following
         # code, which terminates all simulators and produces a proper output
         # file.
@@ -254,6 +520,9 @@ class ExperimentSimpleRunner(ExperimentBaseRunner):
     def sim_executor(self, sim: Simulator) -> Executor:
         return self.executor
 
+    def checkpoints_local(self) -> bool:
+        return isinstance(self.executor, LocalExecutor)
+
 
 class ExperimentDistributedRunner(ExperimentBaseRunner):
     """Simple experiment runner with just one executor."""
@@ -270,6 +539,10 @@ class ExperimentDistributedRunner(ExperimentBaseRunner):
         h_id = self.exp.host_mapping[sim]
         return self.execs[h_id]
 
+    def checkpoints_local(self) -> bool:
+        # checkpoints are written by the executors each host runs on
+        return False
+
     async def prepare(self) -> None:
         # make sure all simulators are assigned to an executor
         assert self.exp.all_sims_assigned()
@@ -22,9 +22,10 @@
 
 from simbricks.orchestration.runtime.common import Run, Runtime
 from simbricks.orchestration.runtime.distributed import (
-    DistributedSimpleRuntime, auto_dist
+    DistributedParallelRuntime, DistributedSimpleRuntime, auto_dist
 )
 from simbricks.orchestration.runtime.local import (
     LocalParallelRuntime, LocalSimpleRuntime
 )
+from simbricks.orchestration.runtime.scheduling import RunHistory, RunScheduler
 from simbricks.orchestration.runtime.slurm import SlurmRuntime
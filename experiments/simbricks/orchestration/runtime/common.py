@@ -23,6 +23,7 @@
 # Allow own class to be used as type for a method's argument
 from __future__ import annotations
 
+import asyncio
 import pathlib
 import shutil
 import typing as tp
@@ -58,14 +59,15 @@ class Run(object):
         return self.experiment.name + '.' + str(self.index)
 
     async def prep_dirs(self, executor=LocalExecutor()) -> None:
-        shutil.rmtree(self.env.workdir, ignore_errors=True)
-        await executor.rmtree(self.env.workdir)
-        shutil.rmtree(self.env.shm_base, ignore_errors=True)
-        await executor.rmtree(self.env.shm_base)
-
+        # removing a previous run's directories can take a while, so do it
+        # in a worker thread to not block other runs
+        loop = asyncio.get_running_loop()
+        dirs = [self.env.workdir, self.env.shm_base]
         if self.env.create_cp:
-            shutil.rmtree(self.env.cpdir, ignore_errors=True)
-            await executor.rmtree(self.env.cpdir)
+            dirs.append(self.env.cpdir)
+        for d in dirs:
+            await loop.run_in_executor(None, shutil.rmtree, d, True)
+        await executor.rmtrees(dirs)
 
         pathlib.Path(self.env.workdir).mkdir(parents=True, exist_ok=True)
         await executor.mkdir(self.env.workdir)
@@ -82,6 +84,9 @@ class Runtime(metaclass=ABCMeta):
         self._interrupted = False
         """Indicates whether interrupt has been signaled."""
         self.profile_int: tp.Optional[int] = None
+        self.telemetry_int: tp.Optional[float] = None
+        self.term_grace: float = 5
+        """Grace period in seconds for simulators to exit on shutdown."""
 
     @abstractmethod
     def add_run(self, run: Run) -> None:
@@ -112,3 +117,6 @@ class Runtime(metaclass=ABCMeta):
 
     def enable_profiler(self, profile_int: int) -> None:
         self.profile_int = profile_int
+
+    def enable_telemetry(self, telemetry_int: float) -> None:
+        self.telemetry_int = telemetry_int
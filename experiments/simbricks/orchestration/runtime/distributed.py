@@ -21,15 +21,17 @@
 # SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 import asyncio
+import math
 import typing as tp
 
-from simbricks.orchestration import proxy
+from simbricks.orchestration import partition, resources
 from simbricks.orchestration.exectools import Executor
 from simbricks.orchestration.experiments import (
     DistributedExperiment, Experiment
 )
 from simbricks.orchestration.runners import ExperimentDistributedRunner
 from simbricks.orchestration.runtime.common import Run, Runtime
+from simbricks.orchestration.simulators import Simulator
 
 
 class DistributedSimpleRuntime(Runtime):
@@ -49,9 +51,18 @@ class DistributedSimpleRuntime(Runtime):
 
         self.runnable.append(run)
 
-    async def do_run(self, run: Run) -> None:
+    async def do_run(
+        self,
+        run: Run,
+        executors: tp.Optional[tp.List[Executor]] = None
+    ) -> bool:
+        """Executes `run` with the simulators assigned to host ID `i` running
+        on `executors[i]`, by default the runtime's executors. Returns False if
+        the run was interrupted before it started."""
+        if executors is None:
+            executors = self.executors
         runner = ExperimentDistributedRunner(
-            self.executors,
+            executors,
             # we ensure the correct type in add_run()
             tp.cast(DistributedExperiment, run.experiment),
             run.env,
@@ -59,25 +70,27 @@ class DistributedSimpleRuntime(Runtime):
         )
         if self.profile_int:
             runner.profile_int = self.profile_int
+        runner.telemetry_int = self.telemetry_int
+        runner.term_grace = self.term_grace
 
         try:
-            for executor in self.executors:
+            for executor in executors:
                 await run.prep_dirs(executor)
             await runner.prepare()
         except asyncio.CancelledError:
             # it is safe to just exit here because we are not running any
             # simulators yet
-            return
+            return False
 
         run.output = await runner.run()  # already handles CancelledError
         self.complete.append(run)
 
-        # if the log is huge, this step takes some time
+        # simulator output streams were already written during the run, this
+        # only moves them next to the JSON manifest
         if self.verbose:
-            print(
-                f'Writing collected output of run {run.name()} to JSON file ...'
-            )
+            print(f'Writing collected output of run {run.name()} ...')
         run.output.dump(run.outpath)
+        return True
 
     async def start(self) -> None:
         for run in self.runnable:
@@ -92,69 +105,182 @@ class DistributedSimpleRuntime(Runtime):
             self._running.cancel()
 
 
+class DistributedParallelRuntime(DistributedSimpleRuntime):
+    """
+    Runs multiple distributed experiments concurrently, treating the executors
+    as a pool.
+
+    Each run gets its own subset of executors, disjoint from those of all other
+    runs executing at the same time, with host IDs in the experiment's
+    `host_mapping` mapped to whichever executors are free. An executor only
+    hosts a host ID whose simulators fit into its `cores` and `mem`. Runs
+    restoring a checkpoint execute on the executors that created it.
+    """
+
+    def __init__(self, executors, verbose=False) -> None:
+        super().__init__(executors, verbose)
+        self._free: tp.List[Executor] = list(executors)
+        """Executors not used by any run, in the order they were specified."""
+        self._assigned: tp.Dict[Run, tp.List[Executor]] = {}
+        """Executors for each host ID of started runs."""
+        self._finished: tp.Set[Run] = set()
+        self._pending_jobs: tp.Dict[asyncio.Task, Run] = {}
+        self._starter_task: asyncio.Task
+
+    def add_run(self, run: Run) -> None:
+        if (
+            isinstance(run.experiment, DistributedExperiment) and
+            run.prereq is None and self.assign(run, self.executors) is None
+        ):
+            raise RuntimeError('Not enough executors available for run')
+        super().add_run(run)
+
+    @staticmethod
+    def host_demand(exp: DistributedExperiment) -> tp.List[tp.Tuple[int, int]]:
+        """Cores and memory required by the simulators of each host ID."""
+        demand = [(0, 0)] * exp.num_hosts
+        for sim, h in exp.host_mapping.items():
+            (cores, mem) = demand[h]
+            demand[h] = (
+                cores + resources.resreq_cores(sim),
+                mem + resources.resreq_mem(sim)
+            )
+        return demand
+
+    @staticmethod
+    def fits(executor: Executor, cores: int, mem: int) -> bool:
+        if executor.cores is not None and cores > executor.cores:
+            return False
+        return executor.mem is None or mem <= executor.mem
+
+    def assign(self, run: Run,
+               free: tp.List[Executor]) -> tp.Optional[tp.List[Executor]]:
+        """
+        Picks an executor from `free` for each host ID of `run`, or returns
+        None if they do not fit.
+
+        Host IDs with the largest requirements are placed first, each on the
+        smallest executor it fits on, to leave large executors for runs that
+        need them.
+        """
+        if run.prereq is not None and run.prereq in self._assigned:
+            # the checkpoint is only available where it was created
+            executors = self._assigned[run.prereq]
+            if all(e in free for e in executors):
+                return executors
+            return None
+
+        exp = tp.cast(DistributedExperiment, run.experiment)
+        demand = self.host_demand(exp)
+        free = list(free)
+        executors: tp.List[tp.Optional[Executor]] = [None] * exp.num_hosts
+        order = sorted(
+            range(exp.num_hosts), key=lambda h: demand[h], reverse=True
+        )
+        for h in order:
+            candidates = [e for e in free if self.fits(e, *demand[h])]
+            if not candidates:
+                return None
+            e = min(
+                candidates,
+                key=lambda e: (
+                    math.inf if e.cores is None else e.cores, math.inf
+                    if e.mem is None else e.mem
+                )
+            )
+            free.remove(e)
+            executors[h] = e
+        return tp.cast(tp.List[Executor], executors)
+
+    def _prereq_pending(self, run: Run) -> bool:
+        return (
+            run.prereq is not None and run.prereq in self.runnable and
+            run.prereq not in self._finished
+        )
+
+    def schedule(self, waiting: tp.List[Run]) -> None:
+        """Starts all waiting runs that executors are free for, in order."""
+        for run in list(waiting):
+            if self._prereq_pending(run):
+                continue
+            if run.prereq in self._finished and run.prereq not in self.complete:
+                print(
+                    f'skipping run {run.name()}, prerequisite did not complete'
+                )
+                waiting.remove(run)
+                continue
+
+            executors = self.assign(run, self._free)
+            if executors is None:
+                continue
+            waiting.remove(run)
+            for e in executors:
+                self._free.remove(e)
+            self._assigned[run] = executors
+
+            print('starting run ', run.name())
+            job = asyncio.create_task(self.do_run(run, executors))
+            self._pending_jobs[job] = run
+
+    async def do_start(self) -> None:
+        # runs creating checkpoints first, as others wait for them
+        waiting = sorted(self.runnable, key=lambda r: not r.env.create_cp)
+        while True:
+            self.schedule(waiting)
+            if not self._pending_jobs:
+                break
+
+            done, _ = await asyncio.wait(
+                self._pending_jobs, return_when=asyncio.FIRST_COMPLETED
+            )
+            for job in done:
+                run = self._pending_jobs.pop(job)
+                self._finished.add(run)
+                # return executors in their original order
+                self._free = [
+                    e for e in self.executors
+                    if e in self._free or e in self._assigned[run]
+                ]
+                if await job:
+                    print('finished run ', run.name())
+
+        for run in waiting:
+            print(f'skipping run {run.name()}, no executors available')
+
+    async def start(self) -> None:
+        self._starter_task = asyncio.create_task(self.do_start())
+        try:
+            await self._starter_task
+        except asyncio.CancelledError:
+            for job in self._pending_jobs:
+                job.cancel()
+            # wait for all runs to finish
+            await asyncio.gather(*self._pending_jobs)
+
+    def interrupt_handler(self) -> None:
+        self._starter_task.cancel()
+
+
 def auto_dist(
     e: Experiment,
     execs: tp.List[Executor],
-    proxy_type: str = 'sockets'
+    proxy_type: str = 'sockets',
+    weights: tp.Optional[tp.Dict[Simulator, float]] = None
 ) -> DistributedExperiment:
     """
-    Converts an Experiment into a DistributedExperiment.
+    Converts an Experiment into a DistributedExperiment across all `execs`.
 
-    Assigns network to executor zero, and then round-robin assignment of hosts
-    to executors, while also assigning all nics for a host to the same executor.
+    Simulators are partitioned to minimize the links between executors while
+    balancing their CPU `weights` (by default the cores they require) in
+    proportion to the executors' cores, see `partition.distribute()`.
     """
 
     if len(execs) < 2:
         raise RuntimeError('auto_dist needs at least two hosts')
-    elif len(execs) > 2:
-        print('Warning: currently auto_dist only uses the first two hosts')
-
-    if proxy_type == 'sockets':
-        proxy_listener_c = proxy.SocketsNetProxyListener
-        proxy_connecter_c = proxy.SocketsNetProxyConnecter
-    elif proxy_type == 'rdma':
-        proxy_listener_c = proxy.RDMANetProxyListener
-        proxy_connecter_c = proxy.RDMANetProxyConnecter
-    else:
-        raise RuntimeError('Unknown proxy type specified')
-
-    # Create the distributed experiment
-    de = DistributedExperiment(e.name, 2)
-    de.timeout = e.timeout
-    de.checkpoint = e.checkpoint
-    de.no_simbricks = e.no_simbricks
-    de.metadata = e.metadata.copy()
-
-    # create listening proxy on host 0
-    lp = proxy_listener_c()
-    lp.name = 'listener'
-    de.add_proxy(lp)
-    de.assign_sim_host(lp, 0)
-
-    # assign networks to first host
-    for net in e.networks:
-        de.add_network(net)
-        de.assign_sim_host(net, 0)
-
-    # create connecting proxy on host 1
-    cp = proxy_connecter_c(lp)
-    cp.name = 'connecter'
-    de.add_proxy(cp)
-    de.assign_sim_host(cp, 1)
-
-    # round-robin assignment for hosts
-    k = 0
-    for h in e.hosts:
-        de.add_host(h)
-        de.assign_sim_host(h, k)
-        for nic in h.nics:
-            de.assign_sim_host(nic, k)
-
-            if k != 0:
-                cp.add_nic(nic)
-        k = (k + 1) % 2
-
-    for nic in e.nics:
-        de.add_nic(nic)
-
-    return de
+
+    capacities = None
+    if all(ex.cores is not None for ex in execs):
+        capacities = [float(ex.cores) for ex in execs]
+    return partition.distribute(
+        e, len(execs), proxy_type, weights=weights, capacities=capacities
+    )
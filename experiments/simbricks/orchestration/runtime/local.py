@@ -21,11 +21,16 @@
 # SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 import asyncio
+import time
 import typing as tp
 
 from simbricks.orchestration import exectools
+from simbricks.orchestration.diskimages import DiskImagePool
+from simbricks.orchestration.placement import CpuAllocator
+from simbricks.orchestration.resources import ResourceDB, ResourceMonitor
 from simbricks.orchestration.runners import ExperimentSimpleRunner
 from simbricks.orchestration.runtime.common import Run, Runtime
+from simbricks.orchestration.runtime.scheduling import RunHistory, RunScheduler
 
 
 class LocalSimpleRuntime(Runtime):
@@ -54,6 +59,8 @@ class LocalSimpleRuntime(Runtime):
             )
             if self.profile_int:
                 runner.profile_int = self.profile_int
+            runner.telemetry_int = self.telemetry_int
+            runner.term_grace = self.term_grace
             await run.prep_dirs(self.executor)
             await runner.prepare()
         except asyncio.CancelledError:
@@ -64,11 +71,10 @@ class LocalSimpleRuntime(Runtime):
         run.output = await runner.run()  # handles CancelledError
         self.complete.append(run)
 
-        # if the log is huge, this step takes some time
+        # simulator output streams were already written during the run, this
+        # only moves them next to the JSON manifest
         if self.verbose:
-            print(
-                f'Writing collected output of run {run.name()} to JSON file ...'
-            )
+            print(f'Writing collected output of run {run.name()} ...')
         run.output.dump(run.outpath)
 
     async def start(self) -> None:
@@ -93,7 +99,8 @@ class LocalParallelRuntime(Runtime):
         cores: int,
         mem: tp.Optional[int] = None,
         verbose=False,
-        executor: exectools.Executor = exectools.LocalExecutor()
+        executor: exectools.Executor = exectools.LocalExecutor(),
+        history: tp.Optional[RunHistory] = None
     ):
         super().__init__()
         self.runs_noprereq: tp.List[Run] = []
@@ -105,9 +112,43 @@ class LocalParallelRuntime(Runtime):
         self.mem = mem
         self.verbose = verbose
         self.executor = executor
+        self.history = history
+        """Durations of previous runs to schedule shortest runs first."""
+        self.longest_first = False
+        """Schedule runs with the longest expected duration first instead."""
+        self.allocator: tp.Optional[CpuAllocator] = None
+        """Pins simulators of concurrent runs to disjoint CPUs if set."""
+        self.resource_db: tp.Optional[ResourceDB] = None
+        """Records resource usage of simulators if set."""
+        self.prep_ahead = 4
+        """
+        Maximum number of runs prepared in the background while waiting for
+        cores. Runs are only started once prepared, so cores are not reserved
+        while directories are cleaned up and config tars and disk images are
+        created. Runs waiting for their prerequisite are counted separately,
+        see `prepare_ahead()`.
+        """
+        self.disk_pool: tp.Optional[DiskImagePool] = None
+        """
+        Pre-created disk images for preparing runs, refilled in the background
+        while runs execute if set.
+        """
 
         self._pending_jobs: tp.Set[asyncio.Task] = set()
+        self._job_runs: tp.Dict[asyncio.Task, Run] = {}
+        self._preps: tp.Dict[asyncio.Task, Run] = {}
+        """Runs being prepared."""
+        self._runners: tp.Dict[Run, ExperimentSimpleRunner] = {}
+        """Runners of prepared runs not started yet."""
+        self._dumps: tp.Set[asyncio.Task] = set()
+        """Output of finished runs being written."""
+        self._workdirs: tp.Set[str] = set()
+        """Work directories of runs from preparation until their output is
+        written, which must not be prepared again in the meantime."""
+        self._refill: tp.Optional[asyncio.Future] = None
+        """Refill of `disk_pool` in progress."""
         self._starter_task: asyncio.Task
+        self._scheduler: RunScheduler
 
     def add_run(self, run: Run) -> None:
         if run.experiment.resreq_cores() > self.cores:
@@ -121,97 +162,192 @@ class LocalParallelRuntime(Runtime):
         else:
             self.runs_prereq.append(run)
 
-    async def do_run(self, run: Run) -> tp.Optional[Run]:
-        """Actually executes `run`."""
+    async def prepare(self, run: Run) -> ExperimentSimpleRunner:
+        """Prepares `run` for execution, without holding any cores."""
+        self._workdirs.add(run.env.workdir)
         try:
             runner = ExperimentSimpleRunner(
                 self.executor, run.experiment, run.env, self.verbose
             )
             if self.profile_int:
                 runner.profile_int = self.profile_int
+            runner.telemetry_int = self.telemetry_int
+            runner.term_grace = self.term_grace
+            if self.resource_db is not None:
+                runner.resource_monitor = ResourceMonitor()
+            runner.disk_pool = self.disk_pool
             await run.prep_dirs(executor=self.executor)
             await runner.prepare()
-        except asyncio.CancelledError:
-            # it is safe to just exit here because we are not running any
-            # simulators yet
-            return None
+        except BaseException:
+            self._workdirs.discard(run.env.workdir)
+            raise
+        return runner
+
+    def prepare_ahead(self) -> None:
+        """
+        Starts preparing the runs that will be started next.
+
+        Runs whose prerequisite is still running only get slots left over by
+        runs that can start right away, and their slots do not count against
+        the latter. Otherwise restore runs of a long checkpoint run could hold
+        all slots while cores are idle.
+        """
+        scheduler = self._scheduler
+        held = list(self._preps.values()) + list(self._runners)
+        ready = sum(1 for r in held if scheduler.prereq_ready(r))
+        for run in scheduler.upcoming():
+            if run in self._runners or run in self._preps.values():
+                continue
+            if run.env.workdir in self._workdirs:
+                # e.g. a restore run sharing the directory of its checkpoint
+                # run, whose output is still being written
+                continue
+            if scheduler.prereq_ready(run):
+                if ready >= self.prep_ahead:
+                    return
+                ready += 1
+            elif len(held) >= self.prep_ahead:
+                return
+            held.append(run)
+            prep = asyncio.create_task(self.prepare(run))
+            self._preps[prep] = run
 
+    def refill_disk_pool(self) -> None:
+        """Refills `disk_pool` in a worker thread, unless already running."""
+        if self.disk_pool is None:
+            return
+        if self._refill is None or self._refill.done():
+            self._refill = asyncio.get_running_loop().run_in_executor(
+                None, self.disk_pool.refill
+            )
+
+    async def do_run(self, run: Run) -> tp.Optional[Run]:
+        """Actually executes `run`."""
+        runner = self._runners.pop(run)
+        placement = None
+        if self.allocator is not None:
+            placement = self.allocator.place(run.experiment)
+            if placement is None:
+                print(f'not enough free CPUs to pin run {run.name()}')
+            else:
+                runner.placement = placement
+        try:
+            return await self._do_run(run, runner)
+        finally:
+            if placement is not None:
+                self.allocator.release(placement)
+
+    async def _do_run(self, run: Run,
+                      runner: ExperimentSimpleRunner) -> tp.Optional[Run]:
         print('starting run ', run.name())
+        start = time.monotonic()
         run.output = await runner.run()  # already handles CancelledError
+        if self.history is not None and not self._interrupted:
+            self.history.record(run, time.monotonic() - start)
+        if self.resource_db is not None and run.output.success:
+            usage = runner.resource_monitor.usage()
+            for sim, u in usage.items():
+                self.resource_db.record(sim, u)
+
+        # write the output in the background so the cores are free for the
+        # next run right away
+        dump = asyncio.create_task(self.dump_output(run))
+        self._dumps.add(dump)
+        dump.add_done_callback(self._dumps.discard)
+        return run
 
-        # if the log is huge, this step takes some time
+    async def dump_output(self, run: Run) -> None:
+        # simulator output streams were already written during the run, this
+        # only moves them next to the JSON manifest
         if self.verbose:
-            print(
-                f'Writing collected output of run {run.name()} to JSON file ...'
+            print(f'Writing collected output of run {run.name()} ...')
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                None, run.output.dump, run.outpath
             )
-        run.output.dump(run.outpath)
+        finally:
+            self._workdirs.discard(run.env.workdir)
         print('finished run ', run.name())
-        return run
 
     async def wait_completion(self) -> None:
-        """Wait for any run to terminate and return."""
-        assert self._pending_jobs
-
-        done, self._pending_jobs = await asyncio.wait(
-            self._pending_jobs, return_when=asyncio.FIRST_COMPLETED
+        """
+        Wait for any run to terminate, finish preparation or have its output
+        written.
+        """
+        assert self._pending_jobs or self._preps or self._dumps
+
+        done, _ = await asyncio.wait(
+            self._pending_jobs | set(self._preps) | self._dumps,
+            return_when=asyncio.FIRST_COMPLETED
         )
 
-        for run in done:
-            run = await run
-            self.complete.add(run)
-            self.cores_used -= run.experiment.resreq_cores()
-            self.mem_used -= run.experiment.resreq_mem()
-
-    def enough_resources(self, run: Run) -> bool:
-        """Check if enough cores and mem are available for the run."""
-        exp = run.experiment  # pylint: disable=redefined-outer-name
-
-        if self.cores is not None:
-            enough_cores = (self.cores - self.cores_used) >= exp.resreq_cores()
-        else:
-            enough_cores = True
-
-        if self.mem is not None:
-            enough_mem = (self.mem - self.mem_used) >= exp.resreq_mem()
-        else:
-            enough_mem = True
-
-        return enough_cores and enough_mem
-
-    def prereq_ready(self, run: Run) -> bool:
-        """Check if the prerequesite run for `run` has completed."""
-        if run.prereq is None:
-            return True
-
-        return run.prereq in self.complete
+        for job in done:
+            if job in self._preps:
+                run = self._preps.pop(job)
+                self._runners[run] = await job
+                self._scheduler.prepared.add(run)
+                continue
+            if job not in self._job_runs:
+                # output written, so its work directory can be prepared again
+                continue
+            self._pending_jobs.discard(job)
+            run = self._job_runs.pop(job)
+            completed = await job is not None
+            if completed:
+                self.complete.add(run)
+            self._scheduler.finished(run, completed)
+        self.drop_orphans()
+
+    def drop_orphans(self) -> None:
+        """Drops prepared runs whose prerequisite did not complete, so they do
+        not take up slots for preparing runs ahead."""
+        scheduler = self._scheduler
+        for run in list(self._runners):
+            prereq = run.prereq
+            if (
+                prereq is None or prereq in scheduler.complete or
+                prereq in scheduler.running
+            ):
+                continue
+            del self._runners[run]
+            scheduler.prepared.discard(run)
+            self._workdirs.discard(run.env.workdir)
 
     async def do_start(self) -> None:
         """Asynchronously execute the runs defined in `self.runs_noprereq +
-        self.runs_prereq."""
-        #self.completions = asyncio.Queue()
-        self.cores_used = 0
-        self.mem_used = 0
-
-        runs = self.runs_noprereq + self.runs_prereq
-        for run in runs:
-            # if necessary, wait for enough memory or cores
-            while not self.enough_resources(run):
-                print('waiting for resources')
-                await self.wait_completion()
-
-            # if necessary, wait for prerequesite runs to complete
-            while not self.prereq_ready(run):
-                print('waiting for prereq')
-                await self.wait_completion()
-
-            self.cores_used += run.experiment.resreq_cores()
-            self.mem_used += run.experiment.resreq_mem()
-
-            job = asyncio.create_task(self.do_run(run))
-            self._pending_jobs.add(job)
-
-        # wait for all runs to finish
-        await asyncio.gather(*self._pending_jobs)
+        self.runs_prereq`."""
+        self._scheduler = RunScheduler(self.cores, self.mem, self.history)
+        self._scheduler.longest_first = self.longest_first
+        for run in self.runs_noprereq + self.runs_prereq:
+            self._scheduler.add(run)
+
+        self._scheduler.only_prepared = True
+
+        if self.disk_pool is not None:
+            for run in self.runs_noprereq + self.runs_prereq:
+                for sim in run.experiment.all_simulators():
+                    for (base, _) in sim.disk_images(run.env):
+                        self.disk_pool.want(base)
+
+        loop = asyncio.get_running_loop()
+        while True:
+            # prepare upcoming runs and start all prepared ones the scheduler
+            # lets us, including runs whose prerequisite just completed
+            self.prepare_ahead()
+            self.refill_disk_pool()
+            for run in self._scheduler.schedule(loop.time()):
+                job = asyncio.create_task(self.do_run(run))
+                self._pending_jobs.add(job)
+                self._job_runs[job] = run
+
+            # runs may be waiting for the output of a finished run to be
+            # written, e.g. a restore run for the directory of its checkpoint
+            if not self._pending_jobs and not self._preps and not self._dumps:
+                break
+            await self.wait_completion()
+
+        for (_, _, run) in self._scheduler.waiting:
+            print(f'skipping run {run.name()}, prerequisite did not complete')
 
     async def start(self) -> None:
         """Execute all defined runs."""
@@ -219,10 +355,23 @@ class LocalParallelRuntime(Runtime):
         try:
             await self._starter_task
         except asyncio.CancelledError:
+            for prep in self._preps:
+                prep.cancel()
             for job in self._pending_jobs:
                 job.cancel()
             # wait for all runs to finish
             await asyncio.gather(*self._pending_jobs)
+            await asyncio.gather(*self._preps, return_exceptions=True)
+        finally:
+            # output of finished runs is always written
+            while self._dumps:
+                await asyncio.gather(*self._dumps)
+            if self._refill is not None:
+                await self._refill
+            if self.history is not None:
+                self.history.save()
+            if self.resource_db is not None:
+                self.resource_db.save()
 
     def interrupt_handler(self) -> None:
         self._starter_task.cancel()
@@ -0,0 +1,260 @@
+# Copyright 2024 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Scheduling of runs on a fixed amount of local resources."""
+
+import heapq
+import json
+import math
+import os
+import statistics
+import typing as tp
+
+from simbricks.orchestration.runtime.common import Run
+
+
+class RunHistory(object):
+    """Durations of previous runs, used to estimate how long a run takes."""
+
+    def __init__(self, path: tp.Optional[str] = None, keep=10) -> None:
+        self.path = path
+        """JSON file the history is loaded from and saved to."""
+        self.keep = keep
+        """Number of most recent durations to keep per experiment."""
+        self.durations: tp.Dict[str, tp.List[float]] = {}
+
+        if path is not None and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.durations = json.load(f)
+
+    @staticmethod
+    def key(run: Run) -> str:
+        # creating a checkpoint takes a different amount of time than running
+        # from one
+        if run.env.create_cp:
+            return run.experiment.name + '.create_cp'
+        return run.experiment.name
+
+    def record(self, run: Run, duration: float) -> None:
+        ds = self.durations.setdefault(self.key(run), [])
+        ds.append(duration)
+        del ds[:-self.keep]
+
+    def expected_duration(self, run: Run) -> tp.Optional[float]:
+        """Median duration of previous runs, None if there were none."""
+        ds = self.durations.get(self.key(run))
+        if not ds:
+            return None
+        return statistics.median(ds)
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.durations, f, indent=4)
+        os.replace(tmp, self.path)
+
+
+class RunScheduler(object):
+    """
+    Decides which runs to start on a fixed number of cores and memory.
+
+    Runs whose prerequisite has completed are considered in order of their
+    expected duration, shortest first unless `longest_first` is set, with runs
+    without history last and in the order they were added. Runs creating a
+    checkpoint always come first, as other runs wait for them. If the first of
+    these does not fit into the free resources, it gets a reservation for the
+    time enough resources are expected to become free. Later runs are then
+    started in its place (backfilled) only if they are expected to finish
+    before that time or fit into the resources that are left over even after
+    the reserved run started.
+
+    Runs without history are expected to run until their experiment's
+    timeout. If that is not set either, the reservation time is unknown and
+    runs are only backfilled into the left over resources.
+    """
+
+    def __init__(
+        self,
+        cores: int,
+        mem: tp.Optional[int] = None,
+        history: tp.Optional[RunHistory] = None
+    ) -> None:
+        self.cores = cores
+        self.mem = mem
+        self.history = history
+        self.longest_first = False
+        """
+        Start runs with the longest expected duration first. This usually
+        gives a shorter makespan, while shortest first gives a shorter time
+        until results of each run are available.
+        """
+        self.cores_used = 0
+        self.mem_used = 0
+        self.waiting: tp.List[tp.Tuple[float, int, Run]] = []
+        """Heap of runs not started yet by priority and order."""
+        self.running: tp.Dict[Run, float] = {}
+        """Expected end time of started runs."""
+        self.reserved: tp.Dict[Run, tp.Tuple[int, int]] = {}
+        """Cores and memory reserved for each running run."""
+        self.complete: tp.Set[Run] = set()
+        self.only_prepared = False
+        """Only start runs in `prepared`, e.g. because the others are still
+        being prepared."""
+        self.prepared: tp.Set[Run] = set()
+        self._seq = 0
+
+    def expected_duration(self, run: Run) -> float:
+        d = None
+        if self.history is not None:
+            d = self.history.expected_duration(run)
+        return math.inf if d is None else d
+
+    def estimated_duration(self, run: Run) -> float:
+        """
+        Expected duration of `run`, falling back to its timeout, which bounds
+        the duration, if there is no history.
+        """
+        d = self.expected_duration(run)
+        timeout = run.experiment.timeout
+        return d if timeout is None else min(d, timeout)
+
+    def add(self, run: Run) -> None:
+        prio = self.expected_duration(run)
+        if self.longest_first and prio != math.inf:
+            prio = -prio
+        if run.env.create_cp:
+            prio = -math.inf
+        heapq.heappush(self.waiting, (prio, self._seq, run))
+        self._seq += 1
+
+    def prereq_ready(self, run: Run) -> bool:
+        """Check if the prerequesite run for `run` has completed."""
+        return run.prereq is None or run.prereq in self.complete
+
+    def upcoming(self) -> tp.List[Run]:
+        """
+        Waiting runs whose prerequisite has completed, in the order they are
+        considered for starting, followed by those whose prerequisite is
+        running. The latter can already be prepared, so they start as soon as
+        their checkpoint is written.
+        """
+        waiting = [e[2] for e in sorted(self.waiting)]
+        return [r for r in waiting if self.prereq_ready(r)
+               ] + [r for r in waiting if r.prereq in self.running]
+
+    def requirements(self, run: Run) -> tp.Tuple[int, int]:
+        """
+        Cores and memory `run` needs. Learned requirements can change while
+        runs execute, so running runs keep what they were started with.
+        Larger requirements than available are capped, the run then runs on
+        its own.
+        """
+        if run in self.reserved:
+            return self.reserved[run]
+        cores = min(run.experiment.resreq_cores(), self.cores)
+        mem = run.experiment.resreq_mem()
+        if self.mem is not None:
+            mem = min(mem, self.mem)
+        return cores, mem
+
+    def fits(self, run: Run, cores: int, mem: tp.Optional[int]) -> bool:
+        (need_cores, need_mem) = self.requirements(run)
+        if need_cores > cores:
+            return False
+        return mem is None or need_mem <= mem
+
+    def _free(self) -> tp.Tuple[int, tp.Optional[int]]:
+        mem = None if self.mem is None else self.mem - self.mem_used
+        return self.cores - self.cores_used, mem
+
+    def _reserve(self, run: Run) -> tp.Tuple[float, int, tp.Optional[int]]:
+        """
+        Determines when enough resources will be free for `run` and how many
+        are left over once it started then.
+        """
+        cores, mem = self._free()
+        (need_cores, need_mem) = self.requirements(run)
+        for r, end in sorted(self.running.items(), key=lambda x: x[1]):
+            cores += self.reserved[r][0]
+            if mem is not None:
+                mem += self.reserved[r][1]
+            if self.fits(run, cores, mem):
+                cores -= need_cores
+                if mem is not None:
+                    mem -= need_mem
+                return end, cores, mem
+        # only happens if resources are leaked, never backfill then
+        return -math.inf, 0, 0
+
+    def schedule(self, now: float) -> tp.List[Run]:
+        """Returns the runs to start at time `now` and marks them running."""
+        start = []
+        reservation = None
+        for entry in sorted(self.waiting):
+            run = entry[2]
+            expected = self.estimated_duration(run)
+            if not self.prereq_ready(run):
+                continue
+            if self.only_prepared and run not in self.prepared:
+                continue
+
+            cores, mem = self._free()
+            if not self.fits(run, cores, mem):
+                if reservation is None:
+                    reservation = self._reserve(run)
+                continue
+
+            if reservation is not None:
+                shadow, spare_cores, spare_mem = reservation
+                if shadow == math.inf or now + expected > shadow:
+                    # would delay the reserved run unless it only uses
+                    # resources that the reserved run does not need
+                    if not self.fits(run, spare_cores, spare_mem):
+                        continue
+                    spare_cores -= self.requirements(run)[0]
+                    if spare_mem is not None:
+                        spare_mem -= self.requirements(run)[1]
+                    reservation = (shadow, spare_cores, spare_mem)
+
+            self.waiting.remove(entry)
+            self.running[run] = now + expected
+            self.reserved[run] = self.requirements(run)
+            self.cores_used += self.reserved[run][0]
+            self.mem_used += self.reserved[run][1]
+            start.append(run)
+
+        heapq.heapify(self.waiting)
+        return start
+
+    def finished(self, run: Run, completed=True) -> None:
+        """
+        Marks `run` as no longer running. Runs depending on it only become
+        ready if it `completed`.
+        """
+        del self.running[run]
+        (cores, mem) = self.reserved.pop(run)
+        self.cores_used -= cores
+        self.mem_used -= mem
+        if completed:
+            self.complete.add(run)
@@ -29,8 +29,13 @@ import typing as tp
 
 from simbricks.orchestration.runtime.common import Run, Runtime
 
+Pack = tp.List[Run]
+"""Runs executed together in one Slurm allocation."""
+
 
 class SlurmRuntime(Runtime):
+    """Submits runs as Slurm job arrays, optionally packing several runs into
+    each array task."""
 
     def __init__(self, slurmdir, args, verbose=False, cleanup=True) -> None:
         super().__init__()
@@ -39,98 +44,238 @@ class SlurmRuntime(Runtime):
         self.args = args
         self.verbose = verbose
         self.cleanup = cleanup
+        self.sbatch = 'sbatch'
+        """Command used to submit jobs, can be pointed at a stand-in script for
+        testing."""
+        self.cores: tp.Optional[int] = None
+        """Cores to request per run. Defaults to
+        `Experiment.resreq_cores()`."""
+        self.exclude: tp.Optional[str] = None
+        """Nodes to exclude from allocations (sbatch `--exclude`)."""
+        self.pack = 1
+        """Number of runs to pack into one allocation. Packed runs are executed
+        with a `LocalParallelRuntime` inside the job."""
+        self.array_limit: tp.Optional[int] = None
+        """Maximum number of simultaneously running tasks per job array."""
+        self.array_max = 1000
+        """Maximum number of tasks per job array, larger arrays are split
+        (Slurm's default `MaxArraySize` is 1001)."""
 
         self._start_task: asyncio.Task
+        self._jobs: tp.List[int] = []
+        self._tasks: tp.Dict[Run, str] = {}
+        """Array task (`<job>_<task>`) each submitted run executes in."""
 
     def add_run(self, run: Run) -> None:
         self.runnable.append(run)
 
+    def run_resources(self, run: Run) -> tp.Tuple[int, int, tp.Optional[int]]:
+        """Cores, memory in MB and time limit in seconds for `run`."""
+        exp = run.experiment
+        cores = self.cores
+        if cores is None:
+            cores = max(exp.resreq_cores(), 1)
+        timeout = None if exp.timeout is None else int(exp.timeout)
+        return (cores, exp.resreq_mem(), timeout)
+
+    def pack_resources(self,
+                       pack: Pack) -> tp.Tuple[int, int, tp.Optional[int]]:
+        """Resources for an allocation running all runs in `pack`
+        concurrently."""
+        res = [self.run_resources(run) for run in pack]
+        timeouts = [t for (_, _, t) in res]
+        return (
+            sum(c for (c, _, _) in res),
+            sum(m for (_, m, _) in res),
+            None if None in timeouts else max(timeouts)
+        )
+
+    def plan(self) -> tp.List[tp.List[tp.List[Pack]]]:
+        """Groups runs into waves of job arrays, each a list of packs.
+
+        Runs restoring a checkpoint go into a later wave than the run creating
+        it, so the job arrays they depend on have been submitted already.
+        Within a wave, packs with the same prerequisite run and equal resource
+        requirements share an array. Each array thus only depends on the one
+        array task creating its checkpoint, and a failed checkpoint does not
+        hold back runs restoring other checkpoints."""
+        pending = set(self.runnable)
+
+        def depth(run: Run) -> int:
+            if run.prereq is None or run.prereq not in pending:
+                return 0
+            return depth(run.prereq) + 1
+
+        by_depth: tp.Dict[int, tp.List[Run]] = {}
+        for run in self.runnable:
+            by_depth.setdefault(depth(run), []).append(run)
+
+        def resources(run: Run) -> tp.List[int]:
+            return [x or 0 for x in self.run_resources(run)]
+
+        waves = []
+        for d in sorted(by_depth):
+            by_prereq: tp.Dict[tp.Optional[Run], tp.List[Run]] = {}
+            for run in by_depth[d]:
+                by_prereq.setdefault(run.prereq, []).append(run)
+
+            arrays: tp.Dict[tp.Tuple, tp.List[Pack]] = {}
+            for (prereq, runs) in by_prereq.items():
+                # keep runs with the same requirements together so packs do
+                # not allocate for the largest experiment they happen to
+                # contain
+                runs.sort(key=resources)
+                for i in range(0, len(runs), self.pack):
+                    pack = runs[i:i + self.pack]
+                    key = (prereq, self.pack_resources(pack))
+                    arrays.setdefault(key, []).append(pack)
+            wave = []
+            for jobs in arrays.values():
+                for i in range(0, len(jobs), self.array_max):
+                    wave.append(jobs[i:i + self.array_max])
+            waves.append(wave)
+        return waves
+
     def prep_run(self, run: Run) -> str:
         exp = run.experiment
         e_idx = exp.name + f'-{run.index}' + '.exp'
         exp_path = os.path.join(self.slurmdir, e_idx)
 
-        log_idx = exp.name + f'-{run.index}' + '.log'
-        exp_log = os.path.join(self.slurmdir, log_idx)
+        # write out pickled run, without pulling in the prereq too
+        prereq, run.prereq = run.prereq, None
+        try:
+            with open(exp_path, 'wb') as f:
+                pickle.dump(run, f)
+        finally:
+            run.prereq = prereq
+
+        return exp_path
 
-        sc_idx = exp.name + f'-{run.index}' + '.sh'
-        exp_script = os.path.join(self.slurmdir, sc_idx)
-        print(exp_path)
-        print(exp_log)
-        print(exp_script)
+    def prep_array(self, jobs: tp.List[Pack]) -> tp.Tuple[str, str]:
+        """Writes out pickled runs and the batch script for a job array with
+        one task per pack in `jobs`. Returns job name and script path."""
+        first = jobs[0][0]
+        name = first.experiment.name + f'-{first.index}'
+        exp_log = os.path.join(self.slurmdir, name + '-%a.log')
+        exp_script = os.path.join(self.slurmdir, name + '.sh')
+        if self.verbose:
+            print(exp_script)
 
-        # write out pickled run
-        with open(exp_path, 'wb', encoding='utf-8') as f:
-            run.prereq = None  # we don't want to pull in the prereq too
-            pickle.dump(run, f)
+        (cores, mem, timeout) = self.pack_resources(jobs[0])
+
+        extra = ''
+        if self.verbose:
+            extra = '--verbose '
 
         # create slurm batch script
         with open(exp_script, 'w', encoding='utf-8') as f:
             f.write('#!/bin/sh\n')
             f.write(f'#SBATCH -o {exp_log} -e {exp_log}\n')
-            #f.write('#SBATCH -c %d\n' % (exp.resreq_cores(),))
-            f.write(f'#SBATCH --mem={exp.resreq_mem()}M\n')
-            f.write(f'#SBATCH --job-name="{run.name()}"\n')
-            f.write('#SBATCH --exclude=spyder[01-05],spyder16\n')
-            f.write('#SBATCH -c 32\n')
+            array = f'0-{len(jobs) - 1}'
+            if self.array_limit is not None:
+                array += f'%{self.array_limit}'
+            f.write(f'#SBATCH --array={array}\n')
+            f.write(f'#SBATCH --mem={mem}M\n')
+            f.write(f'#SBATCH --job-name="{name}"\n')
+            if self.exclude:
+                f.write(f'#SBATCH --exclude={self.exclude}\n')
+            f.write(f'#SBATCH -c {cores}\n')
             f.write('#SBATCH --nodes=1\n')
-            if exp.timeout is not None:
-                h = int(exp.timeout / 3600)
-                m = int((exp.timeout % 3600) / 60)
-                s = int(exp.timeout % 60)
+            if timeout is not None:
+                h = int(timeout / 3600)
+                m = int((timeout % 3600) / 60)
+                s = int(timeout % 60)
                 f.write(f'#SBATCH --time={h:02d}:{m:02d}:{s:02d}\n')
 
-            extra = ''
-            if self.verbose:
-                extra = '--verbose'
-
-            f.write(f'python3 run.py {extra} --pickled {exp_path}\n')
-            f.write('status=$?\n')
-            if self.cleanup:
-                f.write(f'rm -rf {run.env.workdir}\n')
+            f.write('status=1\n')
+            f.write('case "$SLURM_ARRAY_TASK_ID" in\n')
+            for (i, pack) in enumerate(jobs):
+                paths = ' '.join(self.prep_run(run) for run in pack)
+                f.write(f'{i})\n')
+                if len(pack) == 1:
+                    f.write(f'    python3 run.py {extra}--pickled {paths}\n')
+                else:
+                    f.write(
+                        f'    python3 run.py {extra}--parallel --cores {cores}'
+                        f' --mem {mem} --pickled {paths}\n'
+                    )
+                f.write('    status=$?\n')
+                if self.cleanup:
+                    workdirs = ' '.join(run.env.workdir for run in pack)
+                    f.write(f'    rm -rf {workdirs}\n')
+                f.write('    ;;\n')
+            f.write('esac\n')
             f.write('exit $status\n')
 
-        return exp_script
+        return (name, exp_script)
 
-    async def _do_start(self) -> None:
-        pathlib.Path(self.slurmdir).mkdir(parents=True, exist_ok=True)
+    async def submit(self, script: str, deps: tp.List[str]) -> int:
+        """Submits batch `script` once all jobs in `deps` completed
+        successfully and returns the job id."""
+        cmd = [self.sbatch]
+        if deps:
+            cmd.append('--dependency=afterok:' + ':'.join(deps))
+        cmd.append(script)
+        proc = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.PIPE
+        )
+        output, _ = await proc.communicate()
+        if proc.returncode != 0:
+            raise RuntimeError('running sbatch failed')
 
-        jid_re = re.compile(r'Submitted batch job ([0-9]+)')
+        m = re.search(r'Submitted batch job ([0-9]+)', output.decode())
+        if m is None:
+            raise RuntimeError('cannot retrieve id of submitted job')
+        return int(m.group(1))
 
-        for run in self.runnable:
-            if run.prereq is None:
-                dep_cmd = ''
-            else:
-                dep_cmd = '--dependency=afterok:' + str(run.prereq.job_id)
+    async def submit_array(self, jobs: tp.List[Pack]) -> None:
+        deps = set()
+        for pack in jobs:
+            for run in pack:
+                if run.prereq is None:
+                    continue
+                if run.prereq in self._tasks:
+                    deps.add(self._tasks[run.prereq])
+                elif run.prereq.job_id is not None:
+                    deps.add(str(run.prereq.job_id))
 
-            script = self.prep_run(run)
+        # writing out the runs can take a while for large sweeps
+        (name, script) = await asyncio.get_running_loop().run_in_executor(
+            None, self.prep_array, jobs
+        )
+        job_id = await self.submit(script, sorted(deps))
+        self._jobs.append(job_id)
+        for (i, pack) in enumerate(jobs):
+            for run in pack:
+                run.job_id = job_id
+                self._tasks[run] = f'{job_id}_{i}'
 
-            stream = os.popen(f'sbatch {dep_cmd} {script}')
-            output = stream.read()
-            result = stream.close()
+        if self.verbose:
+            runs = sum(len(pack) for pack in jobs)
+            print(
+                f'{name}: submitted job array {job_id} with {len(jobs)} tasks'
+                f' for {runs} runs',
+                flush=True
+            )
 
-            if result is not None:
-                raise RuntimeError('running sbatch failed')
+    async def _do_start(self) -> None:
+        pathlib.Path(self.slurmdir).mkdir(parents=True, exist_ok=True)
 
-            m = jid_re.search(output)
-            if m is None:
-                raise RuntimeError('cannot retrieve id of submitted job')
-            run.job_id = int(m.group(1))
+        # arrays within a wave are independent and submitted concurrently,
+        # later waves depend on job ids from earlier ones
+        for wave in self.plan():
+            await asyncio.gather(*[self.submit_array(jobs) for jobs in wave])
 
     async def start(self) -> None:
         self._start_task = asyncio.create_task(self._do_start())
         try:
             await self._start_task
         except asyncio.CancelledError:
-            # stop all runs that have already been scheduled
-            # (existing slurm job id)
-            job_ids = []
-            for run in self.runnable:
-                if run.job_id:
-                    job_ids.append(str(run.job_id))
-
-            scancel_process = await asyncio.create_subprocess_shell(
-                f"scancel {' '.join(job_ids)}"
+            # stop all job arrays that have already been submitted
+            if not self._jobs:
+                return
+            scancel_process = await asyncio.create_subprocess_exec(
+                'scancel', *[str(j) for j in self._jobs]
             )
             await scancel_process.wait()
 
@@ -23,7 +23,10 @@
 # Allow own class to be used as type for a method's argument
 from __future__ import annotations
 
+import copy
+import hashlib
 import math
+import os
 import typing as tp
 
 from simbricks.orchestration import e2e_components as e2e
@@ -59,11 +62,28 @@ class Simulator(object):
         """Full name of the simulator."""
         return ''
 
+    def resource_key(self) -> str:
+        """
+        Identifies simulators with the same resource usage, under which
+        measured usage is recorded.
+        """
+        return type(self).__name__
+
     # pylint: disable=unused-argument
     def prep_cmds(self, env: ExpEnv) -> tp.List[str]:
         """Commands to prepare execution of this simulator."""
         return []
 
+    # pylint: disable=unused-argument
+    def disk_images(self, env: ExpEnv) -> tp.List[tp.Tuple[str, str]]:
+        """
+        Copy-on-write disk images to create before execution, as pairs of
+        base image and path of the image. They are created in-process by the
+        runner, so simulators only need `prep_cmds()` for base images that are
+        not available locally.
+        """
+        return []
+
     # pylint: disable=unused-argument
     def run_cmd(self, env: ExpEnv) -> tp.Optional[str]:
         """Command to execute this simulator."""
@@ -83,8 +103,25 @@ class Simulator(object):
     def sockets_wait(self, env: ExpEnv) -> tp.List[str]:
         return []
 
+    def ready_output(self) -> tp.Optional[str]:
+        """
+        Regular expression matching a line the simulator prints on stdout or
+        stderr once simulators depending on it can be started.
+
+        None if the simulator is ready as soon as the sockets in
+        `sockets_wait()` exist.
+        """
+        return None
+
     def start_delay(self) -> int:
-        return 5
+        """
+        Seconds to wait after the simulator is ready before starting
+        simulators depending on it.
+
+        Only needed for simulators that cannot signal readiness through
+        `sockets_wait()` or `ready_output()`.
+        """
+        return 0
 
     def wait_terminate(self, env: ExpEnv) -> bool:
         return False
@@ -340,6 +377,12 @@ class HostSim(Simulator):
     def full_name(self) -> str:
         return 'host.' + self.name
 
+    def resource_key(self) -> str:
+        return (
+            f'{super().resource_key()}:mem={self.node_config.memory}:'
+            f'cores={self.node_config.cores}:sync={self.sync_mode}'
+        )
+
     def add_nic(self, dev: NICSim) -> None:
         """Add a NIC to this host."""
         self.add_pcidev(dev)
@@ -358,6 +401,69 @@ class HostSim(Simulator):
         net.hosts_direct.append(self)
         self.net_directs.append(net)
 
+    def checkpoint_files(self, env: ExpEnv) -> tp.List[str]:
+        """Files on the host machine that the state of this simulated host at
+        checkpoint time depends on."""
+        return [
+            env.hd_path(self.node_config.disk_image),
+            env.hd_raw_path(self.node_config.disk_image)
+        ]
+
+    # pylint: disable=unused-argument
+    def checkpoint_outputs(self, env: ExpEnv) -> tp.List[str]:
+        """Files or directories this host writes its checkpoint to."""
+        return []
+
+    def checkpoint_key(self, env: ExpEnv) -> str:
+        """
+        Hash of everything that influences the state of this host when a
+        checkpoint is taken: its command line for creating the checkpoint with
+        run-specific directories left out, the contents of its config tar, the
+        devices attached, and size and modification time of
+        `checkpoint_files()`.
+
+        The whole config tar is included and not just the commands before the
+        checkpoint, because the guest extracts it before the checkpoint, so
+        the commands run after restoring come from the checkpoint as well.
+        """
+        cp_env = copy.copy(env)
+        cp_env.workdir = '/workdir'
+        cp_env.shm_base = '/workdir'
+        cp_env.cpdir = '/cpdir'
+        cp_env.create_cp = True
+        cp_env.restore_cp = False
+
+        parts = [
+            type(self).__name__,
+            self.run_cmd(cp_env) or '',
+            self.node_config.config_digest(cp_env)
+        ]
+        for dev in self.pcidevs:
+            mac = getattr(dev, 'mac', None)
+            parts.append(f'pci {type(dev).__name__} {dev.name} {mac}')
+        for dev in self.memdevs:
+            parts.append(
+                f'mem {type(dev).__name__} {dev.name} {dev.size}@{dev.addr}'
+                f'@{dev.as_id}'
+            )
+        for path in self.checkpoint_files(env):
+            try:
+                st = os.stat(path)
+                parts.append(f'file {path} {st.st_size} {st.st_mtime_ns}')
+            except OSError:
+                parts.append(f'file {path} missing')
+
+        h = hashlib.sha256(b'cp-v1')
+        for part in parts:
+            h.update(part.encode('utf-8') + b'\0')
+        return h.hexdigest()
+
+    def sockets_cleanup(self, env: ExpEnv) -> tp.List[str]:
+        return [env.net2host_eth_path(n, self) for n in self.net_directs]
+
+    def sockets_wait(self, env: ExpEnv) -> tp.List[str]:
+        return [env.net2host_eth_path(n, self) for n in self.net_directs]
+
     def dependencies(self) -> tp.List[PCIDevSim]:
         deps = []
         for dev in self.pcidevs:
@@ -390,11 +496,24 @@ class QemuHost(HostSim):
     def resreq_mem(self) -> int:
         return 8192
 
+    def resource_key(self) -> str:
+        # without sync, qemu uses kvm
+        return f'{super().resource_key()}:kvm={not self.sync}'
+
+    def disk_images(self, env: ExpEnv) -> tp.List[tp.Tuple[str, str]]:
+        base = env.hd_path(self.node_config.disk_image)
+        if not os.path.exists(base):
+            return []
+        return [(base, env.hdcopy_path(self))]
+
     def prep_cmds(self, env: ExpEnv) -> tp.List[str]:
+        base = env.hd_path(self.node_config.disk_image)
+        if os.path.exists(base):
+            return []
+        # only available on the executor
         return [
             f'{env.qemu_img_path} create -f qcow2 -o '
-            f'backing_file="{env.hd_path(self.node_config.disk_image)}" '
-            f'{env.hdcopy_path(self)}'
+            f'backing_file="{base}" {env.hdcopy_path(self)}'
         ]
 
     def run_cmd(self, env: ExpEnv) -> str:
@@ -477,6 +596,14 @@ class Gem5Host(HostSim):
     def prep_cmds(self, env: ExpEnv) -> tp.List[str]:
         return [f'mkdir -p {env.gem5_cpdir(self)}']
 
+    def checkpoint_files(self, env: ExpEnv) -> tp.List[str]:
+        return super().checkpoint_files(env) + [
+            env.gem5_kernel_path, env.gem5_path(self.variant)
+        ]
+
+    def checkpoint_outputs(self, env: ExpEnv) -> tp.List[str]:
+        return [env.gem5_cpdir(self)]
+
     def run_cmd(self, env: ExpEnv) -> str:
         cpu_type = self.cpu_type
         if env.create_cp:
@@ -596,6 +723,9 @@ class SimicsHost(HostSim):
     def resreq_mem(self) -> int:
         return self.node_config.memory
 
+    def checkpoint_outputs(self, env: ExpEnv) -> tp.List[str]:
+        return [env.simics_cpfile(self)]
+
     def run_cmd(self, env: ExpEnv) -> str:
         if self.node_config.kcmd_append:
             raise RuntimeError(
@@ -787,9 +917,6 @@ class MultiSubNIC(NICSim):
     def dependencies(self) -> tp.List[Simulator]:
         return super().dependencies() + [self.multinic]
 
-    def start_delay(self) -> int:
-        return 0
-
 
 class I40eMultiNIC(Simulator):
 
@@ -0,0 +1,347 @@
+# Copyright 2024 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+Critical-path and stall analysis of synchronized simulations.
+
+In a synchronized experiment, every simulator can only run ahead of its peers
+by the link latency, so the slowest one throttles all others. This analysis
+combines the experiment's simulator graph with the synchronization profile
+(see `profiling`) and the telemetry (see `telemetry`) recorded during a run to
+find out which simulator was the bottleneck when, how long each simulator
+spent blocked on each of its peers, and how much faster the run could get with
+more CPU for the bottleneck or a looser synchronization.
+
+Run as `python -m simbricks.orchestration.stalls OUTPUT.json` for a summary.
+"""
+
+import argparse
+import collections
+import json
+import pathlib
+import sys
+import typing as tp
+
+SPEEDUP_FACTOR = 2
+"""Factor by which the synchronization is assumed to be loosened, i.e. the
+sync period and link latency multiplied, for the speedup estimate."""
+MAX_CPU_FACTOR = 4
+"""Upper bound for how much faster a CPU-starved simulator is assumed to run
+with more CPU."""
+
+
+def load_run(outpath: str) -> tp.Dict[str, tp.Any]:
+    """
+    Reads the manifest and the telemetry of an experiment output, but none of
+    the simulators' output streams.
+    """
+    with open(outpath, 'r', encoding='utf-8') as fp:
+        data = json.load(fp)
+    for obj in data['sims'].values():
+        if 'telemetry_file' in obj:
+            path = pathlib.Path(outpath).parent / obj['telemetry_file']
+            with open(path, 'r', encoding='utf-8') as fp:
+                obj['telemetry'] = json.load(fp)
+    return data
+
+
+def _neighbours(graph: tp.Dict[str, tp.List[str]]) -> tp.Dict[str, tp.Set[str]]:
+    adj: tp.Dict[str, tp.Set[str]] = {}
+    for (s, deps) in graph.items():
+        adj.setdefault(s, set())
+        for d in deps:
+            adj[s].add(d)
+            adj.setdefault(d, set()).add(s)
+    return adj
+
+
+def _wait_roots(waits: tp.Dict[str, tp.Set[str]],
+                sims: tp.Iterable[str]) -> tp.Dict[str, tp.Optional[str]]:
+    """
+    Follows the wait-for edges from each simulator to the one it is
+    ultimately waiting on, or None if it waits in a cycle.
+    """
+    roots = {}
+    for s in sims:
+        seen = set()
+        cur = s
+        while waits.get(cur) and cur not in seen:
+            seen.add(cur)
+            # with multiple blocking peers, any of them has to progress first
+            cur = min(waits[cur])
+        roots[s] = None if cur in seen else cur
+    return roots
+
+
+def _intervals(
+    sims: tp.Dict[str, tp.Dict[str, tp.Any]]
+) -> tp.List[tp.Tuple[int, int, tp.Dict[str, tp.Set[str]]]]:
+    """
+    Wait-for graphs over time from the synchronization profiles, as (start
+    ms, duration ms, waits) per interval. Simulators are aligned by interval
+    index since all are signalled in the same round.
+    """
+    profiles = {
+        n: o['sync_profile'] for (n, o) in sims.items() if o.get('sync_profile')
+    }
+    if not profiles:
+        return []
+    n = min(len(p['t_ms']) for p in profiles.values())
+    t_ms = next(iter(profiles.values()))['t_ms']
+    intervals = []
+    prev = 0
+    for i in range(n):
+        waits = {}
+        for (name, prof) in profiles.items():
+            waits[name] = {
+                peer for (peer, s) in prof['peers'].items() if s['blocked'][i]
+            }
+        intervals.append((prev, t_ms[i] - prev, waits))
+        prev = t_ms[i]
+    return intervals
+
+
+def _telemetry_intervals(
+    sims: tp.Dict[str, tp.Dict[str, tp.Any]], adj: tp.Dict[str, tp.Set[str]]
+) -> tp.List[tp.Tuple[int, int, str]]:
+    """
+    Fallback without synchronization profiles: in each telemetry interval,
+    the connected simulator using the largest share of its cores is taken as
+    the bottleneck, since busy-polling simulators waiting on it also keep
+    their cores busy, but less so than the one doing actual work.
+    """
+    series = {}
+    for (n, o) in sims.items():
+        t = o.get('telemetry')
+        if t and adj.get(n):
+            cores = o.get('telemetry_summary', {}).get('cores', 1)
+            series[n] = (t, cores)
+    if not series:
+        return []
+    n = min(len(t['t_ms']) for (t, _) in series.values())
+    t_ms = next(iter(series.values()))[0]['t_ms']
+    intervals = []
+    for i in range(1, n):
+        dur = t_ms[i] - t_ms[i - 1]
+        if dur <= 0:
+            continue
+        share = {
+            name: t['cpu_ms'][i] / dur / cores
+            for (name, (t, cores)) in series.items()
+        }
+        intervals.append((t_ms[i - 1], dur, max(share, key=share.get)))
+    return intervals
+
+
+def _cpu_factor(summary: tp.Dict[str, tp.Any]) -> float:
+    """
+    How much faster a simulator could run with more CPU.
+
+    Simulators that keep their cores busy are not going to get faster. Ones
+    that are mostly preempted rather than blocking are starved of CPU and are
+    assumed to scale up to fully using their cores.
+    """
+    if not summary:
+        return 1.0
+    util = summary.get('cpu_util', 0)
+    cores = summary.get('cores', 1)
+    if util <= 0 or util >= 0.9 * cores:
+        return 1.0
+    if summary.get('ivcsw_per_s', 0) <= summary.get('vcsw_per_s', 0):
+        return 1.0
+    return min(MAX_CPU_FACTOR, cores / util)
+
+
+def _amdahl(frac: float, factor: float) -> float:
+    return 1 / ((1 - frac) + frac / factor)
+
+
+def analyze(data: tp.Dict[str, tp.Any]) -> tp.Dict[str, tp.Any]:
+    """
+    Analyzes a loaded experiment output (see `load_run()`).
+
+    The result contains the bottleneck per interval (`timeline`), the
+    fraction of wall time each simulator was the bottleneck (`bottleneck`) and
+    was blocked on each peer (`blocked`), the fraction of time spent in
+    lock-step synchronization (`sync_bound`) or without anyone blocked
+    (`unblocked`), and estimated speedups (`speedup`).
+
+    Intervals are in one of the states `blocked` (others wait on the
+    bottleneck), `lock-step` (simulators wait on each other in a cycle, i.e.
+    for synchronization messages), `free` (nobody blocked), or `cpu` (without
+    synchronization profile, the bottleneck is guessed from telemetry).
+    """
+    sims = data['sims']
+    graph = data.get('sim_graph') or {}
+    adj = _neighbours(graph)
+    names = sorted(set(sims) | set(graph))
+
+    timeline = []
+    blocked_ms = collections.defaultdict(collections.Counter)
+    intervals = _intervals(sims)
+    source = 'sync_profile'
+    if intervals:
+        for (start, dur, waits) in intervals:
+            roots = _wait_roots(waits, names)
+            waiting = collections.Counter()
+            for (s, peers) in waits.items():
+                for p in peers:
+                    blocked_ms[s][p] += dur
+                if peers and roots[s] is not None:
+                    waiting[roots[s]] += 1
+            if waiting:
+                # the simulator most others are transitively waiting on
+                b = waiting.most_common(1)[0][0]
+                timeline.append((start, dur, b, 'blocked'))
+            elif any(roots[s] is None for s in waits):
+                timeline.append((start, dur, None, 'lock-step'))
+            else:
+                timeline.append((start, dur, None, 'free'))
+    else:
+        source = 'telemetry'
+        timeline = [(start, dur, b, 'cpu')
+                    for (start, dur, b) in _telemetry_intervals(sims, adj)]
+
+    total = sum(iv[1] for iv in timeline)
+    share = collections.Counter()
+    state_ms = collections.Counter()
+    for (_, dur, b, state) in timeline:
+        state_ms[state] += dur
+        if b is not None:
+            share[b] += dur
+    sync_frac = state_ms['lock-step'] / total if total else 0.0
+
+    speedup_cpu = {}
+    for (s, ms) in share.items():
+        frac = ms / total
+        factor = _cpu_factor(sims.get(s, {}).get('telemetry_summary', {}))
+        speedup_cpu[s] = round(_amdahl(frac, factor), 3)
+
+    return {
+        'source': source,
+        'wall_ms': total,
+        'timeline': [{
+            't_ms': start, 'dur_ms': dur, 'bottleneck': b, 'state': state
+        } for (start, dur, b, state) in timeline],
+        'bottleneck': {
+            s: round(ms / total, 3) for (s, ms) in share.most_common()
+        },
+        'sync_bound': round(sync_frac, 3),
+        'unblocked': round(state_ms['free'] / total, 3) if total else 0.0,
+        'blocked': {
+            s: {
+                p: round(ms / total, 3) for (p, ms) in c.most_common()
+            } for (s, c) in sorted(blocked_ms.items())
+        },
+        'cpu_util': {
+            s: sims[s]['telemetry_summary'].get('cpu_util')
+            for s in names
+            if sims.get(s, {}).get('telemetry_summary')
+        },
+        'speedup': {
+            'cpu':
+                speedup_cpu,
+            f'sync_x{SPEEDUP_FACTOR}':
+                round(_amdahl(sync_frac, SPEEDUP_FACTOR), 3),
+        },
+    }
+
+
+def _phases(timeline: tp.List[tp.Dict[str, tp.Any]]) -> tp.List[str]:
+    """Merges consecutive intervals with the same bottleneck."""
+    phases = []
+    for iv in timeline:
+        what = iv['bottleneck'] or f'({iv["state"]})'
+        end = iv['t_ms'] + iv['dur_ms']
+        if phases and phases[-1][0] == what:
+            phases[-1][2] = end
+        else:
+            phases.append([what, iv['t_ms'], end])
+    return [
+        f'  {s / 1000:8.1f}s - {e / 1000:8.1f}s  {what}' for (what, s,
+                                                              e) in phases
+    ]
+
+
+def format_summary(name: str, res: tp.Dict[str, tp.Any]) -> str:
+    """Compact text summary of an `analyze()` result."""
+    if not res['timeline']:
+        return (
+            f'{name}: no synchronization profile or telemetry, run with '
+            '--profile-int or --telemetry-int\n'
+        )
+    lines = [f'{name}: bottlenecks (from {res["source"]})']
+    for (s, frac) in res['bottleneck'].items():
+        cpu = res['cpu_util'].get(s)
+        cpu = f', cpu {cpu:.2f}' if cpu is not None else ''
+        lines.append(
+            f'  {s:<32} {frac * 100:5.1f}% of wall time{cpu}, '
+            f'{res["speedup"]["cpu"][s]:.2f}x with more CPU'
+        )
+    lines.append(
+        f'  lock-step sync {res["sync_bound"] * 100:5.1f}% of wall time, '
+        f'{res["speedup"][f"sync_x{SPEEDUP_FACTOR}"]:.2f}x with '
+        f'{SPEEDUP_FACTOR}x sync period and latency'
+    )
+    lines.append(
+        f'  nobody blocked {res["unblocked"] * 100:5.1f}% of wall time'
+    )
+    if res['blocked']:
+        lines.append('blocked on peers:')
+        for (s, peers) in res['blocked'].items():
+            ps = ', '.join(f'{p} {f * 100:.1f}%' for (p, f) in peers.items())
+            lines.append(f'  {s:<32} {ps}')
+    lines.append('timeline:')
+    lines.extend(_phases(res['timeline']))
+    return '\n'.join(lines) + '\n'
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog='python -m simbricks.orchestration.stalls'
+    )
+    parser.add_argument(
+        'outputs', metavar='OUTPUT', nargs='+', help='Experiment output files.'
+    )
+    parser.add_argument(
+        '--json',
+        action='store_const',
+        const=True,
+        default=False,
+        help='Print the analysis as JSON instead of a text summary.'
+    )
+    args = parser.parse_args()
+
+    results = {}
+    for path in args.outputs:
+        data = load_run(path)
+        res = analyze(data)
+        if args.json:
+            results[data.get('exp_name', path)] = res
+        else:
+            sys.stdout.write(format_summary(data.get('exp_name', path), res))
+    if args.json:
+        json.dump(results, sys.stdout, indent=4)
+        sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
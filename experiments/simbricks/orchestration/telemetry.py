@@ -0,0 +1,191 @@
+# Copyright 2024 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Time series of the resource usage of running simulators."""
+
+import asyncio
+import os
+import typing as tp
+
+from simbricks.orchestration.resources import (
+    CLK_TCK, PAGE_SIZE, proc_tree, read_stat
+)
+
+COUNTERS = ('cpu_ms', 'vcsw', 'ivcsw', 'read_kb', 'write_kb')
+"""Cumulative counters, stored as differences between samples."""
+GAUGES = ('rss_kb', 'threads')
+"""Instantaneous values, stored as is."""
+
+
+def read_counters(pid: int) -> tp.Optional[tp.Dict[str, int]]:
+    """Reads counters and gauges summed over `pid` and its descendants."""
+    tree = proc_tree(pid)
+    vals = dict.fromkeys(COUNTERS + GAUGES, 0)
+    found = False
+    for p in tree:
+        stat = read_stat(p)
+        if stat is None:
+            continue
+        found = True
+        # utime and stime, for the root also of reaped children
+        fields = stat[11:15] if p == pid else stat[11:13]
+        vals['cpu_ms'] += sum(map(int, fields)) * 1000 // CLK_TCK
+        vals['threads'] += int(stat[17])
+        vals['rss_kb'] += int(stat[21]) * PAGE_SIZE // 1024
+
+        # context switches are only reported per thread
+        try:
+            tasks = os.listdir(f'/proc/{p}/task')
+        except OSError:
+            tasks = []
+        for t in tasks:
+            try:
+                with open(
+                    f'/proc/{p}/task/{t}/status', 'r', encoding='utf-8'
+                ) as f:
+                    for l in f:
+                        if l.startswith('voluntary_ctxt_switches:'):
+                            vals['vcsw'] += int(l.split()[1])
+                        elif l.startswith('nonvoluntary_ctxt_switches:'):
+                            vals['ivcsw'] += int(l.split()[1])
+            except OSError:
+                pass
+
+        try:
+            with open(f'/proc/{p}/io', 'r', encoding='utf-8') as f:
+                for l in f:
+                    k, v = l.split(':')
+                    if k == 'rchar':
+                        vals['read_kb'] += int(v) // 1024
+                    elif k == 'wchar':
+                        vals['write_kb'] += int(v) // 1024
+        except OSError:
+            # not permitted for processes of other users
+            pass
+    return vals if found else None
+
+
+class SimTelemetry(object):
+    """Samples of one simulator."""
+
+    def __init__(self, pid: int, cores: int) -> None:
+        self.pid = pid
+        self.cores = cores
+        """Number of cores reserved for the simulator."""
+        self.times: tp.List[float] = []
+        self.samples: tp.List[tp.Dict[str, int]] = []
+
+    def series(self) -> tp.Dict[str, tp.List[int]]:
+        """
+        Compact time series: sample times in ms since the first sample,
+        counters as increase since the previous sample, gauges as is.
+        """
+        if not self.samples:
+            return {}
+        t0 = self.times[0]
+        series = {'t_ms': [round((t - t0) * 1000) for t in self.times]}
+        for k in COUNTERS:
+            prev = 0
+            vs = []
+            for s in self.samples:
+                vs.append(s[k] - prev)
+                prev = s[k]
+            series[k] = vs
+        for k in GAUGES:
+            series[k] = [s[k] for s in self.samples]
+        return series
+
+    def summary(
+        self,
+        wait_frac: tp.Optional[float] = None
+    ) -> tp.Dict[str, tp.Union[float, str]]:
+        """
+        Averages over the run and whether the simulator was CPU-bound.
+
+        Simulators busy-polling their SimBricks channels keep their cores busy
+        even while waiting on a peer, so the utilization alone cannot tell
+        waiting from computing. `wait_frac` is the fraction of the run the
+        simulator was waiting on its peers (see `SyncProfile.wait_frac()`), if
+        known. A simulator is considered CPU-bound if it waited less than half
+        of the run and kept the cores reserved for it at least 90% busy, while
+        blocking waits show up as voluntary context switches.
+        """
+        if len(self.samples) < 2:
+            return {}
+        first = self.samples[0]
+        last = self.samples[-1]
+        wall = self.times[-1] - self.times[0]
+        util = (last['cpu_ms'] - first['cpu_ms']) / 1000 / wall
+        cpu_bound = util >= 0.9 * self.cores
+        if wait_frac is not None and wait_frac >= 0.5:
+            cpu_bound = False
+        summary = {
+            'cpu_util':
+                round(util, 3),
+            'cores':
+                self.cores,
+            'peak_rss_mb':
+                round(max(s['rss_kb'] for s in self.samples) / 1024, 1),
+            'vcsw_per_s':
+                round((last['vcsw'] - first['vcsw']) / wall, 1),
+            'ivcsw_per_s':
+                round((last['ivcsw'] - first['ivcsw']) / wall, 1),
+            'read_mb':
+                round((last['read_kb'] - first['read_kb']) / 1024, 1),
+            'write_mb':
+                round((last['write_kb'] - first['write_kb']) / 1024, 1),
+            'state':
+                'cpu-bound' if cpu_bound else 'waiting'
+        }
+        if wait_frac is not None:
+            summary['wait_frac'] = round(wait_frac, 3)
+        return summary
+
+
+class TelemetrySampler(object):
+    """Periodically samples counters of simulator processes."""
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        """Seconds between samples."""
+        self.sims: tp.Dict[str, SimTelemetry] = {}
+        """Samples by full simulator name."""
+
+    def add(self, name: str, pid: int, cores: int) -> None:
+        self.sims[name] = SimTelemetry(pid, cores)
+        self.sample_sim(self.sims[name])
+
+    @staticmethod
+    def sample_sim(st: SimTelemetry) -> None:
+        vals = read_counters(st.pid)
+        if vals is not None:
+            st.times.append(asyncio.get_running_loop().time())
+            st.samples.append(vals)
+
+    def sample(self) -> None:
+        for st in self.sims.values():
+            self.sample_sim(st)
+
+    async def run(self) -> None:
+        """Samples until cancelled."""
+        while True:
+            await asyncio.sleep(self.interval)
+            self.sample()
@@ -0,0 +1,60 @@
+# Copyright 2024 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Helpers for cheaply duplicating files."""
+
+import fcntl
+import os
+import shutil
+
+FICLONE = 0x40049409
+"""ioctl creating a copy-on-write clone of a file (reflink)."""
+
+
+def reflink(src: str, dst: str) -> bool:
+    """
+    Creates `dst` as a copy-on-write clone of `src`.
+
+    Returns False without leaving `dst` behind if the file system does not
+    support reflinks.
+    """
+    with open(src, 'rb') as fs, open(dst, 'wb') as fd:
+        try:
+            fcntl.ioctl(fd.fileno(), FICLONE, fs.fileno())
+            ok = True
+        except OSError:
+            ok = False
+    if not ok:
+        os.unlink(dst)
+    return ok
+
+
+def clone_file(src: str, dst: str) -> None:
+    """
+    Makes `dst` an independent copy of `src` as cheaply as possible.
+
+    Tries a reflink first and falls back to a full copy, so `dst` can be
+    modified without affecting `src`. An existing `dst` is replaced.
+    """
+    if os.path.lexists(dst):
+        os.unlink(dst)
+    if not reflink(src, dst):
+        shutil.copyfile(src, dst)
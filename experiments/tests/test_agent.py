@@ -0,0 +1,164 @@
+# Copyright 2024 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Tests `AgentExecutor` against an agent listening on localhost."""
+
+import asyncio
+import os
+import signal
+import socket
+import sys
+import tempfile
+import unittest
+
+from simbricks.orchestration import exectools
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class AgentExecutorTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        self.workdir = tempfile.TemporaryDirectory()
+        port = free_port()
+        self.agent = await asyncio.create_subprocess_exec(
+            sys.executable,
+            '-m',
+            'simbricks.orchestration.agent',
+            '--listen',
+            f'127.0.0.1:{port}',
+            '--token',
+            'secret',
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        self.executor = exectools.AgentExecutor(
+            '127.0.0.1', self.workdir.name, port
+        )
+        self.executor.token = 'secret'
+        # wait for the agent to listen before the executor connects
+        for _ in range(100):
+            try:
+                _, writer = await asyncio.open_connection('127.0.0.1', port)
+                writer.close()
+                break
+            except OSError:
+                await asyncio.sleep(0.05)
+        await self.executor.connect()
+
+    async def asyncTearDown(self) -> None:
+        self.agent.kill()
+        await self.agent.wait()
+        self.workdir.cleanup()
+
+    async def run_component(self, parts, **kwargs) -> exectools.SimpleComponent:
+        comp = self.executor.create_component(
+            'test', parts, canfail=True, verbose=False, **kwargs
+        )
+        await comp.start()
+        await asyncio.wait_for(comp.wait(), 10)
+        return comp
+
+    async def test_spawn_output(self) -> None:
+        comp = await self.run_component([
+            'sh', '-c', 'pwd; echo out; echo err >&2'
+        ])
+        self.assertEqual(list(comp.stdout.lines()), [self.workdir.name, 'out'])
+        self.assertEqual(list(comp.stderr.lines()), ['err'])
+
+    async def test_exit_code(self) -> None:
+        comp = await self.run_component(['sh', '-c', 'exit 3'])
+        self.assertEqual(comp.returncode(), 3)
+
+        comp = self.executor.create_component(
+            'test', ['sh', '-c', 'exit 3'], verbose=False
+        )
+        await comp.start()
+        with self.assertRaises(RuntimeError):
+            await asyncio.wait_for(comp.wait(), 10)
+
+    async def test_signal(self) -> None:
+        comp = self.executor.create_component(
+            'test', ['sleep', '30'], canfail=True, verbose=False
+        )
+        await comp.start()
+        self.assertTrue(comp.running())
+        await comp.terminate()
+        await asyncio.wait_for(comp.wait(), 10)
+        self.assertEqual(comp.returncode(), -signal.SIGTERM)
+
+    async def test_signal_group(self) -> None:
+        # the child of the shell only stops if the whole group is signaled
+        comp = self.executor.create_component(
+            'test', ['sh', '-c', 'sleep 30; true'],
+            canfail=True,
+            verbose=False,
+            process_group=True
+        )
+        await comp.start()
+        await comp.send_signal(signal.SIGTERM)
+        await asyncio.wait_for(comp.wait(), 10)
+        self.assertEqual(comp.returncode(), -signal.SIGTERM)
+
+    async def test_files(self) -> None:
+        path = os.path.join(self.workdir.name, 'a', 'b')
+        await self.executor.mkdir(path)
+        self.assertTrue(os.path.isdir(path))
+        await self.executor.await_file(path, timeout=1)
+        await self.executor.rmtree(os.path.join(self.workdir.name, 'a'))
+        self.assertFalse(os.path.exists(path))
+        with self.assertRaises(TimeoutError):
+            await self.executor.await_file(path, timeout=0.1)
+
+    async def test_wrong_token(self) -> None:
+        executor = exectools.AgentExecutor(
+            '127.0.0.1', self.workdir.name, self.executor.port
+        )
+        executor.token = 'wrong'
+        with self.assertRaises(RuntimeError):
+            await executor.connect()
+
+        executor = exectools.AgentExecutor(
+            '127.0.0.1', self.workdir.name, self.executor.port
+        )
+        with self.assertRaises(RuntimeError):
+            await executor.connect()
+
+    async def test_public_without_token(self) -> None:
+        env = dict(os.environ)
+        env.pop('SIMBRICKS_AGENT_TOKEN', None)
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable,
+            '-m',
+            'simbricks.orchestration.agent',
+            '--listen',
+            f'0.0.0.0:{free_port()}',
+            env=env,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        self.assertEqual(await asyncio.wait_for(proc.wait(), 10), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+# Copyright 2024 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Tests validation and eviction of checkpoint directories."""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from simbricks.orchestration import checkpoints
+
+
+class CheckpointsTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.root)
+
+    def make(self, name: str, size: int, last_used: float, key='k') -> str:
+        """Creates a complete checkpoint with one file of `size` bytes."""
+        cpdir = os.path.join(self.root, name)
+        os.makedirs(f'{cpdir}/host.0')
+        with open(f'{cpdir}/host.0/cp.img', 'wb') as f:
+            f.write(b'\0' * size)
+        meta = os.path.join(cpdir, checkpoints.METADATA_FILE)
+        files = {'host.0/cp.img': size}
+        with open(meta, 'w', encoding='utf-8') as f:
+            json.dump({'key': key, 'files': files, 'created': 0}, f)
+        os.utime(meta, (last_used, last_used))
+        return cpdir
+
+    def test_validate(self) -> None:
+        cpdir = self.make('cp', 10, 1)
+        self.assertIsNone(checkpoints.validate(cpdir))
+        self.assertIsNone(checkpoints.validate(cpdir, 'k'))
+
+        # created for an experiment whose configuration changed since
+        self.assertEqual(
+            checkpoints.validate(cpdir, 'other'),
+            'created for a different configuration'
+        )
+
+        with open(f'{cpdir}/host.0/cp.img', 'wb') as f:
+            f.write(b'\0' * 5)
+        self.assertEqual(
+            checkpoints.validate(cpdir, 'k'),
+            'host.0/cp.img has size 5 instead of 10'
+        )
+        os.remove(f'{cpdir}/host.0/cp.img')
+        self.assertEqual(
+            checkpoints.validate(cpdir, 'k'), 'host.0/cp.img is missing'
+        )
+
+        # checkpoint run did not finish
+        os.remove(os.path.join(cpdir, checkpoints.METADATA_FILE))
+        self.assertEqual(
+            checkpoints.validate(cpdir, 'k'), 'no complete checkpoint'
+        )
+
+    def test_evict_lru(self) -> None:
+        cps = [
+            self.make(n, 100, t) for (n, t) in (('b', 2), ('a', 1), ('c', 3))
+        ]
+        os.makedirs(os.path.join(self.root, 'incomplete'))
+        mgr = checkpoints.CheckpointManager([self.root])
+        self.assertEqual(len(mgr.checkpoints()), 3)
+
+        # stops as soon as the rest fit
+        self.assertEqual(mgr.evict(300), [])
+        evicted = mgr.evict(250)
+        self.assertEqual([i.cpdir for i in evicted], [cps[1]])
+        self.assertFalse(os.path.exists(cps[1]))
+        self.assertTrue(os.path.exists(cps[0]))
+
+        # kept checkpoints are skipped, the next least recently used goes
+        evicted = mgr.evict(150, keep=[cps[0]])
+        self.assertEqual([i.cpdir for i in evicted], [cps[2]])
+        self.assertEqual([i.cpdir for i in mgr.checkpoints()], [cps[0]])
+        self.assertTrue(os.path.exists(os.path.join(self.root, 'incomplete')))
+
+
+if __name__ == '__main__':
+    unittest.main()
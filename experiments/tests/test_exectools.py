@@ -0,0 +1,123 @@
+# Copyright 2024 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Tests output handling of components: log sinks and line splitting."""
+
+# pylint: disable=protected-access
+
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+from simbricks.orchestration import exectools
+
+
+class LogSinkTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmpdir)
+
+    def test_memory(self) -> None:
+        sink = exectools.MemoryLogSink()
+        sink.extend(['a', 'b'])
+        sink.extend([])
+        sink.extend(['c'])
+        self.assertEqual(list(sink.lines()), ['a', 'b', 'c'])
+        self.assertEqual(sink.tail(), ['a', 'b', 'c'])
+
+    def test_file(self) -> None:
+        path = os.path.join(self.tmpdir, 'out.gz')
+        sink = exectools.FileLogSink(path, keep=2)
+        self.assertEqual(list(sink.lines()), [])
+        sink.extend(['a', '', 'b\r'])
+        sink.extend(['c'])
+        self.assertEqual(list(sink.lines()), ['a', '', 'b\r', 'c'])
+        self.assertEqual(sink.tail(), ['b\r', 'c'])
+
+        moved = os.path.join(self.tmpdir, 'moved.gz')
+        sink.move(moved)
+        self.assertFalse(os.path.exists(path))
+        with gzip.open(moved, 'rt', encoding='utf-8', newline='\n') as f:
+            self.assertEqual(f.read(), 'a\n\nb\r\nc\n')
+        self.assertEqual(
+            list(exectools.FileLogSink(moved).lines()), ['a', '', 'b\r', 'c']
+        )
+
+
+class ParseBufTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.comp = exectools.Component(['true'])
+
+    def feed(self, chunks) -> list:
+        """Splits `chunks` as if read from a stream, followed by EOF."""
+        buf = bytearray()
+        lines = []
+        for c in chunks + [b'']:
+            lines.append(self.comp._parse_buf(buf, c))
+        self.assertEqual(len(buf), 0)
+        return lines
+
+    def test_complete_lines(self) -> None:
+        self.assertEqual(self.feed([b'a\nb\n']), [['a', 'b'], []])
+
+    def test_partial_line_across_chunks(self) -> None:
+        self.assertEqual(
+            self.feed([b'ab', b'c\nde', b'f', b'\ng\n']),
+            [[], ['abc'], [], ['def', 'g'], []]
+        )
+
+    def test_multibyte_split(self) -> None:
+        data = 'ä\nö\n'.encode('utf-8')
+        self.assertEqual(
+            self.feed([data[:1], data[1:4], data[4:]]), [[], ['ä'], ['ö'], []]
+        )
+
+    def test_crlf(self) -> None:
+        # carriage returns are kept, as a simulator might print progress bars
+        self.assertEqual(
+            self.feed([b'a\r\nb\r', b'\n']), [['a\r'], ['b\r'], []]
+        )
+
+    def test_empty_lines(self) -> None:
+        self.assertEqual(self.feed([b'\n\n', b'\n']), [['', ''], [''], []])
+
+    def test_no_newline_at_eof(self) -> None:
+        self.assertEqual(self.feed([b'a\nb', b'c']), [['a'], [], ['bc']])
+        self.assertEqual(self.feed([]), [[]])
+
+    async def test_consume(self) -> None:
+        # an empty chunk signals EOF, flushing the partial line to the sink
+        await self.comp._consume_out(b'x\ny')
+        self.assertEqual(list(self.comp.stdout.lines()), ['x'])
+        await self.comp._consume_out(b'')
+        self.assertEqual(list(self.comp.stdout.lines()), ['x', 'y'])
+        await self.comp._consume_err(b'e\r\n')
+        self.assertEqual(list(self.comp.stderr.lines()), ['e\r'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+# Copyright 2024 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Tests preparing runs ahead in `LocalParallelRuntime`."""
+
+# pylint: disable=protected-access
+
+import asyncio
+import types
+import typing as tp
+import unittest
+
+from tests.test_scheduling import FixedExperiment
+
+from simbricks.orchestration.runtime.common import Run
+from simbricks.orchestration.runtime.local import LocalParallelRuntime
+from simbricks.orchestration.runtime.scheduling import RunScheduler
+
+
+class PrepareAheadTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        self.rt = LocalParallelRuntime(4)
+        self.rt.prep_ahead = 2
+        self.rt._scheduler = RunScheduler(4)
+        self.rt.prepare = self.prepare
+
+    async def asyncTearDown(self) -> None:
+        await asyncio.gather(*self.rt._preps)
+
+    async def prepare(self, run: Run) -> None:
+        pass
+
+    def add(self, name: str, prereq: tp.Optional[Run] = None) -> Run:
+        env = types.SimpleNamespace(create_cp=False, workdir=name)
+        run = Run(FixedExperiment(name, 1), 0, env, '', prereq)
+        self.rt._scheduler.add(run)
+        return run
+
+    def preparing(self) -> tp.Set[str]:
+        return {r.experiment.name for r in self.rt._preps.values()}
+
+    async def test_blocked_restores(self) -> None:
+        cp = self.add('cp')
+        self.rt._scheduler.schedule(0)
+        for i in range(3):
+            self.add(f'restore{i}', cp)
+
+        # nothing else to do while the checkpoint is created
+        self.rt.prepare_ahead()
+        self.assertEqual(self.preparing(), {'restore0', 'restore1'})
+
+        # runs that can start right away do not wait for those slots
+        for name in ('a', 'b', 'c'):
+            self.add(name)
+        self.rt.prepare_ahead()
+        self.assertEqual(self.preparing(), {'restore0', 'restore1', 'a', 'b'})
+
+
+if __name__ == '__main__':
+    unittest.main()
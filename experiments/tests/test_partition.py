@@ -0,0 +1,118 @@
+# Copyright 2024 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Tests partitioning a small ToR/spine topology across machines."""
+
+import unittest
+
+from tests.topologies import tor_spine
+
+from simbricks.orchestration.partition import SimGraph, distribute, partition
+
+
+class PartitionTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.exp = tor_spine(2, 2)
+        self.graph = SimGraph(self.exp)
+
+    def loads(self, parts, n):
+        loads = [0.0] * n
+        for (u, m) in enumerate(parts):
+            loads[m] += self.graph.weights[u]
+        return loads
+
+    def test_graph(self) -> None:
+        # hosts stay with their NIC, networks are units of their own
+        g = self.graph
+        self.assertEqual(len(g.units), 7)
+        for h in self.exp.hosts:
+            self.assertEqual(g.unit_of[h], g.unit_of[h.pcidevs[0]])
+        self.assertEqual(len(g.links), 6)
+        self.assertEqual(sum(len(a) for a in g.adj), 12)
+
+    def test_partition(self) -> None:
+        g = self.graph
+        parts = partition(g, 2)
+        # each ToR with its hosts, so only one ToR to spine link is cut
+        self.assertEqual(g.cut_weight(parts), 1)
+        self.assertEqual(len(g.cut(parts)), 1)
+        self.assertTrue(g.cut(parts)[0].is_n2n())
+        for h in self.exp.hosts:
+            net = h.pcidevs[0].network
+            self.assertEqual(parts[g.unit_of[h]], parts[g.unit_of[net]])
+        self.assertEqual(sorted(self.loads(parts, 2)), [7, 8])
+
+    def test_balance(self) -> None:
+        g = self.graph
+        total = sum(g.weights)
+        for n in (2, 4):
+            parts = partition(g, n)
+            for load in self.loads(parts, n):
+                self.assertLessEqual(load, max(total / n * 1.1, 3))
+
+        parts = partition(g, 2, capacities=[2, 1])
+        loads = self.loads(parts, 2)
+        self.assertGreater(loads[0], loads[1])
+        self.assertLessEqual(loads[1], total / 3 * 1.1)
+
+    def test_distribute(self) -> None:
+        for n in (2, 4):
+            de = distribute(self.exp, n)
+            self.assertTrue(de.all_sims_assigned())
+            mapping = de.host_mapping
+
+            # one proxy pair per pair of machines with links between them
+            parts = partition(self.graph, n)
+            cut = self.graph.cut(parts)
+            pairs = set()
+            for link in cut:
+                (ma, mb) = (mapping[link.a], mapping[link.b])
+                pairs.add((min(ma, mb), max(ma, mb)))
+            self.assertEqual(len(de.proxies_listen), len(pairs))
+            self.assertEqual(len(de.proxies_connect), len(pairs))
+
+            nics = {}
+            n2ns = {}
+            for lp in de.proxies_listen:
+                (ml, mc) = (mapping[lp], mapping[lp.connecter])
+                self.assertIn((ml, mc), pairs)
+                for (nic, with_listener) in lp.nics:
+                    nics[nic] = (ml, mc, with_listener)
+                for ((net_c, net_l, _), with_listener) in lp.n2ns:
+                    n2ns[(net_c, net_l)] = (ml, mc, with_listener)
+
+            # every cut link is forwarded between the machines of its ends,
+            # with the NIC or listening network on the indicated side
+            self.assertEqual(len(nics) + len(n2ns), len(cut))
+            for link in cut:
+                if link.is_n2n():
+                    (ml, mc, with_listener) = n2ns[(link.a, link.b)]
+                    local = mapping[link.b]
+                else:
+                    (ml, mc, with_listener) = nics[link.a]
+                    local = mapping[link.a]
+                self.assertEqual({ml, mc}, {mapping[link.a], mapping[link.b]})
+                self.assertEqual(local, ml if with_listener else mc)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+# Copyright 2024 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Tests pinning simulators of concurrent runs to CPUs and NUMA nodes."""
+
+import unittest
+
+from tests.topologies import tor_spine
+
+from simbricks.orchestration import placement, resources
+
+
+class CpuListTest(unittest.TestCase):
+
+    def test_parse(self) -> None:
+        self.assertEqual(
+            placement.parse_cpulist('0-3,8,10-11\n'), {0, 1, 2, 3, 8, 10, 11}
+        )
+        self.assertEqual(placement.parse_cpulist(''), set())
+        self.assertEqual(placement.format_cpulist([3, 1, 2]), '1,2,3')
+
+
+class CpuAllocatorTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        # 2 hosts with 2 cores each, 2 NICs and 2 switches with 1 core each
+        self.exp = tor_spine(1, 2)
+
+    def check_disjoint(self, *placements) -> None:
+        cpus = []
+        for p in placements:
+            for (sim, sp) in p.items():
+                self.assertEqual(len(sp.cpus), resources.resreq_cores(sim))
+                cpus += sp.cpus
+        self.assertEqual(len(cpus), len(set(cpus)))
+
+    def nodes(self, p) -> set:
+        return {sp.node for sp in p.values()}
+
+    def test_run_on_one_node(self) -> None:
+        alloc = placement.CpuAllocator({0: list(range(8)), 1: range(8, 20)})
+        # best fit leaves the larger node for larger runs
+        p = alloc.place(self.exp)
+        self.assertEqual(self.nodes(p), {0})
+        for sp in p.values():
+            self.assertTrue(set(sp.cpus) <= set(range(8)))
+        self.assertEqual(alloc.num_free(), 12)
+
+        p2 = alloc.place(self.exp)
+        self.assertEqual(self.nodes(p2), {1})
+        self.check_disjoint(p, p2)
+
+        alloc.release(p)
+        self.assertEqual(alloc.free[0], list(range(8)))
+        alloc.release(p2)
+        self.assertEqual(alloc.num_free(), 20)
+
+    def test_split_by_unit(self) -> None:
+        # no node fits the whole run, hosts stay with their NIC
+        alloc = placement.CpuAllocator({0: range(5), 1: range(5, 10)})
+        p = alloc.place(self.exp)
+        self.check_disjoint(p)
+        self.assertEqual(self.nodes(p), {0, 1})
+        for h in self.exp.hosts:
+            self.assertEqual(p[h].node, p[h.pcidevs[0]].node)
+            for c in p[h].cpus + p[h.pcidevs[0]].cpus:
+                self.assertEqual(alloc.cpu_node[c], p[h].node)
+        # the first host goes next to the switches it is connected to
+        tor = self.exp.hosts[0].pcidevs[0].network
+        self.assertEqual(p[self.exp.hosts[0]].node, p[tor].node)
+        self.assertEqual(alloc.num_free(), 2)
+
+    def test_split_unit(self) -> None:
+        # host and NIC need 3 cores, more than any node has
+        alloc = placement.CpuAllocator({0: range(2), 1: range(2, 5)})
+        e = tor_spine(1, 1)
+        p = alloc.place(e)
+        self.check_disjoint(p)
+        self.assertEqual(self.nodes(p), {0, 1})
+        self.assertEqual(alloc.num_free(), 0)
+
+    def test_too_few_cores(self) -> None:
+        alloc = placement.CpuAllocator({0: range(4), 1: range(4, 6)})
+        self.assertIsNone(alloc.place(self.exp))
+        # nothing was assigned
+        self.assertEqual(alloc.free, {0: list(range(4)), 1: [4, 5]})
+
+    def test_wrap(self) -> None:
+        sp = placement.SimPlacement([2, 3], 1)
+        sp.NUMACTL = '/bin/numactl'
+        self.assertEqual(
+            sp.wrap(['sim', '-x']),
+            ['/bin/numactl', '--physcpubind=2,3', '--preferred=1', 'sim', '-x']
+        )
+        sp.NUMACTL = None
+        sp.TASKSET = '/bin/taskset'
+        self.assertEqual(sp.wrap(['sim']), ['/bin/taskset', '-c', '2,3', 'sim'])
+        sp.TASKSET = None
+        self.assertEqual(sp.wrap(['sim']), ['sim'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+# Copyright 2024 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Tests parsing of the synchronization state simulators print on SIGUSR1."""
+
+import typing as tp
+import unittest
+
+from simbricks.orchestration import profiling
+
+
+def nicbm_dump(main_time: int, ts: int) -> tp.List[str]:
+    return [
+        f'error: [Runner 0x55d0] main_time = {main_time}',
+        f'error: net_in_timestamp = {ts}',
+        f'error: net_out_timestamp = {ts}',
+        f'error: pci_in_timestamp = {ts + 1}',
+        f'error: pci_out_timestamp = {ts + 1}',
+    ]
+
+
+class ParseDumpsTest(unittest.TestCase):
+
+    def test_complete(self) -> None:
+        lines = nicbm_dump(100, 100) + ['unrelated'] + nicbm_dump(200, 300)
+        dumps = profiling.parse_dumps(lines)
+        self.assertEqual([d.main_time for d in dumps], [100, 200])
+        self.assertEqual(dumps[1].in_ts, {'net': 300, 'pci': 301})
+        self.assertEqual(dumps[1].out_ts, {'net': 300, 'pci': 301})
+
+    def test_truncated_last(self) -> None:
+        # simulator exited while printing the last dump
+        lines = nicbm_dump(100, 100) + nicbm_dump(200, 300)[:2]
+        dumps = profiling.parse_dumps(lines)
+        self.assertEqual([d.main_time for d in dumps], [100])
+
+        lines = nicbm_dump(100, 100) + nicbm_dump(200, 300)[:1]
+        self.assertEqual(len(profiling.parse_dumps(lines)), 1)
+
+    def test_partial_lines(self) -> None:
+        lines = nicbm_dump(100, 100) + [
+            'error: [Runner 0x55d0] main_time = 200',
+            'error: net_in_timestamp = ',
+            'error: net_out_timest',
+            'error: pci_in_timestamp = 201',
+            'error: pci_out_timestamp = 201',
+        ]
+        # lines cut off mid-way are skipped and make the dump look truncated
+        self.assertEqual(len(profiling.parse_dumps(lines)), 1)
+
+        # a single dump cannot be told apart from a complete one
+        dumps = profiling.parse_dumps(lines[5:])
+        self.assertEqual(len(dumps), 1)
+        self.assertEqual(dumps[0].in_ts, {'pci': 201})
+
+    def test_starts_mid_dump(self) -> None:
+        # timestamps before the first main_time are not attributed to a dump
+        lines = nicbm_dump(100, 100)[2:] + nicbm_dump(200, 300)
+        dumps = profiling.parse_dumps(lines)
+        self.assertEqual([d.main_time for d in dumps], [200])
+
+    def test_profile_series(self) -> None:
+        lines = (
+            nicbm_dump(0, 0) + nicbm_dump(100, 100) + nicbm_dump(200, 500) +
+            nicbm_dump(300, 600)[:3]
+        )
+        peers = {'net': 'switch', 'pci': 'host'}
+        times = [0.0, 1.0, 2.0, 3.0]
+        prof = profiling.SyncProfile('nic', peers, 1000, times, lines)
+        series = prof.series()
+        self.assertEqual(series['t_ms'], [1000, 2000])
+        self.assertEqual(series['peers']['switch']['blocked'], [1, 0])
+        self.assertEqual(series['peers']['host']['blocked'], [0, 0])
+        self.assertEqual(prof.wait_frac(), 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
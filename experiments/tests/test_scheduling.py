@@ -0,0 +1,184 @@
+# Copyright 2024 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Tests ordering and backfilling of runs by `RunScheduler`."""
+
+import types
+import typing as tp
+import unittest
+
+from tests.topologies import tor_spine
+
+from simbricks.orchestration import resources
+from simbricks.orchestration.experiments import Experiment
+from simbricks.orchestration.runtime.common import Run
+from simbricks.orchestration.runtime.scheduling import RunHistory, RunScheduler
+
+
+class FixedExperiment(Experiment):
+    """Experiment with fixed resource requirements and no simulators."""
+
+    def __init__(self, name: str, cores: int, mem: int = 0) -> None:
+        super().__init__(name)
+        self.cores = cores
+        self.mem = mem
+
+    def resreq_cores(self) -> int:
+        return self.cores
+
+    def resreq_mem(self) -> int:
+        return self.mem
+
+
+class RunSchedulerTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.history = RunHistory()
+        self.sched = RunScheduler(4, history=self.history)
+
+    def add(
+        self,
+        name: str,
+        cores: int,
+        duration: tp.Optional[float] = None,
+        prereq: tp.Optional[Run] = None,
+        create_cp=False
+    ) -> Run:
+        env = types.SimpleNamespace(create_cp=create_cp)
+        run = Run(FixedExperiment(name, cores), 0, env, '', prereq)
+        if duration is not None:
+            self.history.record(run, duration)
+        self.sched.add(run)
+        return run
+
+    def names(self, runs: tp.List[Run]) -> tp.List[str]:
+        return [r.experiment.name for r in runs]
+
+    def test_shortest_first(self) -> None:
+        self.add('long', 1, 30)
+        self.add('unknown', 1)
+        self.add('short', 1, 10)
+        self.add('mid', 1, 20)
+        self.assertEqual(
+            self.names(self.sched.upcoming()),
+            ['short', 'mid', 'long', 'unknown']
+        )
+        self.sched.longest_first = True
+        self.sched.waiting = []
+        self.add('a', 1, 10)
+        self.add('b', 1, 20)
+        self.add('c', 1)
+        self.assertEqual(self.names(self.sched.upcoming()), ['b', 'a', 'c'])
+
+    def test_backfill_blocked_head(self) -> None:
+        first = self.add('first', 2, 50)
+        self.assertEqual(self.sched.schedule(0), [first])
+
+        # the head does not fit until first ends at 50, only runs finishing
+        # before that may start in its place
+        self.add('head', 4, 10)
+        short = self.add('short', 1, 20)
+        self.add('long', 1, 100)
+        self.assertEqual(self.sched.schedule(0), [short])
+        self.sched.finished(short)
+        self.assertEqual(self.sched.schedule(20), [])
+
+        self.sched.finished(first)
+        self.assertEqual(self.names(self.sched.schedule(50)), ['head'])
+        self.assertEqual(self.sched.cores_used, 4)
+
+    def test_backfill_spare_cores(self) -> None:
+        first = self.add('first', 2, 50)
+        self.sched.schedule(0)
+
+        # head leaves one core spare once started, long runs may use it
+        self.add('head', 3, 10)
+        self.add('long', 1, 100)
+        self.add('longer', 1, 200)
+        self.assertEqual(self.names(self.sched.schedule(0)), ['long'])
+
+        self.sched.finished(first)
+        self.assertEqual(self.names(self.sched.schedule(50)), ['head'])
+
+    def test_no_history(self) -> None:
+        for timeout in (None, 50):
+            self.sched = RunScheduler(4, history=self.history)
+            first = self.add('first', 2)
+            first.experiment.timeout = timeout
+            self.sched.schedule(0)
+
+            # without history runs are expected to take at most their timeout,
+            # without timeout the head's start time is unknown
+            self.add('head', 4)
+            short = self.add('short', 1)
+            short.experiment.timeout = 1
+            self.assertEqual(
+                self.sched.schedule(0), [] if timeout is None else [short]
+            )
+
+    def test_prereq(self) -> None:
+        self.add('other', 1, 1)
+        cp = self.add('cp', 1, 100, create_cp=True)
+        restore = self.add('restore', 1, 1, prereq=cp)
+
+        # checkpoints are created first, their users can only be prepared
+        self.assertEqual(self.names(self.sched.upcoming()), ['cp', 'other'])
+        self.assertEqual(self.names(self.sched.schedule(0)), ['cp', 'other'])
+        self.assertEqual(self.sched.upcoming(), [restore])
+        self.assertEqual(self.sched.schedule(0), [])
+
+        self.sched.finished(cp, completed=False)
+        self.assertEqual(self.sched.schedule(1), [])
+        self.assertEqual(self.sched.upcoming(), [])
+
+    def test_only_prepared(self) -> None:
+        a = self.add('a', 1, 1)
+        b = self.add('b', 1, 2)
+        self.sched.only_prepared = True
+        self.assertEqual(self.sched.schedule(0), [])
+        self.sched.prepared.add(b)
+        self.assertEqual(self.sched.schedule(0), [b])
+        self.sched.prepared.add(a)
+        self.assertEqual(self.sched.schedule(0), [a])
+
+    def test_learned_while_running(self) -> None:
+        db = resources.ResourceDB()
+        resources.use_learned(db)
+        self.addCleanup(resources.use_learned, None)
+        self.sched = RunScheduler(16, 64 * 1024, self.history)
+        env = types.SimpleNamespace(create_cp=False)
+        run = Run(tor_spine(1, 2), 0, env, '')
+        self.sched.add(run)
+        self.assertEqual(self.sched.schedule(0), [run])
+        self.assertEqual(self.sched.cores_used, 8)
+
+        # measurements recorded at the end of the run must not change what
+        # is released
+        for sim in run.experiment.all_simulators():
+            db.record(sim, resources.ResourceUsage(2048 * 1024 * 1024, 0.1))
+        self.assertNotEqual(run.experiment.resreq_cores(), 8)
+        self.sched.finished(run)
+        self.assertEqual(self.sched.cores_used, 0)
+        self.assertEqual(self.sched.mem_used, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+# Copyright 2024 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Tests job array submission of `SlurmRuntime` with a stand-in sbatch."""
+
+import os
+import re
+import shutil
+import stat
+import tempfile
+import unittest
+
+from simbricks.orchestration.experiments import Experiment
+from simbricks.orchestration.runtime.common import Run
+from simbricks.orchestration.runtime.slurm import SlurmRuntime
+
+FAKE_SBATCH = '''#!/bin/sh
+echo "$@" >> "$(dirname "$0")/calls"
+n=$(wc -l < "$(dirname "$0")/calls")
+echo "Submitted batch job $((100 + n))"
+'''
+
+
+class SlurmRuntimeTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.mkdtemp()
+        self.sbatch = os.path.join(self.tmpdir, 'sbatch')
+        with open(self.sbatch, 'w', encoding='utf-8') as f:
+            f.write(FAKE_SBATCH)
+        os.chmod(self.sbatch, stat.S_IRWXU)
+
+        slurmdir = os.path.join(self.tmpdir, 'slurm')
+        self.rt = SlurmRuntime(slurmdir, None, cleanup=False)
+        self.rt.sbatch = self.sbatch
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmpdir)
+
+    def add_run(self, name: str, prereq: Run = None) -> Run:
+        run = Run(Experiment(name), 0, None, f'{name}.json', prereq)
+        self.rt.add_run(run)
+        return run
+
+    def submissions(self):
+        """Returns job id, dependencies and array tasks of each array in
+        submission order, with the runs of each task."""
+        with open(os.path.join(self.tmpdir, 'calls'), encoding='utf-8') as f:
+            calls = f.read().splitlines()
+        subs = []
+        for (i, call) in enumerate(calls):
+            args = call.split()
+            deps = []
+            for a in args[:-1]:
+                deps += a[len('--dependency=afterok:'):].split(':')
+            with open(args[-1], encoding='utf-8') as f:
+                script = f.read()
+            tasks = [
+                re.findall(r'([\w-]+)-0\.exp', t)
+                for t in script.split(';;')[:-1]
+            ]
+            subs.append((101 + i, sorted(deps), tasks))
+        return subs
+
+    async def test_dependencies(self) -> None:
+        cps = [self.add_run(f'cp{i}') for i in range(2)]
+        for cp in cps:
+            for i in range(2):
+                self.add_run(f'{cp.experiment.name}-restore{i}', cp)
+        await self.rt.start()
+
+        subs = self.submissions()
+        self.assertEqual(len(subs), 3)
+        # checkpoints are created in one array without dependencies
+        (job, deps, tasks) = subs[0]
+        self.assertEqual(deps, [])
+        self.assertEqual(tasks, [['cp0'], ['cp1']])
+        # restore runs only depend on the task creating their checkpoint
+        arrays = sorted((deps, tasks) for (_, deps, tasks) in subs[1:])
+        self.assertEqual(
+            arrays,
+            [
+                ([f'{job}_0'], [['cp0-restore0'], ['cp0-restore1']]),
+                ([f'{job}_1'], [['cp1-restore0'], ['cp1-restore1']]),
+            ]
+        )
+
+    async def test_pack(self) -> None:
+        self.rt.pack = 2
+        cps = [self.add_run(f'cp{i}') for i in range(4)]
+        for cp in cps:
+            self.add_run(f'{cp.experiment.name}-restore', cp)
+        await self.rt.start()
+
+        subs = self.submissions()
+        (job, deps, tasks) = subs[0]
+        self.assertEqual(deps, [])
+        self.assertEqual(tasks, [['cp0', 'cp1'], ['cp2', 'cp3']])
+        # runs with different checkpoints are not packed together, even if
+        # the checkpoints were created in the same task
+        arrays = sorted((deps, tasks) for (_, deps, tasks) in subs[1:])
+        self.assertEqual(
+            arrays,
+            [
+                ([f'{job}_0'], [['cp0-restore']]),
+                ([f'{job}_0'], [['cp1-restore']]),
+                ([f'{job}_1'], [['cp2-restore']]),
+                ([f'{job}_1'], [['cp3-restore']]),
+            ]
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+# Copyright 2024 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Tests bottleneck and stall detection of `stalls.analyze()`."""
+
+# pylint: disable=protected-access
+
+import typing as tp
+import unittest
+
+from simbricks.orchestration import stalls
+
+
+def profile(blocked: tp.Dict[str, tp.List[int]]) -> tp.Dict[str, tp.Any]:
+    n = len(next(iter(blocked.values())))
+    return {
+        't_ms': [100 * (i + 1) for i in range(n)],
+        'peers': {
+            p: {
+                'blocked': b
+            } for (p, b) in blocked.items()
+        },
+    }
+
+
+def summary(util: float, cores=1, vcsw=0, ivcsw=0) -> tp.Dict[str, tp.Any]:
+    return {
+        'cpu_util': util,
+        'cores': cores,
+        'vcsw_per_s': vcsw,
+        'ivcsw_per_s': ivcsw
+    }
+
+
+class AnalyzeTest(unittest.TestCase):
+
+    def test_sync_profile(self) -> None:
+        # intervals: switch holds back the chain, host and nic wait on each
+        # other, nobody waits, nic holds back host
+        data = {
+            'sim_graph': {
+                'host': [], 'nic': ['host', 'switch'], 'switch': []
+            },
+            'sims': {
+                'host': {
+                    'sync_profile': profile({'nic': [1, 1, 0, 1]})
+                },
+                'nic': {
+                    'sync_profile':
+                        profile({
+                            'host': [0, 1, 0, 0], 'switch': [1, 0, 0, 0]
+                        }),
+                    'telemetry_summary':
+                        summary(0.95),
+                },
+                'switch': {
+                    'sync_profile': profile({'nic': [0, 0, 0, 0]}),
+                    'telemetry_summary': summary(0.5, vcsw=10, ivcsw=100),
+                },
+            },
+        }
+        res = stalls.analyze(data)
+        self.assertEqual(res['source'], 'sync_profile')
+        self.assertEqual(res['wall_ms'], 400)
+        self.assertEqual([iv['state'] for iv in res['timeline']],
+                         ['blocked', 'lock-step', 'free', 'blocked'])
+        self.assertEqual(res['bottleneck'], {'switch': 0.25, 'nic': 0.25})
+        self.assertEqual(res['sync_bound'], 0.25)
+        self.assertEqual(res['unblocked'], 0.25)
+        self.assertEqual(res['blocked']['host'], {'nic': 0.75})
+        self.assertEqual(res['blocked']['nic'], {'host': 0.25, 'switch': 0.25})
+
+        # preempted switch could run at full speed, the nic is busy already
+        self.assertEqual(res['speedup']['cpu'], {'switch': 1.143, 'nic': 1.0})
+        self.assertEqual(res['speedup']['sync_x2'], 1.143)
+
+    def test_telemetry(self) -> None:
+        telemetry = {
+            'a': {
+                't_ms': [0, 100, 200], 'cpu_ms': [0, 90, 50]
+            },
+            'b': {
+                't_ms': [0, 100, 200], 'cpu_ms': [0, 100, 150]
+            },
+            'lone': {
+                't_ms': [0, 100, 200], 'cpu_ms': [0, 100, 200]
+            },
+        }
+        cores = {'a': 1, 'b': 2, 'lone': 1}
+        data = {
+            'sim_graph': {
+                'a': ['b'], 'b': []
+            },
+            'sims': {
+                n: {
+                    'telemetry': t,
+                    'telemetry_summary': summary(0.5, cores=cores[n])
+                } for (n, t) in telemetry.items()
+            },
+        }
+        res = stalls.analyze(data)
+        self.assertEqual(res['source'], 'telemetry')
+        # busiest simulator relative to its cores, unconnected ones do not
+        # hold back anyone
+        self.assertEqual([
+            (iv['bottleneck'], iv['state']) for iv in res['timeline']
+        ], [('a', 'cpu'), ('b', 'cpu')])
+
+    def test_cpu_factor(self) -> None:
+        # busy or blocking simulators do not get faster with more CPU
+        self.assertEqual(stalls._cpu_factor({}), 1.0)
+        self.assertEqual(stalls._cpu_factor(summary(1.8, cores=2)), 1.0)
+        self.assertEqual(
+            stalls._cpu_factor(summary(0.5, vcsw=100, ivcsw=100)), 1.0
+        )
+
+        # preempted simulators below 90% of their cores
+        self.assertEqual(
+            stalls._cpu_factor(summary(1.6, cores=2, ivcsw=1)), 1.25
+        )
+        self.assertEqual(
+            stalls._cpu_factor(summary(0.1, ivcsw=1)), stalls.MAX_CPU_FACTOR
+        )
+
+    def test_empty(self) -> None:
+        res = stalls.analyze({'sims': {'a': {}}})
+        self.assertEqual(res['timeline'], [])
+        self.assertEqual(res['sync_bound'], 0.0)
+        self.assertIn(
+            'no synchronization profile', stalls.format_summary('exp', res)
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
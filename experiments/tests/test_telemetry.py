@@ -0,0 +1,71 @@
+# Copyright 2024 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Tests telling waiting from computing simulators in telemetry summaries."""
+
+import unittest
+
+from simbricks.orchestration import profiling
+from simbricks.orchestration.telemetry import COUNTERS, GAUGES, SimTelemetry
+
+
+def busy_sim(cores: int, cpu_ms: int) -> SimTelemetry:
+    """Telemetry of a simulator using `cpu_ms` of CPU time over 1s."""
+    st = SimTelemetry(1, cores)
+    for (t, cpu) in ((0.0, 0), (1.0, cpu_ms)):
+        vals = dict.fromkeys(COUNTERS + GAUGES, 0)
+        vals['cpu_ms'] = cpu
+        st.times.append(t)
+        st.samples.append(vals)
+    return st
+
+
+class SummaryTest(unittest.TestCase):
+
+    def test_state(self) -> None:
+        st = busy_sim(2, 1900)
+        self.assertEqual(st.summary()['state'], 'cpu-bound')
+        self.assertNotIn('wait_frac', st.summary())
+        self.assertEqual(st.summary(0.2)['state'], 'cpu-bound')
+
+        # busy-polling while blocked on peers for most of the run
+        self.assertEqual(st.summary(0.5)['state'], 'waiting')
+        self.assertEqual(st.summary(0.5)['wait_frac'], 0.5)
+
+        self.assertEqual(busy_sim(2, 1000).summary(0.0)['state'], 'waiting')
+
+    def test_poll_wait_frac(self) -> None:
+        lines = [
+            '      h2d_poll_total:    100       h2d_poll_suc:     40  '
+            'poll_suc_rate: 0.4',
+            'info:      h2d_poll_sync:     10  sync_rate: 0.25',
+            '      n2d_poll_total:    100       n2d_poll_suc:     100  '
+            'poll_suc_rate: 1.0',
+            '    s_n2d_poll_total:     50     s_n2d_poll_suc:      0  '
+            'poll_suc_rate: 0.0',
+        ]
+        counters = profiling.parse_counters(lines)
+        self.assertEqual(profiling.poll_wait_frac(counters), 0.35)
+        self.assertIsNone(profiling.poll_wait_frac({}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+# Copyright 2024 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Small experiments shared by the tests."""
+
+import simbricks.orchestration.experiments as exp
+import simbricks.orchestration.nodeconfig as node
+import simbricks.orchestration.simulators as sim
+from simbricks.orchestration.simulator_utils import create_basic_hosts
+
+
+def tor_spine(n_tors: int, n_hosts: int, name='tor_spine') -> exp.Experiment:
+    """Hosts with one NIC each attached to `n_tors` switches, which are
+    connected through a spine switch."""
+    e = exp.Experiment(name)
+    spine = sim.SwitchNet()
+    spine.name = 'spine'
+    e.add_network(spine)
+    for i in range(n_tors):
+        tor = sim.SwitchNet()
+        tor.name = f'tor{i}'
+        e.add_network(tor)
+        spine.connect_network(tor)
+        create_basic_hosts(
+            e,
+            n_hosts,
+            f'host{i}',
+            tor,
+            sim.I40eNIC,
+            sim.QemuHost,
+            node.I40eLinuxNode,
+            node.IdleHost,
+            ip_start=i * n_hosts + 1
+        )
+    return e
@@ -20,10 +20,11 @@
 # TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
 # SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
-import json
 import re
 import sys
 
+from results.utils.exp_output import sim_output
+
 
 def transform_internal(ts, component, msg):
     if not component.startswith('system.pc.simbricks_0'):
@@ -63,18 +64,15 @@ if len(sys.argv) != 3:
 outdir = sys.argv[1]
 variant = sys.argv[2]
 
-with open(
-    f'{outdir}/pci_validation-{variant}-1.json', 'r', encoding='utf-8'
-) as f:
-    data = json.load(f)
+path = f'{outdir}/pci_validation-{variant}-1.json'
 
 if variant == 'internal':
     line_pat = re.compile(r'(\d*):\s*([a-zA-Z0-9\._]*):\s*(.*)')
-    it = iter(data['sims']['host.client']['stdout'])
+    it = sim_output(path, 'host.client')
     transform = transform_internal
 else:
     line_pat = re.compile(r'(\d*):\s*([a-zA-Z0-9\._]*):\s*(.*)')
-    it = iter(data['sims']['nic.client.']['stderr'])
+    it = sim_output(path, 'nic.client.', 'stderr')
     transform = transform_external
 
 # we're doing the comparision for the client
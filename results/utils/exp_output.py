@@ -0,0 +1,67 @@
+# Copyright 2024 Max Planck Institute for Software Systems, and
+# National University of Singapore
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Loads experiment output files written by the orchestration framework."""
+
+import gzip
+import json
+import os
+
+
+def _read_stream(path):
+    if not os.path.exists(path):
+        return
+    with gzip.open(path, 'rt', encoding='utf-8', newline='\n') as f:
+        for l in f:
+            yield l[:-1] if l.endswith('\n') else l
+
+
+def load_output(path):
+    """
+    Loads an experiment output file into a dictionary, with each simulator's
+    `stdout` and `stderr` as lists of lines.
+
+    Supports both the manifest with compressed per-simulator streams and the
+    previous format with all output inlined into the JSON file.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    for sim in data['sims'].values():
+        for stream in ('stdout', 'stderr'):
+            if f'{stream}_file' in sim:
+                stream_path = os.path.join(
+                    os.path.dirname(path), sim.pop(f'{stream}_file')
+                )
+                sim[stream] = list(_read_stream(stream_path))
+    return data
+
+
+def sim_output(path, sim_name, stream='stdout'):
+    """Lazily iterates over the lines simulator `sim_name` printed on
+    `stream`."""
+    with open(path, 'r', encoding='utf-8') as f:
+        sim = json.load(f)['sims'][sim_name]
+
+    if f'{stream}_file' not in sim:
+        return iter(sim[stream])
+    stream_path = os.path.join(os.path.dirname(path), sim[f'{stream}_file'])
+    return _read_stream(stream_path)
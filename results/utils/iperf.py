@@ -22,9 +22,10 @@
 
 import fnmatch
 import glob
-import json
 import re
 
+from results.utils.exp_output import load_output
+
 
 def parse_iperf_run(data, skip=1, use=8):
     tp_pat = re.compile(
@@ -71,8 +72,7 @@ def parse_iperf(basename, skip=1, use=8):
             # skip checkpoints
             continue
 
-        with open(path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = load_output(path)
         result = parse_iperf_run(data, skip, use)
         if result is not None:
             runs.append(result)
@@ -20,10 +20,11 @@
 # TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
 # SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
-import json
 import os
 import re
 
+from results.utils.exp_output import sim_output
+
 
 def parse_nopaxos_run(num_c, path):
 
@@ -38,31 +39,28 @@ def parse_nopaxos_run(num_c, path):
     if not os.path.exists(path):
         return ret
 
-    with open(path, 'r', encoding='utf-8') as f_log:
-        log = json.load(f_log)
-
-        total_tput = 0
-        total_avglat = 0
-        for i in range(num_c):
-            sim_name = f'host.client.{i}'
-            #print(sim_name)
+    total_tput = 0
+    total_avglat = 0
+    for i in range(num_c):
+        sim_name = f'host.client.{i}'
+        #print(sim_name)
 
-            # in this host log stdout
-            for j in log['sims'][sim_name]['stdout']:
+        # in this host log stdout
+        for j in sim_output(path, sim_name):
+            #print(j)
+            m_t = tp_pat.match(j)
+            m_l = lat_pat.match(j)
+            if m_l:
                 #print(j)
-                m_t = tp_pat.match(j)
-                m_l = lat_pat.match(j)
-                if m_l:
-                    #print(j)
-                    lat = float(m_l.group(2)) / 1000  # us latency
-                    #print(lat)
-                    total_avglat += lat
+                lat = float(m_l.group(2)) / 1000  # us latency
+                #print(lat)
+                total_avglat += lat
 
-                if m_t:
+            if m_t:
 
-                    n_req = float(m_t.group(2))
-                    n_time = float(m_t.group(3))
-                    total_tput += n_req / n_time
+                n_req = float(m_t.group(2))
+                n_time = float(m_t.group(3))
+                total_tput += n_req / n_time
 
     avglat = total_avglat / num_c
     #print(avglat)